@@ -0,0 +1,152 @@
+"""Async MySQL access for the ASGI server
+
+Mirrors db.py on aiomysql: same connection settings, pool limits and
+helpers, but every call awaits instead of blocking a thread.
+"""
+import aiomysql
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from db import _connect_args, PoolTimeout, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_IDLE_TIMEOUT
+from metrics import db_errors, observe_query, query_name
+
+logger = logging.getLogger(__name__)
+
+class AsyncConnectionPool:
+    """aiomysql pool with db.ConnectionPool's timeout and counters
+
+    Idle connections older than ``idle_timeout`` seconds are recycled by
+    aiomysql when they are next borrowed.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, idle_timeout=DB_POOL_IDLE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._pool = None
+        self._in_use = 0
+        self._acquired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def open(self):
+        """Create the underlying pool; call once from the event loop"""
+        args = _connect_args()
+        self._pool = await aiomysql.create_pool(
+            host=args['host'],
+            port=args['port'],
+            user=args['user'],
+            password=args['password'],
+            db=args['database'],
+            autocommit=args['autocommit'],
+            minsize=0,
+            maxsize=self.size,
+            pool_recycle=int(self.idle_timeout),
+            cursorclass=aiomysql.DictCursor
+        )
+
+    async def close(self):
+        """Close every connection"""
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a connection for the duration of an async with-block"""
+        started = time.monotonic()
+        try:
+            connection = await asyncio.wait_for(self._pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+
+        waited = time.monotonic() - started
+        self._in_use += 1
+        self._acquired += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            yield connection
+        finally:
+            self._in_use -= 1
+            self._pool.release(connection)
+
+    def stats(self):
+        """Pool usage and wait-time counters, same keys as db.pool_stats"""
+        return {
+            'size': self.size,
+            'open': self._pool.size if self._pool else 0,
+            'in_use': self._in_use,
+            'idle': self._pool.freesize if self._pool else 0,
+            'acquired': self._acquired,
+            'recycled': 0,
+            'wait_avg_ms': round(self._wait_total / self._acquired * 1000, 3) if self._acquired else 0.0,
+            'wait_max_ms': round(self._wait_max * 1000, 3)
+        }
+
+pool = AsyncConnectionPool()
+
+def pool_stats():
+    """Get async connection pool statistics"""
+    return pool.stats()
+
+async def execute_query(query, params=None, fetch=False):
+    """Execute database query"""
+    try:
+        async with pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                started = time.perf_counter()
+                await cursor.execute(query, params or ())
+                result = await cursor.fetchall() if fetch else cursor.rowcount
+                observe_query(query, time.perf_counter() - started)
+                return result
+
+    except Exception as e:
+        db_errors.inc(query=query_name(query))
+        logger.error(f"Query execution error ({query_name(query)}): {e}")
+        return None
+
+class TimedCursor:
+    """aiomysql cursor wrapper recording each statement's duration in metrics"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.execute(query, params)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    async def executemany(self, query, seq_params):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.executemany(query, seq_params)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+@asynccontextmanager
+async def transaction():
+    """Run several statements on one pooled connection as a single transaction
+
+    Yields a dictionary cursor that times each statement; commits on
+    success and rolls back if the block raises. Errors propagate to the
+    caller.
+    """
+    async with pool.connection() as connection:
+        await connection.begin()
+        cursor = await connection.cursor()
+        try:
+            yield TimedCursor(cursor)
+            await connection.commit()
+        except BaseException:
+            await connection.rollback()
+            raise
+        finally:
+            await cursor.close()
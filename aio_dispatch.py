@@ -0,0 +1,172 @@
+"""Outbox delivery on an async HTTP client for the ASGI server
+
+Same contract as outbox.drain, but each Twilio call awaits on one shared
+httpx client instead of holding a dispatcher thread, so a slow Twilio
+response costs a coroutine rather than a worker.
+"""
+from outbox import claim_batch, record_results, OUTBOX_BATCH_SIZE
+from dispatcher import (
+    TWILIO_WHATSAPP_NUMBER, TWILIO_API_BASE_URL, DISPATCH_RATE, DISPATCH_BURST,
+    DISPATCH_MAX_RETRIES, DISPATCH_BACKOFF
+)
+from metrics import observe_twilio, twilio_outcome
+import asyncio
+import httpx
+import os
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Async dispatch configuration
+ASYNC_DISPATCH_CONCURRENCY = int(os.getenv('ASYNC_DISPATCH_CONCURRENCY', 50))
+TWILIO_TIMEOUT = float(os.getenv('TWILIO_TIMEOUT', 15))
+
+TWILIO_API = (TWILIO_API_BASE_URL or 'https://api.twilio.com').rstrip('/')
+
+class TwilioError(Exception):
+    """Twilio answered with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__(f"Twilio error {status}: {message}")
+        self.status = status
+
+def _is_retryable(error):
+    """Twilio throttling, server errors and transport failures are worth retrying"""
+    if isinstance(error, TwilioError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, httpx.TransportError)
+
+class AsyncTokenBucket:
+    """Token bucket limiting sends to ``rate`` per second, for coroutines"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def get_http_client():
+    """New httpx client authenticated against the Twilio API"""
+    return httpx.AsyncClient(
+        base_url=TWILIO_API,
+        auth=(os.getenv('TWILIO_ACCOUNT_SID', ''), os.getenv('TWILIO_AUTH_TOKEN', '')),
+        timeout=TWILIO_TIMEOUT,
+        limits=httpx.Limits(max_connections=ASYNC_DISPATCH_CONCURRENCY)
+    )
+
+async def send_message(client, bucket, to, body, sender=None):
+    """Send one WhatsApp message, retrying with backoff on 429/5xx
+
+    Returns the Twilio message SID.
+    """
+    sender = sender or TWILIO_WHATSAPP_NUMBER
+    path = f"/2010-04-01/Accounts/{os.getenv('TWILIO_ACCOUNT_SID', '')}/Messages.json"
+    attempt = 0
+
+    while True:
+        await bucket.acquire()
+        started = time.perf_counter()
+        try:
+            try:
+                response = await client.post(path, data={
+                    'From': f'whatsapp:{sender}',
+                    'To': f'whatsapp:{to}',
+                    'Body': body
+                })
+            except httpx.TransportError:
+                observe_twilio(twilio_outcome(None), time.perf_counter() - started)
+                raise
+            observe_twilio(twilio_outcome(response.status_code), time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise TwilioError(response.status_code, response.text[:200])
+            return response.json()['sid']
+        except Exception as e:
+            if attempt >= DISPATCH_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = DISPATCH_BACKOFF * (2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+
+async def drain(client, bucket, batch_size=OUTBOX_BATCH_SIZE):
+    """Send queued messages batch by batch until the outbox is empty
+
+    Claiming and recording a batch are two short statements per batch and
+    run on the sync pool in a thread; the sends themselves are concurrent
+    on the event loop. Returns the number of messages sent.
+    """
+    semaphore = asyncio.Semaphore(ASYNC_DISPATCH_CONCURRENCY)
+    total_sent = 0
+
+    async def send(row):
+        async with semaphore:
+            try:
+                sid = await send_message(client, bucket, row['to_number'], row['body'])
+                return (sid, row['id']), None
+            except Exception as e:
+                return None, (row['id'], str(e)[:500])
+
+    while True:
+        batch = await asyncio.to_thread(claim_batch, batch_size)
+        if not batch:
+            return total_sent
+
+        results = await asyncio.gather(*(send(row) for row in batch))
+        sent = [ok for ok, _ in results if ok]
+        failed = [error for _, error in results if error]
+        await asyncio.to_thread(record_results, sent, failed)
+        total_sent += len(sent)
+        logger.info(f"Async dispatch batch: {len(sent)} sent, {len(failed)} failed")
+
+class AsyncDispatcher:
+    """Owns the HTTP client and runs at most one drain at a time"""
+
+    def __init__(self):
+        self.client = None
+        self.bucket = None
+        self._task = None
+
+    async def start(self):
+        """Open the HTTP client; call from the event loop"""
+        self.client = get_http_client()
+        self.bucket = AsyncTokenBucket(DISPATCH_RATE, DISPATCH_BURST)
+
+    async def stop(self):
+        """Cancel a running drain and close the HTTP client"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self.client is not None:
+            await self.client.aclose()
+
+    def kick(self):
+        """Start draining the outbox unless a drain is already running"""
+        if self._task is not None and not self._task.done():
+            return False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return True
+
+    async def _run(self):
+        try:
+            await drain(self.client, self.bucket)
+        except Exception as e:
+            logger.error(f"Async outbox drain failed: {e}")
+
+dispatcher = AsyncDispatcher()
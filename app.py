@@ -2,13 +2,20 @@ from flask import Flask, request
 from flask_cors import CORS
 from twilio.twiml.messaging_response import MessagingResponse
 import os
+import threading
 from dotenv import load_dotenv
 
 # Import modules
-from db import init_database, execute_query
+from migrate import migrate
+from member_import import backfill_phones
+from inbound import WEBHOOK_ASYNC, handle_message, record_inbound, submit
+from message_templates import render
+from phones import phone_key
+from summary import rebuild_all_summaries
 from scheduler import start_scheduler
 from routes.api import api_bp
 from routes.dashboard import dashboard_bp
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -24,73 +31,81 @@ CORS(app)
 app.register_blueprint(api_bp)
 app.register_blueprint(dashboard_bp)
 
+# Request timing and /metrics
+metrics.init_app(app)
+
 # WhatsApp webhook endpoint
 @app.route('/whatsapp', methods=['POST'])
 def whatsapp_webhook():
     """Handle incoming WhatsApp messages"""
     try:
-        incoming_msg = request.values.get('Body', '').strip().lower()
+        incoming_msg = request.values.get('Body', '')
         from_number = request.values.get('From', '')
         
-        # Remove WhatsApp prefix
-        phone_number = from_number.replace('whatsapp:', '')
-        
         response = MessagingResponse()
-        msg = response.message()
-        
-        # Find member by phone number
-        member_result = execute_query(
-            "SELECT * FROM members WHERE phone_number = %s", 
-            (phone_number,), 
-            fetch=True
-        )
         
-        if not member_result:
-            msg.body("Sorry, your number is not registered in our Chama system. Please contact the admin.")
+        if WEBHOOK_ASYNC:
+            # Fast ack: store and hand off, the reply goes out through the outbox
+            message_sid = request.values.get('MessageSid', '')
+            if not message_sid or not from_number:
+                return 'MessageSid and From are required', 400
+            
+            if record_inbound(message_sid, from_number, incoming_msg):
+                submit(message_sid)
             return str(response)
         
-        member = member_result[0]
-        
-        if incoming_msg in ['paid', 'done', 'complete', 'yes']:
-            if member['has_paid']:
-                msg.body(f"Hi {member['name']}! Our records show you've already paid. Thank you!")
-            else:
-                # Mark as paid
-                execute_query(
-                    "UPDATE members SET has_paid = 1, last_payment = NOW() WHERE id = %s",
-                    (member['id'],)
-                )
-                
-                msg.body(f"Thank you {member['name']}! Your payment has been recorded. You're all set!")
-                
-        elif incoming_msg in ['status', 'check']:
-            if member['has_paid']:
-                msg.body(f"Hi {member['name']}! You're all paid up. Thank you!")
-            else:
-                msg.body(f"Hi {member['name']}! You still have a pending payment. Reply 'PAID' when you've made your contribution.")
-                
-        else:
-            msg.body(f"Hi {member['name']}! Reply 'PAID' if you've made your payment, or 'STATUS' to check your payment status.")
+        # Canonical E.164 form, whatever prefix and spacing the sender has
+        phone_number = phone_key(from_number)
         
+        _, reply = handle_message(phone_number, incoming_msg)
+        response.message().body(reply)
         return str(response)
         
     except Exception as e:
         app.logger.error(f"WhatsApp webhook error: {str(e)}")
         response = MessagingResponse()
         msg = response.message()
-        msg.body("Sorry, there was an error processing your message. Please try again later.")
+        msg.body(render('reply_error'))
         return str(response)
 
-# Initialize database and start scheduler
-@app.before_first_request
+@app.cli.command('rebuild-summary')
+def rebuild_summary_command():
+    """Recompute the precomputed chama counters from members and payments"""
+    count = rebuild_all_summaries()
+    print(f"Chama summary rebuilt for {count} chamas")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending database migrations"""
+    applied = migrate()
+    print(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
+
+@app.cli.command('backfill-phones')
+def backfill_phones_command():
+    """Fill in the E.164 phone number of members stored before normalization"""
+    counts = backfill_phones()
+    print(f"Normalized {counts['updated']} phone numbers; "
+          f"{counts['invalid']} invalid and {counts['duplicate']} shared with another member left as they were")
+
+# Apply migrations and start scheduler once per worker, on its first request
+_started = False
+_startup_lock = threading.Lock()
+
+@app.before_request
 def startup():
-    """Initialize database and start scheduler on first request"""
-    init_database()
-    start_scheduler()
+    """Apply pending migrations and start scheduler on first request"""
+    global _started
+    if _started:
+        return
+    with _startup_lock:
+        if not _started:
+            migrate()
+            start_scheduler()
+            _started = True
 
 if __name__ == '__main__':
-    # Initialize database
-    init_database()
+    # Apply pending migrations
+    migrate()
     
     # Start scheduler
     scheduler = start_scheduler()
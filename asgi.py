@@ -0,0 +1,408 @@
+"""Async (ASGI) server mode
+
+Serves the WhatsApp webhook and the busiest /api routes on the event loop
+with aiomysql and httpx, and mounts the Flask blueprints for everything
+else, so the full API is available from one server:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+Queries and response bodies come from queries.py, shared with
+routes/api.py, so both modes answer identically.
+"""
+from contextlib import asynccontextmanager
+from flask import Flask
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from twilio.twiml.messaging_response import MessagingResponse
+import asyncio
+import json
+import os
+import time
+import logging
+from dotenv import load_dotenv
+
+import aio_db
+from aio_dispatch import dispatcher
+from migrate import migrate
+from cache import member_cache
+from changes import feed, format_event, KEEPALIVE, KEEPALIVE_SECONDS, SSE_HEADERS, SUBSCRIBER_QUEUE_SIZE
+from commands import respond, IDLE, CONVERSATION_TTL
+from http_cache import make_etag, etag_matches, headers, response_cache
+from inbound import WEBHOOK_ASYNC, submit
+from metrics import http_request_seconds, init_app
+from message_templates import render
+from outbox import enqueue_reminders
+from phones import phone_key
+from scheduler import start_scheduler
+from summary import rebuild_summary, DEFAULT_CHAMA_ID
+from queries import (
+    MEMBER_BY_PHONE_QUERY, MEMBER_CONTRIBUTION_QUERY, MARK_PAID_QUERY, INSERT_PAYMENT_QUERY, LEDGER_PAYMENT_QUERY,
+    DELTA_QUERY, SUMMARY_QUERY, CONVERSATION_QUERY, SAVE_CONVERSATION_QUERY, CLEAR_CONVERSATION_QUERY, RECORD_INBOUND_QUERY, RECORD_CHANGE_QUERY,
+    CHANGE_VERSION_QUERY, CHAMA_VERSION_QUERY, member_page_query, member_page, stats_response, json_default
+)
+from routes.api import api_bp
+from routes.dashboard import dashboard_bp
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class FlaskJSONResponse(JSONResponse):
+    """JSON response serialized like Flask's jsonify"""
+
+    def render(self, content):
+        return json.dumps(content, default=json_default).encode('utf-8')
+
+def error(message, status=500):
+    """Error body in the same shape as the Flask routes"""
+    return FlaskJSONResponse({'error': message}, status_code=status)
+
+async def apply_delta(cursor, members=0, paid=0, collected=0, chama_id=DEFAULT_CHAMA_ID, member_id=None):
+    """Adjust a chama's counters and publish the change inside the caller's transaction"""
+    await cursor.execute(DELTA_QUERY, (chama_id, members, paid, collected))
+    await cursor.execute(RECORD_CHANGE_QUERY, (chama_id, member_id))
+
+async def data_version(chama_id=None):
+    """summary.data_version, read with aiomysql"""
+    if chama_id is None:
+        result = await aio_db.execute_query(CHANGE_VERSION_QUERY, fetch=True)
+        return f"all:{result[0]['version']}" if result else None
+    result = await aio_db.execute_query(CHAMA_VERSION_QUERY, (chama_id,), fetch=True)
+    return f"{chama_id}:{result[0]['version']}" if result else None
+
+async def json_response(request, version, build):
+    """http_cache.json_response for the native routes; ``build`` is a coroutine function"""
+    if version is None:
+        return FlaskJSONResponse(await build())
+
+    etag = make_etag(f"{request.url.path}?{request.url.query}", version)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        response_cache.revalidated()
+        return Response(status_code=304, headers=headers(etag))
+
+    entry = response_cache.get(etag)
+    if entry is None:
+        entry = response_cache.set(etag, json.dumps(await build(), default=json_default).encode('utf-8'))
+
+    body, content_encoding = entry.encode(request.headers.get('accept-encoding'))
+    return Response(body, media_type='application/json', headers=headers(etag, content_encoding))
+
+class PendingConversation:
+    """One member's conversation state, loaded before respond() and saved after
+
+    commands.respond reads and writes its store synchronously; this gives
+    it the state fetched with aiomysql and remembers any change so it can
+    be written back with an await.
+    """
+
+    def __init__(self, state, amount):
+        self.state = state
+        self.amount = amount
+        self.changed = False
+
+    def get(self, member_id):
+        return self.state, self.amount
+
+    def set(self, member_id, state, amount=None):
+        self.state, self.amount, self.changed = state, amount, True
+
+async def record_payment(member, amount):
+    """Mark a member paid, by default for their chama's contribution; returns whether anything changed"""
+    if amount is None:
+        amount = member['amount_expected']
+    if amount is None:
+        return False
+    async with aio_db.transaction() as cursor:
+        await cursor.execute(MARK_PAID_QUERY, (member['id'],))
+        updated = cursor.rowcount
+        if updated:
+            await cursor.execute(INSERT_PAYMENT_QUERY, (member['id'], amount, member['chama_id']))
+            await cursor.execute(LEDGER_PAYMENT_QUERY, (cursor.lastrowid,))
+            await apply_delta(cursor, paid=1, collected=amount, chama_id=member['chama_id'], member_id=member['id'])
+    member_cache.invalidate(member_id=member['id'])
+    return bool(updated)
+
+async def handle_message(phone_number, text):
+    """Async counterpart of inbound.handle_message; returns the reply text"""
+    member = member_cache.get(phone_number)
+    if member is None:
+        member_result = await aio_db.execute_query(MEMBER_BY_PHONE_QUERY, (phone_number,), fetch=True)
+        if not member_result:
+            return render('reply_not_registered')
+        member = member_result[0]
+        member_cache.set(phone_number, member)
+
+    result = await aio_db.execute_query(CONVERSATION_QUERY, (member['id'],), fetch=True)
+    conversation = PendingConversation(*((result[0]['state'], result[0]['amount']) if result else (IDLE, None)))
+
+    # respond() decides; the payment itself is written afterwards with an await
+    payments = []
+
+    def defer_payment(amount):
+        payments.append(amount)
+        return True
+
+    template, context = respond(member, text, defer_payment, member['amount_expected'], conversation)
+
+    if conversation.changed:
+        async with aio_db.transaction() as cursor:
+            if conversation.state == IDLE:
+                await cursor.execute(CLEAR_CONVERSATION_QUERY, (member['id'],))
+            else:
+                await cursor.execute(
+                    SAVE_CONVERSATION_QUERY,
+                    (member['id'], conversation.state, conversation.amount, int(CONVERSATION_TTL))
+                )
+
+    if payments and not await record_payment(member, payments[0]):
+        template = 'reply_already_paid'
+
+    return render(template, member.get('locale'), **context)
+
+async def whatsapp_webhook(request):
+    """Handle incoming WhatsApp messages"""
+    try:
+        form = await request.form()
+        incoming_msg = form.get('Body', '')
+        from_number = form.get('From', '')
+
+        response = MessagingResponse()
+
+        if WEBHOOK_ASYNC:
+            # Fast ack: store and hand off, the reply goes out through the outbox
+            message_sid = form.get('MessageSid', '')
+            if not message_sid or not from_number:
+                return PlainTextResponse('MessageSid and From are required', status_code=400)
+
+            if await aio_db.execute_query(RECORD_INBOUND_QUERY, (message_sid, from_number, incoming_msg)) == 1:
+                submit(message_sid)
+            return Response(str(response), media_type='application/xml')
+
+        # Canonical E.164 form, whatever prefix and spacing the sender has
+        phone_number = phone_key(from_number)
+
+        reply = await handle_message(phone_number, incoming_msg)
+        response.message().body(reply)
+        return Response(str(response), media_type='application/xml')
+
+    except Exception as e:
+        logger.error(f"WhatsApp webhook error: {str(e)}")
+        response = MessagingResponse()
+        msg = response.message()
+        msg.body(render('reply_error'))
+        return Response(str(response), media_type='application/xml')
+
+async def get_members(request):
+    """Get a page of members, newest first"""
+    try:
+        try:
+            query, params, fields, limit = member_page_query(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+
+        async def build():
+            members = await aio_db.execute_query(query, params, fetch=True)
+            if members is None:
+                raise RuntimeError('Failed to load members')
+            return member_page(members, fields, limit)
+
+        try:
+            chama_id = int(request.query_params['chama_id'])
+        except (KeyError, ValueError):
+            chama_id = None
+
+        return await json_response(request, await data_version(chama_id), build)
+    except Exception as e:
+        return error(str(e))
+
+async def mark_member_paid(request):
+    """Mark member as paid, recording their chama's contribution as the payment"""
+    try:
+        member_id = request.path_params['member_id']
+        async with aio_db.transaction() as cursor:
+            await cursor.execute(MEMBER_CONTRIBUTION_QUERY, (member_id,))
+            member = await cursor.fetchone()
+            if not member:
+                return error('Member not found', 404)
+            if member['amount_expected'] is None:
+                return error('Member has no chama contribution to record', 400)
+
+            await cursor.execute(MARK_PAID_QUERY, (member_id,))
+            if cursor.rowcount:
+                amount = member['amount_expected']
+                await cursor.execute(INSERT_PAYMENT_QUERY, (member_id, amount, member['chama_id']))
+                await cursor.execute(LEDGER_PAYMENT_QUERY, (cursor.lastrowid,))
+                await apply_delta(cursor, paid=1, collected=amount, chama_id=member['chama_id'], member_id=member_id)
+        member_cache.invalidate(member_id=member_id)
+
+        return FlaskJSONResponse({'message': 'Member marked as paid'})
+    except Exception as e:
+        return error(str(e))
+
+async def send_reminders(request):
+    """Queue reminders for a chama's unpaid members and deliver them on the event loop"""
+    try:
+        try:
+            chama_id = int(request.query_params.get('chama_id', DEFAULT_CHAMA_ID))
+        except ValueError:
+            chama_id = DEFAULT_CHAMA_ID
+
+        # Rendering and queueing is one batched insert; run it off the loop
+        queued, total_unpaid = await asyncio.to_thread(enqueue_reminders, chama_id)
+
+        if not total_unpaid:
+            return FlaskJSONResponse({'message': 'No unpaid members found', 'queued': 0})
+
+        dispatcher.kick()
+
+        return FlaskJSONResponse({
+            'message': f'Queued reminders for {queued} members',
+            'queued': queued,
+            'total_unpaid': total_unpaid
+        }, status_code=202)
+    except Exception as e:
+        return error(str(e))
+
+async def get_stats(request):
+    """Get dashboard statistics"""
+    try:
+        try:
+            chama_id = int(request.query_params.get('chama_id', DEFAULT_CHAMA_ID))
+        except ValueError:
+            chama_id = DEFAULT_CHAMA_ID
+
+        async def build():
+            result = await aio_db.execute_query(SUMMARY_QUERY, (chama_id,), fetch=True)
+            if not result:
+                # First use after install or a manual reset
+                await asyncio.to_thread(rebuild_summary, chama_id)
+                result = await aio_db.execute_query(SUMMARY_QUERY, (chama_id,), fetch=True)
+            return stats_response(result[0])
+
+        return await json_response(request, await data_version(chama_id), build)
+    except Exception as e:
+        return error(str(e))
+
+async def change_feed(request):
+    """Stream a chama's member, payment and counter changes as Server-Sent Events"""
+    try:
+        chama_id = int(request.query_params.get('chama_id', DEFAULT_CHAMA_ID))
+    except ValueError:
+        chama_id = DEFAULT_CHAMA_ID
+
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(message):
+        if messages.full():
+            # Too far behind to catch up row by row
+            while not messages.empty():
+                messages.get_nowait()
+            message = format_event('reload', {})
+        messages.put_nowait(message)
+
+    async def events():
+        # The feed polls in its own thread; hand each message to this loop
+        subscription = feed.subscribe(chama_id, lambda message: loop.call_soon_threadsafe(put, message))
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(messages.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            feed.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+async def get_pool_stats(request):
+    """Get async database connection pool statistics"""
+    return FlaskJSONResponse(aio_db.pool_stats())
+
+# Blueprints for the routes not served natively; CORS is handled below for both
+flask_app = Flask(__name__)
+flask_app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
+flask_app.register_blueprint(api_bp)
+flask_app.register_blueprint(dashboard_bp)
+
+# Times the mounted routes and serves /metrics and /metrics/profile
+init_app(flask_app)
+
+class RequestTimer:
+    """ASGI middleware timing the natively served routes
+
+    Labels match the Flask routes' (the route's path template), so the
+    same dashboards work in both modes. Like the Flask hook, it measures
+    until the response starts, so streams are timed to their first byte.
+    Mounted Flask routes are timed by metrics.init_app instead.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.paths = {route.endpoint: route.path for route in routes if isinstance(route, Route)}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            recorded = True
+            # The router records the matched endpoint in the scope
+            path = self.paths.get(scope.get('endpoint'))
+            if path:
+                http_request_seconds.observe(
+                    time.perf_counter() - started, route=path, method=scope['method'], status=status
+                )
+
+        async def send_timed(message):
+            if message['type'] == 'http.response.start':
+                record(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not recorded:
+                record(500)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Apply pending migrations and start the scheduler with the server"""
+    await asyncio.to_thread(migrate)
+    await aio_db.pool.open()
+    await dispatcher.start()
+    scheduler = start_scheduler()
+    try:
+        yield
+    finally:
+        scheduler.shutdown(wait=False)
+        await dispatcher.stop()
+        await aio_db.pool.close()
+
+routes = [
+    Route('/whatsapp', whatsapp_webhook, methods=['POST']),
+    Route('/api/members', get_members, methods=['GET']),
+    Route('/api/members/{member_id:int}/pay', mark_member_paid, methods=['PATCH']),
+    Route('/api/send-reminders', send_reminders, methods=['POST']),
+    Route('/api/stats', get_stats, methods=['GET']),
+    Route('/api/pool-stats', get_pool_stats, methods=['GET']),
+    Route('/api/changes', change_feed, methods=['GET']),
+    Mount('/', WSGIMiddleware(flask_app)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(RequestTimer, routes=routes),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ],
+    lifespan=lifespan
+)
@@ -1,18 +1,31 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import os
+import sys
 from dotenv import load_dotenv
-from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
 import schedule
 import time
 import threading
-from weasyprint import HTML, CSS
-from jinja2 import Template
 import logging
 
+# Shared modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dispatcher import dispatch
+from cache import member_cache
+from message_templates import message_templates, render
+from commands import respond
+from phones import normalize_phone, phone_key
+from queries import LEDGER_PAYMENTS_QUERY, CHANGE_VERSION_QUERY
+from http_cache import json_response
+from reports import FORMATS as REPORT_FORMATS, submit_report, get_report_job
+from migrate import migrate, available, MIGRATIONS_DIR
+import metrics
+
 # Load environment variables
 load_dotenv()
 
@@ -21,10 +34,37 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql://user:
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
+
+# The schema comes from the shared migrations, which connect with DB_*;
+# point them at DATABASE_URL unless those are set
+_database_url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+for _key, _value in (('DB_HOST', _database_url.host), ('DB_PORT', _database_url.port),
+                     ('DB_USER', _database_url.username), ('DB_PASSWORD', _database_url.password),
+                     ('DB_NAME', _database_url.database)):
+    if _value is not None:
+        os.environ.setdefault(_key, str(_value))
+
 CORS(app)
 
+# Request timing and /metrics
+metrics.init_app(app)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    metrics.observe_query(statement, time.perf_counter() - conn.info['query_started'].pop())
+
+@event.listens_for(Engine, 'handle_error')
+def _record_query_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+    metrics.db_errors.inc(query=metrics.query_name(context.statement or ''))
+
 # Twilio configuration
-twilio_client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
 TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')
 
 # Database Models
@@ -34,6 +74,10 @@ class Member(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20), nullable=False, unique=True)
+    # E.164 form used for lookups and duplicate checks (phones.normalize_phone)
+    phone_e164 = db.Column(db.String(16), nullable=True, unique=True)
+    chama_id = db.Column(db.Integer, nullable=False, default=1, index=True)
+    locale = db.Column(db.String(8), nullable=True)
     has_paid = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -57,6 +101,95 @@ class Payment(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow)
     chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'), nullable=True)
 
+class ChamaSummary(db.Model):
+    __tablename__ = 'chama_summary'
+    
+    chama_id = db.Column(db.Integer, primary_key=True)
+    total_members = db.Column(db.Integer, nullable=False, default=0)
+    paid_members = db.Column(db.Integer, nullable=False, default=0)
+    total_collected = db.Column(db.Float, nullable=False, default=0)
+    member_version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MessageTemplate(db.Model):
+    __tablename__ = 'message_templates'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    locale = db.Column(db.String(8), primary_key=True)
+    body = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def load_template(name, locale):
+    """Template source edited in the database, or None for the built-in"""
+    template = db.session.get(MessageTemplate, (name, locale))
+    return template.body if template else None
+
+# Shared compiled-template cache, loading edits through SQLAlchemy
+message_templates.loader = load_template
+
+# Chama used when a request or member doesn't name one
+DEFAULT_CHAMA_ID = int(os.getenv('DEFAULT_CHAMA_ID', 1))
+
+def apply_summary_delta(members=0, paid=0, collected=0, chama_id=DEFAULT_CHAMA_ID, member_id=None):
+    """Adjust a chama's counters and publish the change in the current session; commits with the caller"""
+    db.session.execute(
+        db.text(
+            """INSERT INTO chama_summary (chama_id, total_members, paid_members, total_collected)
+               VALUES (:chama_id, :members, :paid, :collected)
+               ON DUPLICATE KEY UPDATE
+                   total_members = total_members + VALUES(total_members),
+                   paid_members = paid_members + VALUES(paid_members),
+                   total_collected = total_collected + VALUES(total_collected),
+                   member_version = member_version + 1"""
+        ),
+        {'chama_id': chama_id, 'members': members, 'paid': paid, 'collected': collected}
+    )
+    db.session.execute(
+        db.text("INSERT INTO change_events (chama_id, member_id) VALUES (:chama_id, :member_id)"),
+        {'chama_id': chama_id, 'member_id': member_id}
+    )
+
+def post_ledger_payment(payment):
+    """Record a payment in the ledger in the current session; commits with the caller"""
+    db.session.flush()
+    db.session.execute(
+        db.text(LEDGER_PAYMENTS_QUERY.format(condition='p.id = :payment_id')),
+        {'payment_id': payment.id}
+    )
+
+def rebuild_summary(chama_id=DEFAULT_CHAMA_ID):
+    """Recompute a chama's counters from members and payments"""
+    summary = db.session.get(ChamaSummary, chama_id) or ChamaSummary(chama_id=chama_id)
+    members = Member.query.filter_by(chama_id=chama_id)
+    summary.total_members = members.count()
+    summary.paid_members = members.filter_by(has_paid=True).count()
+    summary.total_collected = db.session.query(db.func.sum(Payment.amount)).join(Member).filter(Member.chama_id == chama_id).scalar() or 0
+    summary.member_version = (summary.member_version or 0) + 1
+    db.session.add(summary)
+    db.session.commit()
+    return summary
+
+def get_summary(chama_id=DEFAULT_CHAMA_ID):
+    """Get a chama's precomputed counters, rebuilding them if missing"""
+    return db.session.get(ChamaSummary, chama_id) or rebuild_summary(chama_id)
+
+def data_version():
+    """Watermark that moves with every member or payment write, as in summary.data_version"""
+    return f"all:{db.session.execute(db.text(CHANGE_VERSION_QUERY)).scalar()}"
+
+def members_with_totals(query=None):
+    """Members paired with their total paid, computed in one grouped query"""
+    totals = db.session.query(
+        Payment.member_id,
+        db.func.sum(Payment.amount).label('total_paid')
+    ).group_by(Payment.member_id).subquery()
+    
+    query = query if query is not None else Member.query
+    return query.add_columns(
+        db.func.coalesce(totals.c.total_paid, 0)
+    ).outerjoin(totals, totals.c.member_id == Member.id).all()
+
 # API Routes
 @app.route('/api/add-member', methods=['POST'])
 def add_member():
@@ -67,19 +200,37 @@ def add_member():
         if not data.get('name') or not data.get('phone_number'):
             return jsonify({'error': 'Name and phone number are required'}), 400
         
+        # Stored in E.164, so '0712...' and '+254 712 ...' are one member
+        try:
+            phone_number = normalize_phone(data['phone_number'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            chama_id = int(data.get('chama_id') or DEFAULT_CHAMA_ID)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'chama_id must be a number'}), 400
+        if not db.session.get(Chama, chama_id):
+            return jsonify({'error': f'Chama {chama_id} not found'}), 400
+        
         # Check if member already exists
-        existing_member = Member.query.filter_by(phone_number=data['phone_number']).first()
+        existing_member = Member.query.filter_by(phone_e164=phone_number).first()
         if existing_member:
             return jsonify({'error': 'Member with this phone number already exists'}), 400
         
         member = Member(
             name=data['name'],
-            phone_number=data['phone_number'],
+            phone_number=phone_number,
+            phone_e164=phone_number,
+            chama_id=chama_id,
             has_paid=data.get('has_paid', False)
         )
         
         db.session.add(member)
+        db.session.flush()
+        apply_summary_delta(members=1, paid=1 if member.has_paid else 0, chama_id=member.chama_id, member_id=member.id)
         db.session.commit()
+        member_cache.invalidate(member.phone_number)
         
         return jsonify({
             'message': 'Member added successfully',
@@ -100,7 +251,7 @@ def mark_paid():
     try:
         data = request.get_json()
         member_id = data.get('member_id')
-        amount = data.get('amount', 1000.0)
+        amount = data.get('amount')
         
         if not member_id:
             return jsonify({'error': 'Member ID is required'}), 400
@@ -109,18 +260,28 @@ def mark_paid():
         if not member:
             return jsonify({'error': 'Member not found'}), 404
         
+        if amount is None:
+            # Default to the member's chama contribution
+            chama = db.session.get(Chama, member.chama_id)
+            amount = chama.amount_expected if chama else 1000.0
+        
         # Mark member as paid
+        newly_paid = not member.has_paid
         member.has_paid = True
         
         # Record payment
         payment = Payment(
             member_id=member_id,
             amount=amount,
-            date=datetime.utcnow()
+            date=datetime.utcnow(),
+            chama_id=member.chama_id
         )
         
         db.session.add(payment)
+        post_ledger_payment(payment)
+        apply_summary_delta(paid=1 if newly_paid else 0, collected=amount, chama_id=member.chama_id, member_id=member.id)
         db.session.commit()
+        member_cache.invalidate(member.phone_number, member.id)
         
         return jsonify({
             'message': 'Payment recorded successfully',
@@ -138,21 +299,25 @@ def mark_paid():
 @app.route('/api/reminders', methods=['GET'])
 def get_reminders():
     try:
-        unpaid_members = Member.query.filter_by(has_paid=False).all()
-        
-        reminders = []
-        for member in unpaid_members:
-            reminders.append({
-                'id': member.id,
-                'name': member.name,
-                'phone_number': member.phone_number,
-                'days_since_created': (datetime.utcnow() - member.created_at).days
-            })
+        def build():
+            unpaid_members = Member.query.filter_by(has_paid=False).all()
+            
+            reminders = []
+            for member in unpaid_members:
+                reminders.append({
+                    'id': member.id,
+                    'name': member.name,
+                    'phone_number': member.phone_number,
+                    'days_since_created': (datetime.utcnow() - member.created_at).days
+                })
+            
+            return {
+                'count': len(reminders),
+                'reminders': reminders
+            }
         
-        return jsonify({
-            'count': len(reminders),
-            'reminders': reminders
-        }), 200
+        # days_since_created moves with the date too
+        return json_response(f'{data_version()}:{datetime.utcnow().date()}', build)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -160,39 +325,42 @@ def get_reminders():
 @app.route('/api/balance-report', methods=['GET'])
 def balance_report():
     try:
-        # Get all members
-        total_members = Member.query.count()
-        paid_members = Member.query.filter_by(has_paid=True).count()
-        unpaid_members = total_members - paid_members
-        
-        # Get payment totals
-        total_payments = db.session.query(db.func.sum(Payment.amount)).scalar() or 0
-        expected_total = total_members * 1000  # Assuming 1000 per member
-        
-        # Get recent payments
-        recent_payments = db.session.query(
-            Payment, Member.name
-        ).join(Member).order_by(Payment.date.desc()).limit(10).all()
-        
-        recent_payments_list = []
-        for payment, member_name in recent_payments:
-            recent_payments_list.append({
-                'member_name': member_name,
-                'amount': payment.amount,
-                'date': payment.date.isoformat()
-            })
+        def build():
+            # Counters come from the precomputed summary row
+            summary = get_summary()
+            total_members = summary.total_members
+            paid_members = summary.paid_members
+            unpaid_members = total_members - paid_members
+            total_payments = summary.total_collected
+            expected_total = total_members * 1000  # Assuming 1000 per member
+            
+            # Get recent payments
+            recent_payments = db.session.query(
+                Payment, Member.name
+            ).join(Member).order_by(Payment.date.desc()).limit(10).all()
+            
+            recent_payments_list = []
+            for payment, member_name in recent_payments:
+                recent_payments_list.append({
+                    'member_name': member_name,
+                    'amount': payment.amount,
+                    'date': payment.date.isoformat()
+                })
+            
+            return {
+                'summary': {
+                    'total_members': total_members,
+                    'paid_members': paid_members,
+                    'unpaid_members': unpaid_members,
+                    'total_collected': total_payments,
+                    'expected_total': expected_total,
+                    'collection_percentage': (total_payments / expected_total * 100) if expected_total > 0 else 0
+                },
+                'recent_payments': recent_payments_list
+            }
         
-        return jsonify({
-            'summary': {
-                'total_members': total_members,
-                'paid_members': paid_members,
-                'unpaid_members': unpaid_members,
-                'total_collected': total_payments,
-                'expected_total': expected_total,
-                'collection_percentage': (total_payments / expected_total * 100) if expected_total > 0 else 0
-            },
-            'recent_payments': recent_payments_list
-        }), 200
+        # A summary rebuild moves the counters without a change event
+        return json_response(f'{data_version()}:{get_summary().member_version}', build)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -200,22 +368,22 @@ def balance_report():
 @app.route('/api/members', methods=['GET'])
 def get_members():
     try:
-        members = Member.query.all()
-        members_list = []
-        
-        for member in members:
-            total_paid = db.session.query(db.func.sum(Payment.amount)).filter_by(member_id=member.id).scalar() or 0
+        def build():
+            members_list = []
             
-            members_list.append({
-                'id': member.id,
-                'name': member.name,
-                'phone_number': member.phone_number,
-                'has_paid': member.has_paid,
-                'total_paid': total_paid,
-                'created_at': member.created_at.isoformat()
-            })
+            for member, total_paid in members_with_totals():
+                members_list.append({
+                    'id': member.id,
+                    'name': member.name,
+                    'phone_number': member.phone_number,
+                    'has_paid': member.has_paid,
+                    'total_paid': total_paid,
+                    'created_at': member.created_at.isoformat()
+                })
+            
+            return {'members': members_list}
         
-        return jsonify({'members': members_list}), 200
+        return json_response(data_version(), build)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -224,46 +392,54 @@ def get_members():
 @app.route('/webhook/whatsapp', methods=['POST'])
 def whatsapp_webhook():
     try:
-        incoming_msg = request.values.get('Body', '').strip().lower()
+        incoming_msg = request.values.get('Body', '')
         from_number = request.values.get('From', '')
         
-        # Remove WhatsApp prefix
-        phone_number = from_number.replace('whatsapp:', '')
+        # Canonical E.164 form, whatever prefix and spacing the sender has
+        phone_number = phone_key(from_number)
         
         response = MessagingResponse()
         msg = response.message()
         
-        # Find member by phone number
-        member = Member.query.filter_by(phone_number=phone_number).first()
+        # Find member by phone number, from cache when possible
+        member = member_cache.get(phone_number)
+        if member is None:
+            found = Member.query.filter_by(phone_e164=phone_number).first()
+            
+            if not found:
+                msg.body(render('reply_not_registered'))
+                return str(response)
+            
+            chama = db.session.get(Chama, found.chama_id)
+            member = {
+                'id': found.id,
+                'name': found.name,
+                'chama_id': found.chama_id,
+                'locale': found.locale,
+                'has_paid': found.has_paid,
+                'amount_expected': chama.amount_expected if chama else None
+            }
+            member_cache.set(phone_number, member)
         
-        if not member:
-            msg.body("Sorry, your number is not registered in our Chama system. Please contact the admin.")
-            return str(response)
-        
-        if incoming_msg in ['paid', 'done', 'complete', 'yes']:
-            if member.has_paid:
-                msg.body(f"Hi {member.name}! Our records show you've already paid. Thank you!")
-            else:
-                # Mark as paid with default amount
-                member.has_paid = True
+        def record_payment(amount):
+            # The has_paid guard makes the check and update atomic
+            updated = Member.query.filter_by(id=member['id'], has_paid=False).update({'has_paid': True})
+            if updated:
                 payment = Payment(
-                    member_id=member.id,
-                    amount=1000.0,  # Default amount
-                    date=datetime.utcnow()
+                    member_id=member['id'],
+                    amount=amount or member['amount_expected'] or 1000.0,  # Default amount
+                    date=datetime.utcnow(),
+                    chama_id=member['chama_id']
                 )
                 db.session.add(payment)
-                db.session.commit()
-                
-                msg.body(f"Thank you {member.name}! Your payment has been recorded. You're all set!")
-                
-        elif incoming_msg in ['status', 'check']:
-            if member.has_paid:
-                msg.body(f"Hi {member.name}! You're all paid up. Thank you!")
-            else:
-                msg.body(f"Hi {member.name}! You still have a pending payment. Reply 'PAID' when you've made your contribution.")
-                
-        else:
-            msg.body(f"Hi {member.name}! Reply 'PAID' if you've made your payment, or 'STATUS' to check your payment status.")
+                post_ledger_payment(payment)
+                apply_summary_delta(paid=1, collected=payment.amount, chama_id=member['chama_id'], member_id=member['id'])
+            db.session.commit()
+            member_cache.invalidate(phone_number, member['id'])
+            return bool(updated)
+        
+        template, context = respond(member, incoming_msg, record_payment, member['amount_expected'])
+        msg.body(render(template, member.get('locale'), **context))
         
         return str(response)
         
@@ -271,170 +447,102 @@ def whatsapp_webhook():
         app.logger.error(f"WhatsApp webhook error: {str(e)}")
         response = MessagingResponse()
         msg = response.message()
-        msg.body("Sorry, there was an error processing your message. Please try again later.")
+        msg.body(render('reply_error'))
         return str(response)
 
 # Scheduled Functions
-def send_whatsapp_reminder(member):
-    try:
-        message = f"Hi {member.name}! This is a friendly reminder that your Chama contribution is due. Please make your payment and reply 'PAID' to confirm. Thank you!"
-        
-        twilio_client.messages.create(
-            from_=f'whatsapp:{TWILIO_WHATSAPP_NUMBER}',
-            body=message,
-            to=f'whatsapp:{member.phone_number}'
-        )
-        
-        app.logger.info(f"Reminder sent to {member.name} ({member.phone_number})")
-        
-    except Exception as e:
-        app.logger.error(f"Failed to send reminder to {member.name}: {str(e)}")
-
 def send_daily_reminders():
     try:
         with app.app_context():
             unpaid_members = Member.query.filter_by(has_paid=False).all()
             
-            for member in unpaid_members:
-                send_whatsapp_reminder(member)
-                time.sleep(1)  # Rate limiting
+            messages = [
+                {
+                    'name': member.name,
+                    'to': member.phone_number,
+                    'body': render('reminder', member.locale, name=member.name)
+                }
+                for member in unpaid_members
+            ]
+            
+            # Sends run concurrently; the dispatcher rate-limits per sender number
+            job = dispatch(messages, sender=TWILIO_WHATSAPP_NUMBER)
             
-            app.logger.info(f"Daily reminders sent to {len(unpaid_members)} members")
+            app.logger.info(f"Daily reminders sent to {job.sent} of {len(unpaid_members)} members")
             
     except Exception as e:
         app.logger.error(f"Error in daily reminders: {str(e)}")
 
-# PDF Report Generation
+def report_data_version():
+    """Watermark that changes whenever report data changes"""
+    max_payment_id = db.session.query(db.func.max(Payment.id)).scalar() or 0
+    member_version = get_summary().member_version or 0
+    return f'{max_payment_id}-{member_version}'
+
+# Report Generation
+@app.route('/api/reports', methods=['POST'])
+def create_report():
+    try:
+        data = request.get_json(silent=True) or {}
+        report_format = data.get('format', 'pdf')
+        
+        if report_format not in REPORT_FORMATS:
+            return jsonify({'error': f"Format must be one of: {', '.join(REPORT_FORMATS)}"}), 400
+        
+        job_id = submit_report(report_format, report_data_version())
+        
+        return jsonify({
+            'job_id': job_id,
+            'status_url': f'/api/reports/{job_id}',
+            'download_url': f'/api/reports/{job_id}/download'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reports/<job_id>', methods=['GET'])
+def report_status(job_id):
+    job = get_report_job(job_id)
+    if not job:
+        return jsonify({'error': 'Report not found'}), 404
+    
+    job.pop('path')
+    return jsonify(job), 200
+
+@app.route('/api/reports/<job_id>/download', methods=['GET'])
+def download_report(job_id):
+    job = get_report_job(job_id)
+    if not job:
+        return jsonify({'error': 'Report not found'}), 404
+    if job['status'] != 'completed':
+        return jsonify({'error': f"Report is {job['status']}", 'status': job['status']}), 409
+    
+    # Served from disk with Range/conditional request support
+    return send_file(
+        job['path'],
+        mimetype=job['mimetype'],
+        as_attachment=True,
+        download_name=job['filename'],
+        conditional=True,
+        etag=f"{job['format']}-{job['version']}"
+    )
+
 @app.route('/api/generate-report', methods=['GET'])
 def generate_pdf_report():
     try:
-        # Get data for report
-        members = Member.query.all()
-        payments = db.session.query(Payment, Member.name).join(Member).order_by(Payment.date.desc()).all()
-        
-        total_collected = db.session.query(db.func.sum(Payment.amount)).scalar() or 0
-        total_members = len(members)
-        paid_members = len([m for m in members if m.has_paid])
-        
-        # HTML template for PDF
-        html_template = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Chama Report</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 40px; }
-                .header { text-align: center; margin-bottom: 30px; }
-                .summary { background: #f0f0f0; padding: 20px; margin-bottom: 30px; }
-                .summary div { display: inline-block; margin: 10px 20px; }
-                table { width: 100%; border-collapse: collapse; margin-bottom: 30px; }
-                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-                th { background-color: #f2f2f2; }
-                .paid { color: green; font-weight: bold; }
-                .unpaid { color: red; font-weight: bold; }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>Chama Financial Report</h1>
-                <p>Generated on {{ report_date }}</p>
-            </div>
-            
-            <div class="summary">
-                <h2>Summary</h2>
-                <div><strong>Total Members:</strong> {{ total_members }}</div>
-                <div><strong>Paid Members:</strong> {{ paid_members }}</div>
-                <div><strong>Unpaid Members:</strong> {{ unpaid_members }}</div>
-                <div><strong>Total Collected:</strong> KSh {{ total_collected }}</div>
-                <div><strong>Collection Rate:</strong> {{ collection_rate }}%</div>
-            </div>
-            
-            <h2>Members Status</h2>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Name</th>
-                        <th>Phone Number</th>
-                        <th>Status</th>
-                        <th>Total Paid</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {% for member in members %}
-                    <tr>
-                        <td>{{ member.name }}</td>
-                        <td>{{ member.phone_number }}</td>
-                        <td class="{{ 'paid' if member.has_paid else 'unpaid' }}">
-                            {{ 'PAID' if member.has_paid else 'PENDING' }}
-                        </td>
-                        <td>KSh {{ member.total_paid }}</td>
-                    </tr>
-                    {% endfor %}
-                </tbody>
-            </table>
-            
-            <h2>Recent Payments</h2>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Date</th>
-                        <th>Member</th>
-                        <th>Amount</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {% for payment in recent_payments %}
-                    <tr>
-                        <td>{{ payment.date }}</td>
-                        <td>{{ payment.member_name }}</td>
-                        <td>KSh {{ payment.amount }}</td>
-                    </tr>
-                    {% endfor %}
-                </tbody>
-            </table>
-        </body>
-        </html>
-        """
-        
-        # Prepare data for template
-        members_data = []
-        for member in members:
-            total_paid = db.session.query(db.func.sum(Payment.amount)).filter_by(member_id=member.id).scalar() or 0
-            members_data.append({
-                'name': member.name,
-                'phone_number': member.phone_number,
-                'has_paid': member.has_paid,
-                'total_paid': total_paid
-            })
-        
-        recent_payments_data = []
-        for payment, member_name in payments[:20]:  # Last 20 payments
-            recent_payments_data.append({
-                'date': payment.date.strftime('%Y-%m-%d %H:%M'),
-                'member_name': member_name,
-                'amount': payment.amount
-            })
-        
-        template = Template(html_template)
-        html_content = template.render(
-            report_date=datetime.now().strftime('%Y-%m-%d %H:%M'),
-            total_members=total_members,
-            paid_members=paid_members,
-            unpaid_members=total_members - paid_members,
-            total_collected=total_collected,
-            collection_rate=round((paid_members / total_members * 100) if total_members > 0 else 0, 1),
-            members=members_data,
-            recent_payments=recent_payments_data
-        )
+        # Unchanged data reuses the cached file without touching WeasyPrint
+        job_id = submit_report('pdf', report_data_version())
+        job = get_report_job(job_id)
         
-        # Generate PDF
-        pdf = HTML(string=html_content).write_pdf()
+        if job['status'] == 'completed':
+            return download_report(job_id)
         
-        return pdf, 200, {
-            'Content-Type': 'application/pdf',
-            'Content-Disposition': f'attachment; filename=chama_report_{datetime.now().strftime("%Y%m%d")}.pdf'
-        }
+        # Otherwise it is built in the report process pool; poll status_url, then fetch download_url
+        return jsonify({
+            'job_id': job_id,
+            'status_url': f'/api/reports/{job_id}',
+            'download_url': f'/api/reports/{job_id}/download'
+        }), 202
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -447,12 +555,48 @@ def run_scheduler():
         schedule.run_pending()
         time.sleep(60)  # Check every minute
 
-# Initialize database
-@app.before_first_request
-def create_tables():
-    db.create_all()
+@app.cli.command('rebuild-summary')
+def rebuild_summary_command():
+    """Recompute the precomputed chama counters from members and payments"""
+    chama_ids = {chama.id for chama in Chama.query.all()} | {DEFAULT_CHAMA_ID}
+    for chama_id in sorted(chama_ids):
+        rebuild_summary(chama_id)
+    print(f"Chama summary rebuilt for {len(chama_ids)} chamas")
+
+def ensure_schema():
+    """Apply the shared migrations; raises RuntimeError if they can't be
+
+    Tables such as change_events and ledger_entries have no models here,
+    so db.create_all() can't build the schema this app writes to.
+    """
+    if not os.path.isdir(MIGRATIONS_DIR) or not available():
+        raise RuntimeError(f"No migrations found in {MIGRATIONS_DIR}; deploy the backend inside the repository")
+    try:
+        applied = migrate()
+    except Exception as e:
+        raise RuntimeError(f"Could not apply database migrations: {e}") from e
+    if applied:
+        app.logger.info(f"Applied {len(applied)} migrations")
+
+# Apply migrations once per worker, on its first request
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+@app.before_request
+def apply_migrations():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            ensure_schema()
+            _schema_ready = True
 
 if __name__ == '__main__':
+    # Refuse to start without the schema
+    ensure_schema()
+    _schema_ready = True
+
     # Start scheduler in a separate thread
     scheduler_thread = threading.Thread(target=run_scheduler)
     scheduler_thread.daemon = True
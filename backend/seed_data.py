@@ -1,4 +1,4 @@
-from app import app, db, Member, Chama, Payment
+from app import app, db, Member, Chama, Payment, rebuild_summary
 from datetime import datetime, timedelta
 
 def seed_database():
@@ -35,7 +35,7 @@ def seed_database():
         
         members = []
         for member_data in members_data:
-            member = Member(**member_data)
+            member = Member(phone_e164=member_data['phone_number'], **member_data)
             members.append(member)
             db.session.add(member)
         
@@ -54,6 +54,9 @@ def seed_database():
         
         db.session.commit()
         
+        # Seeding bypasses the incremental counters
+        rebuild_summary()
+        
         print("Database seeded successfully!")
         print(f"Created {len(members)} members")
         print(f"Created {len(paid_members)} payments")
@@ -0,0 +1,69 @@
+"""Measure inbound command handling throughput
+
+Runs a mix of English, Swahili, misspelt and amount-bearing messages
+through the shared command engine:
+
+- match:   the old inline list membership checks, for reference
+- parse:   commands.parse (keyword table, typo matching, amounts)
+- respond: commands.respond with the in-memory conversation store and a
+           no-op payment callback, i.e. everything but the database
+
+    python benchmarks/bench_commands.py --messages 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from commands import ConversationStore, parse, respond
+
+SAMPLES = [
+    'PAID', 'paid 1000', 'Done', 'yes', 'paid ksh 1,500', 'nimelipa', 'Nimelipa 2k',
+    'status', 'STATUS?', 'check', 'hali', 'salio', 'staus', 'paidd', 'nimelpa',
+    'hello', 'msaada', 'what is this', 'ndio', 'hapana', 'paid 500',
+]
+
+def old_match(text):
+    """The inline matching the webhooks used before"""
+    incoming_msg = text.strip().lower()
+    if incoming_msg in ['paid', 'done', 'complete', 'yes']:
+        return 'pay'
+    if incoming_msg in ['status', 'check']:
+        return 'status'
+    return None
+
+def measure(handle, messages):
+    """Handle every message once; returns messages per second"""
+    started = time.perf_counter()
+    for member_id, text in messages:
+        handle(member_id, text)
+    return len(messages) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--members', type=int, default=10000)
+    args = parser.parse_args()
+
+    messages = [(random.randint(1, args.members), random.choice(SAMPLES)) for _ in range(args.messages)]
+    store = ConversationStore()
+
+    def handle(member_id, text):
+        member = {'id': member_id, 'name': 'Member', 'has_paid': member_id % 2 == 0}
+        return respond(member, text, lambda amount: True, 1000.0, store)
+
+    print(f"{'path':<8} {'msgs/s':>12}")
+    for name, fn in (
+        ('match', lambda member_id, text: old_match(text)),
+        ('parse', lambda member_id, text: parse(text)),
+        ('respond', handle),
+    ):
+        print(f"{name:<8} {measure(fn, messages):>12,.0f}")
+    print(f"{len(store)} members waiting to confirm an amount")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Compare requests/second and latency of the sync and async servers
+
+Start both against the same database, then point the harness at them:
+
+    python app.py                                   # Flask, port 5000
+    uvicorn asgi:app --port 8000 --workers 1        # async mode
+    python benchmarks/bench_load.py \\
+        --target sync=http://127.0.0.1:5000 --target async=http://127.0.0.1:8000 \\
+        --concurrency 100 --requests 5000
+
+Each scenario is run against each target in turn with the same number of
+concurrent clients:
+
+- webhook: POST /whatsapp with a STATUS message from a registered number
+- members: GET /api/members?limit=50
+- stats:   GET /api/stats
+
+Registered numbers default to the demo members inserted by
+migrations/0002_default_data.sql; pass ``--phones`` to use others. Needs
+httpx (requirements-async.txt).
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import time
+
+import httpx
+
+DEMO_PHONES = ['+254712345678', '+254723456789', '+254734567890']
+
+def scenarios(phones):
+    """Request factories by scenario name; each returns (method, path, form)"""
+    senders = itertools.cycle(phones)
+    return {
+        'webhook': lambda: ('POST', '/whatsapp', {'From': f'whatsapp:{next(senders)}', 'Body': 'STATUS'}),
+        'members': lambda: ('GET', '/api/members?limit=50', None),
+        'stats': lambda: ('GET', '/api/stats', None),
+    }
+
+def percentile(latencies, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not latencies:
+        return 0.0
+    return latencies[max(math.ceil(fraction * len(latencies)) - 1, 0)]
+
+async def run(base_url, make_request, total, concurrency):
+    """Send ``total`` requests with ``concurrency`` clients; returns the results row"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                method, path, form = make_request()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, data=form)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'rps': total / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', action='append', required=True, help='name=base_url, repeatable')
+    parser.add_argument('--scenario', action='append', choices=['webhook', 'members', 'stats'])
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100, help='requests sent before measuring')
+    parser.add_argument('--phones', nargs='+', default=DEMO_PHONES)
+    args = parser.parse_args()
+
+    targets = [target.split('=', 1) for target in args.target]
+    available = scenarios(args.phones)
+
+    print(f"{'scenario':<9} {'target':<8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for scenario in args.scenario or list(available):
+        for name, base_url in targets:
+            if args.warmup:
+                await run(base_url, available[scenario], args.warmup, min(args.concurrency, args.warmup))
+            result = await run(base_url, available[scenario], args.requests, args.concurrency)
+            print(
+                f"{scenario:<9} {name:<8} {result['rps']:>9,.0f} {result['p50_ms']:>9.1f} "
+                f"{result['p99_ms']:>9.1f} {result['errors']:>7}"
+            )
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Compare per-member total_paid queries against the grouped aggregation
+
+Reports query count and latency of the old N+1 loop and of
+members_with_totals() at several chama sizes:
+
+    python benchmarks/bench_member_totals.py --sizes 100 1000 10000
+
+Uses an in-memory SQLite database unless BENCH_DATABASE_URL is set.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ['DATABASE_URL'] = os.getenv('BENCH_DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+from sqlalchemy import event
+from app import app, db, Member, Payment, members_with_totals
+
+class QueryCounter:
+    """Count statements sent to the database"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+def seed(size, payments_per_member=3):
+    """Replace the members and payments tables with synthetic data"""
+    Payment.query.delete()
+    Member.query.delete()
+    db.session.commit()
+
+    db.session.bulk_insert_mappings(Member, [
+        {'id': i, 'name': f'Member {i}', 'phone_number': f'+2547{i:08d}', 'has_paid': random.random() < 0.5}
+        for i in range(1, size + 1)
+    ])
+    db.session.bulk_insert_mappings(Payment, [
+        {'member_id': i, 'amount': 1000.0}
+        for i in range(1, size + 1)
+        for _ in range(random.randint(0, payments_per_member))
+    ])
+    db.session.commit()
+
+def n_plus_one():
+    """The per-member SUM loop the endpoints used to run"""
+    totals = []
+    for member in Member.query.all():
+        total_paid = db.session.query(db.func.sum(Payment.amount)).filter_by(member_id=member.id).scalar() or 0
+        totals.append((member, total_paid))
+    return totals
+
+def measure(counter, fn):
+    """Run fn once and return (queries, milliseconds)"""
+    db.session.expire_all()
+    before = counter.count
+    started = time.perf_counter()
+    fn()
+    return counter.count - before, (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        counter = QueryCounter(db.engine)
+
+        print(f"{'members':>8} {'path':<10} {'queries':>8} {'ms':>10}")
+        for size in args.sizes:
+            seed(size)
+            for name, fn in (('n+1', n_plus_one), ('grouped', members_with_totals)):
+                queries, elapsed = measure(counter, fn)
+                print(f"{size:>8} {name:<10} {queries:>8} {elapsed:>10.1f}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""Compare message template render throughput
+
+Renders a personalized reminder for N members per locale with:
+
+- format:   str.format on the raw source, parsed on every call
+- template: string.Template with the source converted to $-placeholders
+- compiled: CompiledTemplate, parsed once
+- store:    TemplateStore.render, i.e. compiled plus the per-locale cache lookup
+
+    python benchmarks/bench_templates.py --messages 100000
+
+No database is needed; the store runs on the built-in templates.
+"""
+import argparse
+import os
+import re
+import string
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from message_templates import DEFAULT_TEMPLATES, CompiledTemplate, TemplateStore
+
+TEMPLATE = 'reminder_overdue'
+
+def contexts(count):
+    """Per-member render contexts"""
+    return [{'name': f'Member {i}', 'due_date': '01 Oct 2026'} for i in range(count)]
+
+def measure(render, members):
+    """Render once per member; returns messages per second"""
+    started = time.perf_counter()
+    for context in members:
+        render(context)
+    return len(members) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+
+    members = contexts(args.messages)
+    store = TemplateStore(loader=None)
+
+    print(f"{'locale':<7} {'path':<10} {'msgs/s':>12}")
+    for locale, templates in DEFAULT_TEMPLATES.items():
+        source = templates[TEMPLATE]
+        dollar = string.Template(re.sub(r'\{(\w+)\}', r'$\1', source))
+        compiled = CompiledTemplate(source)
+
+        paths = (
+            ('format', lambda context: source.format(**context)),
+            ('template', lambda context: dollar.substitute(context)),
+            ('compiled', lambda context: compiled.render(context)),
+            ('store', lambda context: store.render(TEMPLATE, locale, **context)),
+        )
+        for name, render in paths:
+            print(f"{locale:<7} {name:<10} {measure(render, members):>12,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Local fake of the Twilio Messages API for exercising the dispatcher
+
+Run it and point the app at it:
+
+    python benchmarks/fake_twilio.py --port 8099 --error-rate 0.05
+    TWILIO_API_BASE_URL=http://localhost:8099 python app.py
+
+Every POST to .../Messages.json is answered with a queued message. A
+configurable fraction of requests gets a 429 or 503 so retry/backoff
+paths can be observed, and an optional latency simulates the real API.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+
+class FakeTwilioHandler(BaseHTTPRequestHandler):
+    """Answer Twilio message-create requests"""
+
+    counter = itertools.count(1)
+    stats = {'accepted': 0, 'throttled': 0, 'errors': 0}
+    stats_lock = threading.Lock()
+    error_rate = 0.0
+    latency = 0.0
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if not self.path.endswith('/Messages.json'):
+            self._reply(404, {'code': 20404, 'message': 'Not found', 'status': 404})
+            return
+
+        if random.random() < self.error_rate:
+            status = random.choice([429, 503])
+            with self.stats_lock:
+                self.stats['throttled' if status == 429 else 'errors'] += 1
+            self._reply(status, {'code': 20429 if status == 429 else 20500, 'message': 'Try again', 'status': status})
+            return
+
+        sid = f"SM{next(self.counter):032x}"
+        with self.stats_lock:
+            self.stats['accepted'] += 1
+        self._reply(201, {
+            'sid': sid,
+            'status': 'queued',
+            'to': form.get('To', [''])[0],
+            'from': form.get('From', [''])[0],
+            'body': form.get('Body', [''])[0],
+            'num_segments': '1'
+        })
+
+    def do_GET(self):
+        # Expose counters for harnesses
+        with self.stats_lock:
+            self._reply(200, dict(self.stats))
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port=8099, error_rate=0.0, latency=0.0):
+    """Start the fake server in a background thread and return it"""
+    FakeTwilioHandler.error_rate = error_rate
+    FakeTwilioHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeTwilioHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    args = parser.parse_args()
+
+    FakeTwilioHandler.error_rate = args.error_rate
+    FakeTwilioHandler.latency = args.latency
+    print(f"Fake Twilio listening on http://127.0.0.1:{args.port}")
+    ThreadingHTTPServer(('127.0.0.1', args.port), FakeTwilioHandler).serve_forever()
\ No newline at end of file
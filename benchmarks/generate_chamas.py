@@ -0,0 +1,200 @@
+"""Fill the database with synthetic chamas for load tests and benchmarks
+
+Creates chamas with the given number of members each (1k to 1M), closed
+contribution cycles with per-member status, and a payment history in
+which most members pay on time, some are often late and a few rarely pay:
+
+    python benchmarks/generate_chamas.py --chamas 2 --members 100000 --cycles 6
+
+Uses the app's database settings (DB_HOST, DB_NAME, ...). Generated phone
+numbers are +2541XXXXXXXX, after any generated before, so runs add to
+earlier ones. Point it at a benchmark database, never at production.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import execute_query, transaction
+from migrate import migrate
+from cycles import open_cycle
+from summary import rebuild_summary
+
+PHONE_PREFIX = '+2541'
+
+FIRST_NAMES = [
+    'Grace', 'John', 'Mary', 'Peter', 'Sarah', 'David', 'Lucy', 'James', 'Faith', 'Michael',
+    'Agnes', 'Samuel', 'Rose', 'Francis', 'Catherine', 'Joseph', 'Margaret', 'Daniel', 'Jane', 'Paul',
+    'Eunice', 'Vincent', 'Esther', 'Brian', 'Mercy', 'Kevin', 'Purity', 'Dennis', 'Beatrice', 'Collins',
+]
+LAST_NAMES = [
+    'Wanjiku', 'Mwangi', 'Achieng', 'Kiprotich', 'Njeri', 'Ochieng', 'Nyambura', 'Kiplagat', 'Ndungu', 'Omondi',
+    'Wangari', 'Maina', 'Mbugua', 'Karanja', 'Kimani', 'Kamau', 'Wambui', 'Kuria', 'Macharia', 'Njoroge',
+    'Akinyi', 'Wafula', 'Wekesa', 'Otieno', 'Chebet', 'Kiptoo', 'Mutua', 'Mwende', 'Odhiambo', 'Were',
+]
+
+# (share of members, chance of paying a cycle, chance of paying late)
+PAYER_PROFILES = [(0.7, 0.95, 0.1), (0.2, 0.6, 0.5), (0.1, 0.2, 0.8)]
+
+def next_phone_number():
+    """First free number in the generated range"""
+    result = execute_query(
+        "SELECT MAX(phone_number) AS phone FROM members WHERE phone_number LIKE %s",
+        (PHONE_PREFIX + '%',),
+        fetch=True
+    )
+    last = result[0]['phone'] if result and result[0]['phone'] else None
+    return int(last[len(PHONE_PREFIX):]) + 1 if last else 0
+
+def payer_profile(rng):
+    """Pick a member's payment behaviour"""
+    roll = rng.random()
+    for share, pay_rate, late_rate in PAYER_PROFILES:
+        if roll < share:
+            return pay_rate, late_rate
+        roll -= share
+    return PAYER_PROFILES[-1][1:]
+
+def payment_time(rng, due_date, late):
+    """When a member paid for the cycle due on due_date"""
+    days = rng.randint(1, 10) if late else -rng.randint(0, 5)
+    return datetime.combine(due_date, datetime.min.time()) + timedelta(days=days, minutes=rng.randint(0, 1439))
+
+def create_chama(name, amount, cycle_days, cycles, today):
+    """Insert a chama with its closed cycles and open the current one
+
+    Returns ``(chama_id, [(cycle_id, due_date), ...], current_due_date)``.
+    """
+    due_date = today + timedelta(days=cycle_days // 4)
+    past = [due_date - timedelta(days=cycle_days * k) for k in range(cycles, 0, -1)]
+
+    with transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO chamas (name, due_date, amount_expected, cycle_days) VALUES (%s, %s, %s, %s)",
+            (name, due_date, amount, cycle_days)
+        )
+        chama_id = cursor.lastrowid
+        closed = []
+        for past_due in past:
+            cursor.execute(
+                "INSERT INTO chama_cycles (chama_id, due_date, closed_at) VALUES (%s, %s, %s)",
+                (chama_id, past_due, past_due + timedelta(days=1))
+            )
+            closed.append((cursor.lastrowid, past_due))
+        open_cycle(cursor, chama_id, due_date)
+
+    return chama_id, closed, due_date
+
+def generate_members(rng, chama_id, count, closed, cycle_start, amount, first_phone, chunk_size):
+    """Insert a chama's members, cycle statuses and payments in chunks
+
+    Returns the number of payments written.
+    """
+    now = datetime.now()
+    elapsed_minutes = max(int((now - datetime.combine(cycle_start, datetime.min.time())).total_seconds() // 60), 0)
+    phone = first_phone
+    last_id = 0
+    payments_written = 0
+
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        profiles = [payer_profile(rng) for _ in range(size)]
+        # The current cycle is partway through, so fewer have paid yet
+        paid_now = [rng.random() < pay_rate * 0.6 for pay_rate, _ in profiles]
+        paid_at_now = [now - timedelta(minutes=rng.randint(0, elapsed_minutes)) if paid else None for paid in paid_now]
+
+        with transaction() as cursor:
+            cursor.executemany(
+                """INSERT INTO members (name, phone_number, phone_e164, chama_id, has_paid, last_payment, locale)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                [
+                    (
+                        f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                        f'{PHONE_PREFIX}{phone + i:08d}',
+                        f'{PHONE_PREFIX}{phone + i:08d}',
+                        chama_id,
+                        int(paid_now[i]),
+                        paid_at_now[i],
+                        'sw' if rng.random() < 0.3 else 'en'
+                    )
+                    for i in range(size)
+                ]
+            )
+            phone += size
+
+            # Ids come back in insert order
+            cursor.execute(
+                "SELECT id FROM members WHERE chama_id = %s AND id > %s ORDER BY id LIMIT %s",
+                (chama_id, last_id, size)
+            )
+            ids = [row['id'] for row in cursor.fetchall()]
+            last_id = ids[-1]
+
+            statuses, payments = [], []
+            for member_id, (pay_rate, late_rate), paid, paid_at in zip(ids, profiles, paid_now, paid_at_now):
+                for cycle_id, cycle_due in closed:
+                    if rng.random() < pay_rate:
+                        at = payment_time(rng, cycle_due, rng.random() < late_rate)
+                        statuses.append((cycle_id, member_id, 1, at))
+                        payments.append((member_id, amount, at, chama_id))
+                    else:
+                        statuses.append((cycle_id, member_id, 0, None))
+                if paid:
+                    payments.append((member_id, amount, paid_at, chama_id))
+
+            if statuses:
+                cursor.executemany(
+                    "INSERT INTO member_cycle_status (cycle_id, member_id, has_paid, last_payment) VALUES (%s, %s, %s, %s)",
+                    statuses
+                )
+            if payments:
+                cursor.executemany(
+                    "INSERT INTO payments (member_id, amount, date, chama_id) VALUES (%s, %s, %s, %s)",
+                    payments
+                )
+            payments_written += len(payments)
+
+    return payments_written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chamas', type=int, default=1)
+    parser.add_argument('--members', type=int, default=1000, help='members per chama (1000 to 1000000)')
+    parser.add_argument('--cycles', type=int, default=3, help='closed cycles of payment history')
+    parser.add_argument('--amount', type=float, default=1000.0)
+    parser.add_argument('--cycle-days', type=int, default=30)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=None, help='make the data reproducible')
+    parser.add_argument('--migrate', action='store_true', help='apply pending migrations first')
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate()
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    phone = next_phone_number()
+
+    for n in range(args.chamas):
+        started = time.perf_counter()
+        chama_id, closed, due_date = create_chama(
+            f'Synthetic Chama {today:%Y%m%d}-{n + 1}', args.amount, args.cycle_days, args.cycles, today
+        )
+        cycle_start = due_date - timedelta(days=args.cycle_days)
+        payments = generate_members(
+            rng, chama_id, args.members, closed, cycle_start, args.amount, phone, args.chunk_size
+        )
+        phone += args.members
+        rebuild_summary(chama_id)
+        print(
+            f"chama {chama_id}: {args.members} members, {len(closed)} closed cycles, "
+            f"{payments} payments in {time.perf_counter() - started:.1f}s"
+        )
+
+if __name__ == '__main__':
+    main()
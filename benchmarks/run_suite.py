@@ -0,0 +1,241 @@
+"""Run the benchmark suite and write machine-readable results
+
+Benchmarks, each against a chama made by generate_chamas.py:
+
+- webhook:  POST /whatsapp throughput (STATUS from the chama's members)
+- stats:    GET /api/stats latency
+- dispatch: send_reminders rate, i.e. enqueue_reminders plus an outbox
+            drain in this process, against the local Twilio stub
+- report:   backend report generation time per format
+
+webhook and stats need a running server (``python app.py`` or
+``uvicorn asgi:app``); dispatch and report run in-process:
+
+    python benchmarks/run_suite.py --url http://127.0.0.1:5000 --chama-id 2 \\
+        --output results.json --baseline previous.json
+
+Results are written as JSON with the git commit and dataset size. With
+``--baseline``, metrics that got worse by more than ``--tolerance`` are
+listed and the exit status is 1, so CI can track regressions. The
+dispatch benchmark deletes the chama's outbox rows first; use a benchmark
+database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import execute_query
+
+BENCHMARKS = ['webhook', 'stats', 'dispatch', 'report']
+
+# 1 = higher is better, -1 = lower is better; other metrics are informational
+DIRECTIONS = {'rps': 1, 'messages_per_s': 1, 'p50_ms': -1, 'p99_ms': -1, 'seconds': -1}
+
+def git_commit():
+    """Commit being benchmarked, if this is a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def largest_chama():
+    """Chama with the most members"""
+    result = execute_query(
+        "SELECT chama_id, COUNT(*) AS members FROM members GROUP BY chama_id ORDER BY members DESC LIMIT 1",
+        fetch=True
+    )
+    return result[0]['chama_id'] if result else None
+
+def dataset(chama_id):
+    """Size of the chama being benchmarked"""
+    members = execute_query("SELECT COUNT(*) AS n FROM members WHERE chama_id = %s", (chama_id,), fetch=True)
+    payments = execute_query("SELECT COUNT(*) AS n FROM payments WHERE chama_id = %s", (chama_id,), fetch=True)
+    return {
+        'chama_id': chama_id,
+        'members': members[0]['n'] if members else 0,
+        'payments': payments[0]['n'] if payments else 0
+    }
+
+def bench_webhook(args):
+    """Webhook requests per second and latency"""
+    from bench_load import run as load
+
+    phones = [
+        row['phone_number'] for row in execute_query(
+            "SELECT phone_number FROM members WHERE chama_id = %s ORDER BY id LIMIT 1000",
+            (args.chama_id,),
+            fetch=True
+        ) or []
+    ]
+    if not phones:
+        raise RuntimeError(f'Chama {args.chama_id} has no members')
+
+    senders = iter(phones * (args.requests // len(phones) + 2))
+
+    def make_request():
+        return 'POST', '/whatsapp', {'From': f'whatsapp:{next(senders)}', 'Body': 'STATUS'}
+
+    return asyncio.run(load(args.url, make_request, args.requests, args.concurrency))
+
+def bench_stats(args):
+    """/api/stats requests per second and latency"""
+    from bench_load import run as load
+
+    def make_request():
+        return 'GET', f'/api/stats?chama_id={args.chama_id}', None
+
+    return asyncio.run(load(args.url, make_request, args.requests, args.concurrency))
+
+def bench_dispatch(args):
+    """Reminders queued and delivered per second through the outbox"""
+    from fake_twilio import FakeTwilioHandler, serve
+
+    server = serve(args.twilio_port, latency=args.twilio_latency)
+    # Dispatcher settings are read at import, so set them before importing it
+    os.environ['TWILIO_API_BASE_URL'] = f'http://127.0.0.1:{args.twilio_port}'
+    os.environ['DISPATCH_RATE'] = str(args.dispatch_rate)
+    os.environ['DISPATCH_BURST'] = str(args.dispatch_rate)
+    os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+    os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+    from outbox import drain, enqueue_reminders
+
+    try:
+        execute_query(
+            "DELETE o FROM outbox o JOIN members m ON m.id = o.member_id WHERE m.chama_id = %s",
+            (args.chama_id,)
+        )
+
+        started = time.perf_counter()
+        queued, _ = enqueue_reminders(args.chama_id)
+        enqueued = time.perf_counter()
+        sent = drain()
+        finished = time.perf_counter()
+    finally:
+        server.shutdown()
+
+    return {
+        'queued': queued,
+        'sent': sent,
+        'throttled': FakeTwilioHandler.stats['throttled'],
+        'enqueue_seconds': round(enqueued - started, 3),
+        'seconds': round(finished - started, 3),
+        'messages_per_s': sent / (finished - enqueued) if finished > enqueued else 0.0
+    }
+
+def bench_report(args):
+    """Report build time and size per format"""
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'mysql+mysqlconnector://{}:{}@{}/{}'.format(
+            os.getenv('DB_USER', 'root'), os.getenv('DB_PASSWORD', ''),
+            os.getenv('DB_HOST', 'localhost'), os.getenv('DB_NAME', 'chama_db')
+        )
+    sys.path.insert(0, os.path.join(ROOT, 'backend'))
+    from reports import build_report
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for report_format in args.report_formats:
+            path = os.path.join(directory, f'report.{report_format}')
+            started = time.perf_counter()
+            build_report(report_format, path)
+            results[report_format] = {
+                'seconds': round(time.perf_counter() - started, 3),
+                'bytes': os.path.getsize(path)
+            }
+    return results
+
+RUNNERS = {'webhook': bench_webhook, 'stats': bench_stats, 'dispatch': bench_dispatch, 'report': bench_report}
+
+def flatten(results):
+    """{'report.csv.seconds': 1.2, ...} for comparison"""
+    flat = {}
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    flat[f'{name}.{key}.{sub_key}'] = sub_value
+            else:
+                flat[f'{name}.{key}'] = value
+    return flat
+
+def regressions(current, baseline, tolerance):
+    """Metrics worse than the baseline by more than tolerance (a fraction)"""
+    found = []
+    old = flatten(baseline['results'])
+    for key, value in flatten(current['results']).items():
+        direction = DIRECTIONS.get(key.rsplit('.', 1)[-1])
+        before = old.get(key)
+        if not direction or not before or value is None:
+            continue
+        change = (value - before) / before
+        if change * direction < -tolerance:
+            found.append({'metric': key, 'baseline': before, 'current': value, 'change': round(change, 3)})
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server for webhook and stats')
+    parser.add_argument('--chama-id', type=int, default=None, help='defaults to the largest chama')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--twilio-port', type=int, default=8099)
+    parser.add_argument('--twilio-latency', type=float, default=0.05, help='seconds per stubbed Twilio call')
+    parser.add_argument('--dispatch-rate', type=float, default=1000, help='DISPATCH_RATE for the run')
+    parser.add_argument('--report-formats', nargs='+', default=['csv'], choices=['csv', 'xlsx', 'pdf'])
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    args.chama_id = args.chama_id or largest_chama()
+    if args.chama_id is None:
+        parser.error('No members found; run generate_chamas.py first')
+
+    document = {
+        'suite': 'chama-benchmarks',
+        'version': 1,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'params': {
+            'url': args.url, 'requests': args.requests, 'concurrency': args.concurrency,
+            'twilio_latency': args.twilio_latency, 'dispatch_rate': args.dispatch_rate
+        },
+        'dataset': dataset(args.chama_id),
+        'results': {}
+    }
+
+    for name in args.only:
+        print(f"running {name}...", file=sys.stderr)
+        document['results'][name] = RUNNERS[name](args)
+
+    output = json.dumps(document, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        found = regressions(document, baseline, args.tolerance)
+        for regression in found:
+            print(
+                f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+                f"({regression['change']:+.1%})",
+                file=sys.stderr
+            )
+        if found:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
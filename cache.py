@@ -0,0 +1,96 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache configuration
+MEMBER_CACHE_SIZE = int(os.getenv('MEMBER_CACHE_SIZE', 10000))
+MEMBER_CACHE_TTL = float(os.getenv('MEMBER_CACHE_TTL', 60))
+
+class MemberCache:
+    """Phone-number keyed member cache with TTL and LRU eviction
+
+    Entries are plain dicts. Writers must call ``invalidate`` after changing
+    a member so the next lookup goes back to the database; the TTL bounds
+    staleness across processes that don't see each other's invalidations.
+    """
+
+    def __init__(self, max_size=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._phones_by_id = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, phone_number):
+        """Get a cached member, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            member, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(phone_number)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(phone_number)
+            self.hits += 1
+            return dict(member)
+
+    def set(self, phone_number, member):
+        """Cache a member under its phone number"""
+        with self._lock:
+            if phone_number in self._entries:
+                self._remove(phone_number)
+            self._entries[phone_number] = (dict(member), time.monotonic() + self.ttl)
+            self._phones_by_id[member['id']] = phone_number
+
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, phone_number):
+        """Drop an entry; caller holds the lock"""
+        member, _ = self._entries.pop(phone_number)
+        if self._phones_by_id.get(member['id']) == phone_number:
+            del self._phones_by_id[member['id']]
+
+    def invalidate(self, phone_number=None, member_id=None):
+        """Forget a member by phone number and/or id"""
+        with self._lock:
+            if member_id is not None and member_id in self._phones_by_id:
+                self._remove(self._phones_by_id[member_id])
+            if phone_number is not None and phone_number in self._entries:
+                self._remove(phone_number)
+
+    def clear(self):
+        """Forget every member"""
+        with self._lock:
+            self._entries.clear()
+            self._phones_by_id.clear()
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+member_cache = MemberCache()
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""Live change feed for dashboards
+
+Writers add a row to ``change_events`` in the same transaction as the
+change (summary.apply_delta does it for them). Each process runs one
+poller thread, only while someone is subscribed, that reads new events by
+primary key every CHANGE_POLL_SECONDS and fans them out: the changed
+member rows and the chama's counters, loaded once per tick however many
+dashboards are open. Bulk changes (member_id NULL) become a 'reload'.
+
+Auto-increment ids are allocated before commit, so an event can become
+visible after a higher id was already read; ids skipped over are
+rechecked for CHANGE_GAP_SECONDS before being given up on.
+"""
+from db import execute_query
+from queries import SUMMARY_QUERY, CHANGE_VERSION_QUERY, stats_response, json_default
+from collections import defaultdict
+import json
+import os
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Change feed configuration
+CHANGE_POLL_SECONDS = float(os.getenv('CHANGE_POLL_SECONDS', 1))
+CHANGE_RETENTION_SECONDS = int(os.getenv('CHANGE_RETENTION_SECONDS', 3600))
+CHANGE_GAP_SECONDS = 10
+CHANGE_BATCH_SIZE = 1000
+MAX_GAPS = 1000
+
+# Events a subscriber may fall behind by before it is told to reload instead
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+
+FEED_MEMBER_FIELDS = 'id, chama_id, name, phone_number, has_paid, last_payment, created_at'
+
+def format_event(event, data):
+    """One Server-Sent Events message
+
+    Messages carry no id: a reconnecting client gets 'ready' again and
+    reloads, rather than resuming from Last-Event-ID.
+    """
+    return f'event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n'
+
+KEEPALIVE = ': keep-alive\n\n'
+
+# Stop proxies from caching or buffering the stream
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+class Subscription:
+    """One dashboard's stream of formatted events for a chama
+
+    ``deliver`` is called from the poller thread; by default events go on
+    a thread-safe queue, read with ``get``. The async server passes its
+    own ``deliver`` to hand events to the event loop instead.
+    """
+
+    def __init__(self, chama_id, deliver=None):
+        self.chama_id = chama_id
+        self._queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.deliver = deliver or self._put
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            # Too far behind to catch up row by row
+            self._drain()
+            self._queue.put_nowait(format_event('reload', {}))
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get(self, timeout=KEEPALIVE_SECONDS):
+        """Next message, or a keep-alive comment after ``timeout`` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return KEEPALIVE
+
+class ChangeFeed:
+    """Per-process poller shared by every subscription"""
+
+    def __init__(self, interval=CHANGE_POLL_SECONDS):
+        self.interval = interval
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+        self._gaps = {}  # missing id -> time first noticed
+
+    def subscribe(self, chama_id, deliver=None):
+        """Start receiving a chama's changes; the first message is 'ready'"""
+        subscription = Subscription(chama_id, deliver)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+        subscription.deliver(format_event('ready', {'chama_id': chama_id}))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def stats(self):
+        """Open subscriptions and the last event id read"""
+        with self._lock:
+            return {'subscribers': len(self._subscriptions), 'last_id': self._last_id, 'gaps': len(self._gaps)}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    # Stop polling until the next subscriber
+                    self._thread = None
+                    self._last_id = None
+                    self._gaps.clear()
+                    return
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Change feed poll failed: {e}")
+            time.sleep(self.interval)
+
+    def _read(self):
+        """New events, plus any late arrivals among the ids skipped before"""
+        if self._last_id is None:
+            result = execute_query(CHANGE_VERSION_QUERY, fetch=True)
+            if result is None:
+                return []
+            self._last_id = result[0]['version']
+            return []
+
+        events = execute_query(
+            "SELECT id, chama_id, member_id FROM change_events WHERE id > %s ORDER BY id LIMIT %s",
+            (self._last_id, CHANGE_BATCH_SIZE),
+            fetch=True
+        ) or []
+
+        now = time.monotonic()
+        expected = self._last_id + 1
+        for event in events:
+            for missing in range(expected, event['id']):
+                self._gaps[missing] = now
+            expected = event['id'] + 1
+        if events:
+            self._last_id = events[-1]['id']
+
+        self._gaps = {gap: since for gap, since in self._gaps.items() if now - since < CHANGE_GAP_SECONDS}
+        if len(self._gaps) > MAX_GAPS:
+            self._gaps = dict(sorted(self._gaps.items())[-MAX_GAPS:])
+
+        late = list(self._gaps)
+        if late:
+            placeholders = ', '.join(['%s'] * len(late))
+            found = execute_query(
+                f"SELECT id, chama_id, member_id FROM change_events WHERE id IN ({placeholders})",
+                late,
+                fetch=True
+            ) or []
+            for event in found:
+                self._gaps.pop(event['id'], None)
+            events = found + events
+        return events
+
+    def poll(self):
+        """Read new events and deliver them to the matching subscriptions"""
+        with self._lock:
+            chamas = {subscription.chama_id for subscription in self._subscriptions}
+
+        events = [event for event in self._read() if event['chama_id'] in chamas]
+        if not events:
+            return
+
+        by_chama = defaultdict(list)
+        for event in events:
+            by_chama[event['chama_id']].append(event)
+
+        member_ids = {event['member_id'] for event in events if event['member_id'] is not None}
+        members = {}
+        if member_ids:
+            placeholders = ', '.join(['%s'] * len(member_ids))
+            rows = execute_query(
+                f"SELECT {FEED_MEMBER_FIELDS} FROM members WHERE id IN ({placeholders})",
+                list(member_ids),
+                fetch=True
+            ) or []
+            members = {row['id']: row for row in rows}
+
+        messages = {}
+        for chama_id, chama_events in by_chama.items():
+            if any(event['member_id'] is None for event in chama_events):
+                batch = [format_event('reload', {})]
+            else:
+                changed = {event['member_id'] for event in chama_events}
+                batch = [format_event('member', members[member_id]) for member_id in changed if member_id in members]
+
+            summary = execute_query(SUMMARY_QUERY, (chama_id,), fetch=True)
+            if summary:
+                batch.append(format_event('stats', stats_response(summary[0])))
+            messages[chama_id] = batch
+
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            for message in messages.get(subscription.chama_id, ()):
+                subscription.deliver(message)
+
+feed = ChangeFeed()
+
+def stream(chama_id):
+    """Generator of SSE messages for a Flask streaming response
+
+    Subscribes when the response starts, so a client gone before then
+    leaves nothing behind.
+    """
+    subscription = feed.subscribe(chama_id)
+    try:
+        while True:
+            yield subscription.get()
+    finally:
+        feed.unsubscribe(subscription)
+
+def prune_changes(retention=CHANGE_RETENTION_SECONDS, batch_size=10000):
+    """Delete events older than ``retention`` seconds; returns the number deleted
+
+    The newest event is always kept: its id is the data version behind
+    conditional responses, which must never go back.
+    """
+    result = execute_query(CHANGE_VERSION_QUERY, fetch=True)
+    if not result:
+        return 0
+    newest = result[0]['version']
+
+    deleted = 0
+    while True:
+        count = execute_query(
+            "DELETE FROM change_events WHERE created_at < NOW() - INTERVAL %s SECOND AND id < %s LIMIT %s",
+            (retention, newest, batch_size)
+        )
+        if not count:
+            return deleted
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,227 @@
+"""WhatsApp command parsing and per-member conversation state
+
+Shared by the main app and the backend: each app supplies the member and a
+callback that records a payment, and gets back the reply template to send.
+"""
+from collections import OrderedDict, namedtuple
+import os
+import re
+import threading
+import time
+
+# Conversation configuration
+CONVERSATION_STORE_SIZE = int(os.getenv('CONVERSATION_STORE_SIZE', 10000))
+CONVERSATION_TTL = float(os.getenv('CONVERSATION_TTL', 600))
+
+# Keywords per intent, English and Swahili. 'confirm' and 'cancel' only
+# mean something while a member is being asked to confirm an amount; a
+# 'pay' keyword with no amount confirms too.
+INTENT_KEYWORDS = {
+    'pay': ['paid', 'done', 'complete', 'completed', 'yes', 'nimelipa', 'nimeshalipa', 'nimetuma', 'nimemaliza', 'imelipwa'],
+    'status': ['status', 'check', 'balance', 'hali', 'angalia', 'salio', 'deni'],
+    'help': ['help', 'menu', 'hello', 'msaada', 'habari'],
+    'confirm': ['y', 'ok', 'okay', 'confirm', 'ndio', 'ndiyo', 'sawa', 'thibitisha'],
+    'cancel': ['no', 'n', 'cancel', 'stop', 'hapana', 'acha', 'sitisha'],
+}
+
+# Words that only qualify an amount
+CURRENCY_WORDS = {'ksh', 'kshs', 'kes', 'sh', 'shs', 'bob'}
+
+# A message with any of these never records a payment ("I have not paid",
+# "bado", "sijalipa"); apostrophes are dropped before matching
+NEGATION_WORDS = {'not', 'no', 'never', 'havent', 'hasnt', 'didnt', 'dont', 'cant', 'cannot', 'wont', 'bado'}
+NEGATION_PREFIXES = ('sija', 'hatuja')
+
+# Typos (one missing, extra, wrong or swapped letter) are matched by
+# single-character deletions, only for words at least this long so short
+# words don't collide
+FUZZY_MIN_LENGTH = 4
+
+# Intents where a wrong or swapped letter is too likely to be another word
+# ('pain', 'maid', 'gone'); only a missing or extra letter is forgiven
+NO_SUBSTITUTION_INTENTS = {'pay'}
+
+_PUNCTUATION = '.,!?;:()[]"/='
+_AMOUNT = re.compile(r"(?:%s)?(\d[\d,]*(?:\.\d+)?k?)" % '|'.join(sorted(CURRENCY_WORDS, key=len, reverse=True)))
+_WORD = re.compile(r"[a-z]+")
+
+def _deletions(word):
+    """Every string made by deleting one character of word"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+def _compile_keywords():
+    """Build the exact and one-deletion lookup tables"""
+    exact = {}
+    fuzzy = {}
+    ambiguous = set()
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            exact[keyword] = intent
+            if len(keyword) < FUZZY_MIN_LENGTH:
+                continue
+            for variant in _deletions(keyword) | {keyword}:
+                if fuzzy.get(variant, intent) != intent:
+                    ambiguous.add(variant)
+                fuzzy[variant] = intent
+    for variant in ambiguous:
+        del fuzzy[variant]
+    return exact, fuzzy
+
+_EXACT, _FUZZY = _compile_keywords()
+
+Command = namedtuple('Command', ['intent', 'amount'])
+
+def lookup(word):
+    """Intent for a single word, tolerating one typo; None if unknown"""
+    intent = _EXACT.get(word)
+    if intent or len(word) < FUZZY_MIN_LENGTH:
+        return intent
+
+    # Missing letter: the word is a deletion of a keyword
+    intent = _FUZZY.get(word)
+    if intent:
+        return intent
+
+    for variant in _deletions(word):
+        intent = _FUZZY.get(variant)
+        if not intent:
+            continue
+        # Extra letter: a deletion of the word is the keyword itself
+        if _EXACT.get(variant) == intent:
+            return intent
+        # Wrong or swapped letter: both lose a letter to the same string
+        if intent not in NO_SUBSTITUTION_INTENTS:
+            return intent
+    return None
+
+def parse_amount(token):
+    """Amount in a numeric token like '500', '1,000', '2.5k'"""
+    multiplier = 1000 if token.endswith('k') else 1
+    try:
+        return float(token.rstrip('k').replace(',', '')) * multiplier
+    except ValueError:
+        return None
+
+def _is_negation(word):
+    """Whether a word negates a payment claim"""
+    return word in NEGATION_WORDS or word.startswith(NEGATION_PREFIXES)
+
+def parse(text):
+    """Parse a message into a Command; intent is None if nothing matched
+
+    A payment is claimed only by a 'pay' keyword leading the message, and
+    never by a message with a negation in it. Other intents are taken from
+    the first recognised keyword anywhere. The amount is the first token
+    that is only a number, optionally after a currency word, so
+    "paid ksh 1,500" is ``Command('pay', 1500.0)`` and "QWE123" has none.
+    """
+    tokens = [
+        token.strip(_PUNCTUATION)
+        for token in text.lower().replace("'", '').replace('\u2019', '').split()
+    ]
+    tokens = [token for token in tokens if token]
+    negated = any(_is_negation(token) for token in tokens)
+
+    intent = None
+    amount = None
+    for position, token in enumerate(tokens):
+        match = _AMOUNT.fullmatch(token)
+        if match:
+            if amount is None:
+                amount = parse_amount(match.group(1))
+        elif intent is None and token not in CURRENCY_WORDS and _WORD.fullmatch(token):
+            candidate = lookup(token)
+            if candidate != 'pay' or (position == 0 and not negated):
+                intent = candidate
+        if intent is not None and amount is not None:
+            break
+    return Command(intent, amount)
+
+# Conversation states
+IDLE = 0
+AWAITING_CONFIRMATION = 1
+
+class ConversationStore:
+    """Per-member conversation state with TTL and LRU eviction
+
+    Entries are ``(state, amount, expires_at)`` tuples keyed by member id,
+    which keeps each member to a few dozen bytes. State is per process;
+    pass a store backed by shared storage when replies can land on a
+    different worker than the question.
+    """
+
+    def __init__(self, max_size=CONVERSATION_STORE_SIZE, ttl=CONVERSATION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, member_id):
+        """Current ``(state, amount)`` for a member"""
+        with self._lock:
+            entry = self._entries.get(member_id)
+            if entry is None:
+                return IDLE, None
+            if entry[2] < time.monotonic():
+                del self._entries[member_id]
+                return IDLE, None
+            return entry[0], entry[1]
+
+    def set(self, member_id, state, amount=None):
+        """Move a member to a state"""
+        with self._lock:
+            if state == IDLE:
+                self._entries.pop(member_id, None)
+                return
+            self._entries[member_id] = (state, amount, time.monotonic() + self.ttl)
+            self._entries.move_to_end(member_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+conversations = ConversationStore()
+
+def _format_amount(amount):
+    """Amount for a reply, without a trailing .0"""
+    return f'{amount:,.0f}' if amount == int(amount) else f'{amount:,.2f}'
+
+def respond(member, text, record_payment, expected_amount=None, store=conversations):
+    """Run one inbound message through the conversation
+
+    ``member`` is a dict with ``id``, ``name`` and ``has_paid``.
+    ``record_payment(amount)`` marks the member paid (``amount`` is None
+    when they didn't give one) and returns whether it changed anything.
+    Returns ``(template, context)`` for the reply.
+    """
+    command = parse(text)
+    context = {'name': member['name']}
+    state, pending_amount = store.get(member['id'])
+
+    if state == AWAITING_CONFIRMATION:
+        store.set(member['id'], IDLE)
+        if command.intent in ('confirm', 'pay') and command.amount is None:
+            recorded = record_payment(pending_amount)
+            return ('reply_payment_recorded' if recorded else 'reply_already_paid'), context
+        if command.intent == 'cancel':
+            return 'reply_cancelled', context
+        # Anything else starts over
+
+    intent = command.intent
+
+    if intent == 'pay':
+        if member['has_paid']:
+            return 'reply_already_paid', context
+        amount = command.amount
+        if amount is not None and expected_amount and amount != expected_amount:
+            store.set(member['id'], AWAITING_CONFIRMATION, amount)
+            context.update(amount=_format_amount(amount), expected=_format_amount(expected_amount))
+            return 'reply_confirm_amount', context
+        recorded = record_payment(amount)
+        return ('reply_payment_recorded' if recorded else 'reply_already_paid'), context
+
+    if intent == 'status':
+        return ('reply_status_paid' if member['has_paid'] else 'reply_status_pending'), context
+
+    return 'reply_help', context
@@ -0,0 +1,164 @@
+from db import execute_query, transaction
+from cache import member_cache
+from summary import apply_delta, DEFAULT_CHAMA_ID
+from ledger import post_dues, snapshot
+from planner import REMINDER_POLICY
+from datetime import date, timedelta
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Members reset per transaction during a rollover
+CYCLE_CHUNK_SIZE = int(os.getenv('CYCLE_CHUNK_SIZE', 1000))
+
+# A cycle stays open until its last reminder stage has gone out
+ROLLOVER_GRACE_DAYS = max(days for days, _, _ in REMINDER_POLICY)
+
+def rollover_cutoff(today):
+    """Cycles due before this date are ready to roll over on ``today``"""
+    return today - timedelta(days=ROLLOVER_GRACE_DAYS)
+
+def next_due_date(due_date, cycle_days, today):
+    """Due date of the cycle after the one ending on ``due_date``
+
+    At least one step of ``cycle_days`` on, so a rollover before the due
+    date still opens a new cycle, and after ``today``.
+    """
+    step = timedelta(days=cycle_days or 30)
+    due_date += step
+    while due_date <= today:
+        due_date += step
+    return due_date
+
+def open_cycle(cursor, chama_id, due_date):
+    """Open (or reuse) the cycle ending on due_date and make it current"""
+    cursor.execute(
+        "INSERT IGNORE INTO chama_cycles (chama_id, due_date) VALUES (%s, %s)",
+        (chama_id, due_date)
+    )
+    cursor.execute(
+        "SELECT id FROM chama_cycles WHERE chama_id = %s AND due_date = %s",
+        (chama_id, due_date)
+    )
+    cycle_id = cursor.fetchone()['id']
+    cursor.execute(
+        "UPDATE chamas SET due_date = %s, current_cycle_id = %s WHERE id = %s",
+        (due_date, cycle_id, chama_id)
+    )
+    if chama_id == DEFAULT_CHAMA_ID:
+        # settings.due_date mirrors the default chama for older clients
+        cursor.execute("UPDATE settings SET due_date = %s WHERE id = 1", (due_date,))
+    return cycle_id
+
+def get_chama(chama_id):
+    """Get a chama's cycle fields"""
+    result = execute_query(
+        "SELECT id, name, due_date, cycle_days, amount_expected, current_cycle_id FROM chamas WHERE id = %s",
+        (chama_id,),
+        fetch=True
+    )
+    return result[0] if result else None
+
+def archive_and_reset(chama_id, cycle_id):
+    """Record each member's status and balance for the closing cycle and clear has_paid
+
+    Works through the chama's members in id order, CYCLE_CHUNK_SIZE at a
+    time, each chunk in its own short transaction so webhook writes are
+    never blocked behind a whole-table update. Reminder plans are cleared
+    too, so the planner starts each escalation again. Returns the number reset.
+    """
+    last_id = 0
+    reset = 0
+
+    while True:
+        with transaction() as cursor:
+            cursor.execute(
+                "SELECT id FROM members WHERE chama_id = %s AND id > %s ORDER BY id LIMIT %s",
+                (chama_id, last_id, CYCLE_CHUNK_SIZE)
+            )
+            ids = [row['id'] for row in cursor.fetchall()]
+            if not ids:
+                return reset
+
+            low, high = last_id, ids[-1]
+            # Close the cycle's books: balance through every entry so far
+            snapshot(cursor, ids, cycle_id)
+            # First archive wins: when a rollover is retried after a partial
+            # run, members already reset must keep the status archived before
+            cursor.execute(
+                """INSERT IGNORE INTO member_cycle_status (cycle_id, member_id, has_paid, last_payment)
+                   SELECT %s, id, COALESCE(has_paid, 0), last_payment FROM members
+                   WHERE chama_id = %s AND id > %s AND id <= %s""",
+                (cycle_id, chama_id, low, high)
+            )
+            cursor.execute(
+                "UPDATE members SET has_paid = 0 WHERE chama_id = %s AND id > %s AND id <= %s AND has_paid = 1",
+                (chama_id, low, high)
+            )
+            cleared = cursor.rowcount
+            if cleared:
+                apply_delta(cursor, paid=-cleared, chama_id=chama_id)
+                reset += cleared
+            # Start the new cycle's reminder escalation from scratch
+            cursor.execute(
+                "UPDATE members SET reminder_stage = 0, next_reminder_at = NULL WHERE chama_id = %s AND id > %s AND id <= %s",
+                (chama_id, low, high)
+            )
+
+        last_id = high
+
+def rollover_chama(chama_id):
+    """Close a chama's current cycle and open the next one"""
+    chama = get_chama(chama_id)
+    if not chama:
+        raise ValueError(f"Chama {chama_id} not found")
+
+    cycle_id = chama['current_cycle_id']
+    if not cycle_id:
+        with transaction() as cursor:
+            cycle_id = open_cycle(cursor, chama_id, chama['due_date'])
+
+    reset = archive_and_reset(chama_id, cycle_id)
+
+    next_due = next_due_date(chama['due_date'], chama['cycle_days'], date.today())
+
+    with transaction() as cursor:
+        cursor.execute(
+            """UPDATE chama_cycles c
+               SET c.closed_at = NOW(),
+                   c.total_members = (SELECT COUNT(*) FROM member_cycle_status WHERE cycle_id = c.id),
+                   c.paid_members = (SELECT COUNT(*) FROM member_cycle_status WHERE cycle_id = c.id AND has_paid = 1)
+               WHERE c.id = %s""",
+            (cycle_id,)
+        )
+        next_cycle_id = open_cycle(cursor, chama_id, next_due)
+        # No counter change; publishes the new due date to live dashboards
+        apply_delta(cursor, chama_id=chama_id)
+
+    dues = post_dues(chama_id, next_cycle_id, chama['amount_expected'])
+
+    member_cache.clear()
+    logger.info(f"Chama {chama_id} rolled over to {next_due}; {reset} members reset, {dues} dues posted")
+    return next_due
+
+def rollover_due_cycles():
+    """Roll over every chama whose due date is more than ROLLOVER_GRACE_DAYS past
+
+    Rolling over resets reminder stages, so waiting out the grace period
+    lets the overdue and final reminders go out first.
+    """
+    due = execute_query(
+        "SELECT id FROM chamas WHERE due_date < %s",
+        (rollover_cutoff(date.today()),),
+        fetch=True
+    ) or []
+
+    rolled = 0
+    for chama in due:
+        try:
+            rollover_chama(chama['id'])
+            rolled += 1
+        except Exception as e:
+            logger.error(f"Cycle rollover failed for chama {chama['id']}: {e}")
+    return rolled
\ No newline at end of file
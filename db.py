@@ -1,74 +1,249 @@
 import mysql.connector
 import os
+import queue
+import threading
+import time
+import logging
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from metrics import Gauge, db_errors, observe_query, query_name, register_collector
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+
+def _connect_args():
+    """Connection arguments shared by direct and pooled connections"""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', 3306)),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'chama_db'),
+        'autocommit': True
+    }
+
 def get_db_connection():
     """Get database connection"""
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'chama_db'),
-            autocommit=True
-        )
+        connection = mysql.connector.connect(**_connect_args())
         return connection
     except mysql.connector.Error as err:
         print(f"Database connection error: {err}")
         return None
 
-def init_database():
-    """Initialize database with schema"""
-    try:
-        # First connect without database to create it
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            autocommit=True
-        )
-        
-        cursor = connection.cursor()
-        
-        # Read and execute schema
-        with open('schema.sql', 'r') as file:
-            schema_sql = file.read()
-            
-        # Split by semicolon and execute each statement
-        statements = [stmt.strip() for stmt in schema_sql.split(';') if stmt.strip()]
-        
-        for statement in statements:
-            if statement:
-                cursor.execute(statement)
-        
-        cursor.close()
-        connection.close()
-        print("Database initialized successfully!")
-        
-    except Exception as e:
-        print(f"Error initializing database: {e}")
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections
+
+    Connections are checked for health when borrowed and recycled once
+    they have sat idle longer than ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, idle_timeout=DB_POOL_IDLE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._recycled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _open(self):
+        """Open a fresh connection for the pool"""
+        return mysql.connector.connect(**_connect_args())
+
+    def _discard(self, connection):
+        """Close a connection and free its slot"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._recycled += 1
+
+    def _is_healthy(self, connection, idle_since):
+        """Check an idle connection before handing it out"""
+        if time.monotonic() - idle_since > self.idle_timeout:
+            return False
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Borrow a healthy connection, waiting up to the pool timeout"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            try:
+                connection, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._created < self.size
+                    if can_open:
+                        self._created += 1
+                if can_open:
+                    try:
+                        connection = self._open()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                try:
+                    connection, idle_since = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            if self._is_healthy(connection, idle_since):
+                break
+            self._discard(connection)
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool"""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def stats(self):
+        """Pool usage and wait-time counters"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'acquired': self._acquired,
+                'recycled': self._recycled,
+                'wait_avg_ms': round(self._wait_total / self._acquired * 1000, 3) if self._acquired else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3)
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def pool_stats():
+    """Get connection pool statistics"""
+    return get_pool().stats()
+
+db_pool = Gauge('db_pool_connections', 'Pooled database connections by state', ['state'])
+
+def _collect_pool():
+    stats = get_pool().stats()
+    db_pool.replace({(state,): stats[state] for state in ('open', 'in_use', 'idle')})
+
+register_collector(_collect_pool)
+
+class TimedCursor:
+    """Cursor wrapper recording each statement's duration in metrics"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    def executemany(self, query, seq_params):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
 
 def execute_query(query, params=None, fetch=False):
     """Execute database query"""
-    connection = get_db_connection()
-    if not connection:
-        return None
-        
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            result = cursor.fetchall()
-        else:
-            result = cursor.rowcount
-            
-        cursor.close()
-        connection.close()
-        return result
-        
+        with get_pool().connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            started = time.perf_counter()
+            cursor.execute(query, params or ())
+
+            if fetch:
+                result = cursor.fetchall()
+            else:
+                result = cursor.rowcount
+            observe_query(query, time.perf_counter() - started)
+
+            cursor.close()
+            return result
+
     except Exception as e:
-        print(f"Query execution error: {e}")
-        return None
\ No newline at end of file
+        db_errors.inc(query=query_name(query))
+        logger.error(f"Query execution error ({query_name(query)}): {e}")
+        return None
+
+@contextmanager
+def transaction():
+    """Run several statements on one pooled connection as a single transaction
+
+    Yields a dictionary cursor that times each statement; commits on
+    success and rolls back if the block raises. Errors propagate to the
+    caller.
+    """
+    with get_pool().connection() as connection:
+        connection.start_transaction()
+        cursor = TimedCursor(connection.cursor(dictionary=True))
+        try:
+            yield cursor
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
\ No newline at end of file
@@ -0,0 +1,183 @@
+from concurrent.futures import ThreadPoolExecutor
+from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+import os
+import random
+import threading
+import time
+import logging
+from dotenv import load_dotenv
+from metrics import observe_twilio, twilio_outcome
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Twilio configuration
+TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER', '+14155238886')
+TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL')  # e.g. a local fake Twilio server
+
+# Dispatch configuration
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', 8))
+DISPATCH_RATE = float(os.getenv('DISPATCH_RATE', 10))  # messages per second per sender
+DISPATCH_BURST = int(os.getenv('DISPATCH_BURST', 10))
+DISPATCH_MAX_RETRIES = int(os.getenv('DISPATCH_MAX_RETRIES', 4))
+DISPATCH_BACKOFF = float(os.getenv('DISPATCH_BACKOFF', 0.5))  # seconds, doubled per retry
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_twilio_client():
+    """Get the shared Twilio client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
+                if TWILIO_API_BASE_URL:
+                    client.api.base_url = TWILIO_API_BASE_URL.rstrip('/')
+                _client = client
+    return _client
+
+class TokenBucket:
+    """Thread-safe token bucket limiting sends to ``rate`` per second"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(sender):
+    """Get the rate limiter for a sender number"""
+    with _buckets_lock:
+        if sender not in _buckets:
+            _buckets[sender] = TokenBucket(DISPATCH_RATE, DISPATCH_BURST)
+        return _buckets[sender]
+
+def _is_retryable(error):
+    """Twilio throttling and server errors are worth retrying"""
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+def _outcome(error):
+    """Metrics outcome label for a failed send"""
+    if isinstance(error, TwilioRestException):
+        return twilio_outcome(error.status)
+    if isinstance(error, (ConnectionError, TimeoutError, OSError)):
+        return 'network_error'
+    return 'client_error'
+
+def send_message(to, body, sender=None):
+    """Send one WhatsApp message, retrying with backoff on 429/5xx
+
+    Returns the Twilio message SID.
+    """
+    sender = sender or TWILIO_WHATSAPP_NUMBER
+    bucket = get_bucket(sender)
+    attempt = 0
+
+    while True:
+        bucket.acquire()
+        started = time.perf_counter()
+        try:
+            message = get_twilio_client().messages.create(
+                from_=f'whatsapp:{sender}',
+                body=body,
+                to=f'whatsapp:{to}'
+            )
+            observe_twilio('sent', time.perf_counter() - started)
+            return message.sid
+        except Exception as e:
+            observe_twilio(_outcome(e), time.perf_counter() - started)
+            if attempt >= DISPATCH_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = DISPATCH_BACKOFF * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+
+class DispatchJob:
+    """Progress of one bulk dispatch"""
+
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.errors = []
+        self.status = 'running'
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, name, error=None):
+        """Record the outcome of one message"""
+        with self._lock:
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.errors.append(f"Failed to send to {name}: {error}")
+
+    def to_dict(self):
+        """Serialize job progress"""
+        with self._lock:
+            return {
+                'status': self.status,
+                'total': self.total,
+                'sent': self.sent,
+                'failed': self.failed,
+                'pending': self.total - self.sent - self.failed,
+                'errors': list(self.errors[-50:]),
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+
+def dispatch(messages, sender=None, workers=None, job=None, on_result=None):
+    """Send messages concurrently through a bounded worker pool
+
+    ``messages`` is an iterable of dicts with ``to``, ``body`` and an
+    optional ``name``. ``on_result(message, sid, error)`` is called as each
+    send finishes. Blocks until every message has been attempted and
+    returns the job.
+    """
+    messages = list(messages)
+    job = job or DispatchJob(len(messages))
+
+    def send(message):
+        sid, error = None, None
+        try:
+            sid = send_message(message['to'], message['body'], sender)
+        except Exception as e:
+            error = e
+        job.record(message.get('name', message['to']), error)
+        if on_result:
+            try:
+                on_result(message, sid, error)
+            except Exception as e:
+                logger.error(f"Dispatch result callback failed: {e}")
+
+    with ThreadPoolExecutor(max_workers=workers or DISPATCH_WORKERS) as executor:
+        list(executor.map(send, messages))
+
+    job.status = 'completed'
+    job.finished_at = time.time()
+    logger.info(f"Dispatch finished: {job.sent} sent, {job.failed} failed")
+    return job
\ No newline at end of file
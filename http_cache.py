@@ -0,0 +1,174 @@
+"""Conditional, compressed JSON responses for the polled read APIs
+
+A read endpoint gives a cheap data version (summary.data_version: one
+primary-key lookup) and a function building its body. The ETag is derived
+from the URL and that version, so a client sending it back in
+If-None-Match gets a 304 without the body being built at all. Otherwise
+the serialized body, gzipped once if it is large, is kept in a small LRU
+keyed by the ETag, so every dashboard polling the same view shares one
+build per change.
+
+The version is read before the body. A write landing in between leaves a
+newer body under the older tag, which the next poll replaces; a body is
+never older than its tag.
+"""
+from collections import OrderedDict
+import gzip
+import hashlib
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Response cache configuration
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = 6
+
+# Clients may keep a copy but must revalidate it on every use
+CACHE_CONTROL = 'no-cache'
+
+def make_etag(key, version):
+    """Weak ETag for a URL at a data version
+
+    Weak because the same tag covers the plain and gzipped bodies.
+    """
+    digest = hashlib.sha1(f'{key}|{version}'.encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header covers ``etag`` (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip"""
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            quality = params.strip()
+            if not quality.startswith('q='):
+                return True
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+class CachedBody:
+    """A serialized response body, with its gzipped form made on first use"""
+
+    def __init__(self, body):
+        self.body = body
+        self._gzipped = None
+
+    def encode(self, accept_encoding):
+        """``(body, content_encoding)`` for a client's Accept-Encoding"""
+        if len(self.body) < COMPRESS_MIN_BYTES or not accepts_gzip(accept_encoding):
+            return self.body, None
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, COMPRESS_LEVEL)
+        return self._gzipped, 'gzip'
+
+class ResponseCache:
+    """ETag-keyed LRU of serialized response bodies
+
+    A new data version means a new tag, so entries never need
+    invalidating; stale ones simply age out.
+    """
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag):
+        """Get a cached body, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def set(self, etag, body):
+        """Cache a serialized body; returns its CachedBody"""
+        entry = CachedBody(body)
+        with self._lock:
+            self._entries[etag] = entry
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def revalidated(self):
+        """Count a request answered with 304"""
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        """Forget every body"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss and 304 counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+response_cache = ResponseCache()
+
+def headers(etag, content_encoding=None):
+    """Caching headers of a 200 or 304 response"""
+    result = {'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if content_encoding:
+        result['Content-Encoding'] = content_encoding
+    return result
+
+def json_response(version, build):
+    """Flask JSON response for ``build()``, or a 304 if the client's copy is current
+
+    ``version`` is the data the body depends on (see summary.data_version);
+    with None the body is built and sent uncached. ``build`` may raise, for
+    the route to turn into its usual error response.
+    """
+    from flask import Response, current_app, jsonify, request
+
+    if version is None:
+        return jsonify(build())
+
+    etag = make_etag(request.full_path, version)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response_cache.revalidated()
+        return Response(status=304, headers=headers(etag))
+
+    entry = response_cache.get(etag)
+    if entry is None:
+        entry = response_cache.set(etag, current_app.json.dumps(build()).encode('utf-8'))
+
+    body, content_encoding = entry.encode(request.headers.get('Accept-Encoding'))
+    return Response(body, mimetype='application/json', headers=headers(etag, content_encoding))
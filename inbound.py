@@ -0,0 +1,224 @@
+from db import execute_query, transaction
+from cache import member_cache
+from summary import apply_delta
+from ledger import post_payment
+from outbox import enqueue, kick
+from message_templates import render
+from phones import phone_key
+from commands import respond, CONVERSATION_TTL, IDLE
+from queries import (
+    MEMBER_BY_PHONE_QUERY, MARK_PAID_QUERY, INSERT_PAYMENT_QUERY, CONVERSATION_QUERY,
+    SAVE_CONVERSATION_QUERY, CLEAR_CONVERSATION_QUERY, RECORD_INBOUND_QUERY
+)
+from concurrent.futures import ThreadPoolExecutor
+import os
+import logging
+from metrics import Gauge, profiled, register_collector
+
+logger = logging.getLogger(__name__)
+
+# Inbound message configuration
+WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'false').lower() == 'true'
+INBOUND_WORKERS = int(os.getenv('INBOUND_WORKERS', 4))
+INBOUND_MAX_ATTEMPTS = int(os.getenv('INBOUND_MAX_ATTEMPTS', 3))
+INBOUND_STALE_SECONDS = int(os.getenv('INBOUND_STALE_SECONDS', 60))
+
+class DbConversationStore:
+    """Conversation state in the conversation_state table
+
+    Same interface as commands.ConversationStore, but shared by every
+    worker, so a member's "YES" is understood whichever process gets it.
+    """
+
+    def __init__(self, ttl=CONVERSATION_TTL):
+        self.ttl = ttl
+
+    def get(self, member_id):
+        """Current ``(state, amount)`` for a member"""
+        result = execute_query(CONVERSATION_QUERY, (member_id,), fetch=True)
+        if not result:
+            return IDLE, None
+        return result[0]['state'], result[0]['amount']
+
+    def set(self, member_id, state, amount=None):
+        """Move a member to a state"""
+        with transaction() as cursor:
+            if state == IDLE:
+                cursor.execute(CLEAR_CONVERSATION_QUERY, (member_id,))
+            else:
+                cursor.execute(SAVE_CONVERSATION_QUERY, (member_id, state, amount, int(self.ttl)))
+
+conversation_store = DbConversationStore()
+
+@profiled('handle_message')
+def handle_message(phone_number, text):
+    """Apply a member's WhatsApp command; returns ``(member, reply text)``
+
+    ``phone_number`` is the sender's phones.phone_key. ``member`` is None
+    when the number is not registered.
+    """
+    # Find member by phone number, from cache when possible
+    member = member_cache.get(phone_number)
+    if member is None:
+        member_result = execute_query(MEMBER_BY_PHONE_QUERY, (phone_number,), fetch=True)
+
+        if not member_result:
+            return None, render('reply_not_registered')
+
+        member = member_result[0]
+        member_cache.set(phone_number, member)
+
+    def record_payment(amount):
+        # A "PAID" without an amount is a payment of the chama's contribution
+        if amount is None:
+            amount = member['amount_expected']
+        if amount is None:
+            return False
+        # Mark as paid; the has_paid guard makes the check and update atomic
+        with transaction() as cursor:
+            cursor.execute(MARK_PAID_QUERY, (member['id'],))
+            updated = cursor.rowcount
+            if updated:
+                cursor.execute(INSERT_PAYMENT_QUERY, (member['id'], amount, member['chama_id']))
+                post_payment(cursor, cursor.lastrowid)
+                apply_delta(cursor, paid=1, collected=amount, chama_id=member['chama_id'], member_id=member['id'])
+        member_cache.invalidate(phone_number, member['id'])
+        return bool(updated)
+
+    template, context = respond(member, text, record_payment, member['amount_expected'], conversation_store)
+    return member, render(template, member.get('locale'), **context)
+
+def record_inbound(message_sid, from_number, body):
+    """Store an inbound message; returns False if this MessageSid was seen before"""
+    with transaction() as cursor:
+        cursor.execute(RECORD_INBOUND_QUERY, (message_sid, from_number, body))
+        return cursor.rowcount == 1
+
+def _claim(message_sid):
+    """Mark a received message as being processed; returns it, or None if taken"""
+    with transaction() as cursor:
+        cursor.execute(
+            """SELECT message_sid, from_number, body, attempts FROM inbound_messages
+               WHERE message_sid = %s AND status = 'received'
+               FOR UPDATE SKIP LOCKED""",
+            (message_sid,)
+        )
+        message = cursor.fetchone()
+        if message:
+            cursor.execute(
+                "UPDATE inbound_messages SET status = 'processing', attempts = attempts + 1, updated_at = NOW() WHERE message_sid = %s",
+                (message_sid,)
+            )
+    return message
+
+def _reply(message_sid, member, to, body):
+    """Queue the reply through the outbox; the MessageSid keys it so it goes out once"""
+    enqueue([{
+        'key': f"reply:{message_sid}",
+        'member_id': member['id'] if member else None,
+        'to': to,
+        'body': body
+    }])
+    kick()
+
+def process_inbound(message_sid):
+    """Handle one stored inbound message and send its reply"""
+    message = _claim(message_sid)
+    if not message:
+        return
+
+    phone_number = phone_key(message['from_number'])
+    try:
+        member, reply = handle_message(phone_number, message['body'])
+        _reply(message_sid, member, phone_number, reply)
+        execute_query(
+            "UPDATE inbound_messages SET status = 'processed', last_error = NULL, updated_at = NOW() WHERE message_sid = %s",
+            (message_sid,)
+        )
+    except Exception as e:
+        logger.error(f"Inbound message {message_sid} failed: {e}")
+        gave_up = message['attempts'] + 1 >= INBOUND_MAX_ATTEMPTS
+        execute_query(
+            "UPDATE inbound_messages SET status = %s, last_error = %s, updated_at = NOW() WHERE message_sid = %s",
+            ('failed' if gave_up else 'received', str(e)[:500], message_sid)
+        )
+        if gave_up:
+            try:
+                _reply(message_sid, None, phone_number, render('reply_error'))
+            except Exception as reply_error:
+                logger.error(f"Could not send error reply for {message_sid}: {reply_error}")
+
+_executor = None
+
+def _get_executor():
+    """Worker pool shared by inbound messages"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=INBOUND_WORKERS, thread_name_prefix='inbound')
+    return _executor
+
+def submit(message_sid):
+    """Process an inbound message in the worker pool"""
+    _get_executor().submit(process_inbound, message_sid)
+
+def resubmit_stale():
+    """Requeue messages left unprocessed, e.g. by a restart mid-burst
+
+    Every claim counts as an attempt, including one a crash cut short, so
+    a message that keeps taking its worker down is marked failed after
+    INBOUND_MAX_ATTEMPTS and the sender gets the error reply. Returns the
+    number resubmitted.
+    """
+    with transaction() as cursor:
+        cursor.execute(
+            """SELECT message_sid, from_number FROM inbound_messages
+               WHERE status = 'processing' AND updated_at < NOW() - INTERVAL %s SECOND AND attempts >= %s
+               FOR UPDATE SKIP LOCKED""",
+            (INBOUND_STALE_SECONDS, INBOUND_MAX_ATTEMPTS)
+        )
+        abandoned = cursor.fetchall()
+        if abandoned:
+            placeholders = ', '.join(['%s'] * len(abandoned))
+            cursor.execute(
+                f"""UPDATE inbound_messages SET status = 'failed', last_error = %s, updated_at = NOW()
+                    WHERE message_sid IN ({placeholders})""",
+                [f"Unfinished after {INBOUND_MAX_ATTEMPTS} attempts"] + [row['message_sid'] for row in abandoned]
+            )
+        cursor.execute(
+            """UPDATE inbound_messages SET status = 'received'
+               WHERE status = 'processing' AND updated_at < NOW() - INTERVAL %s SECOND AND attempts < %s""",
+            (INBOUND_STALE_SECONDS, INBOUND_MAX_ATTEMPTS)
+        )
+        cursor.execute(
+            """SELECT message_sid FROM inbound_messages
+               WHERE status = 'received' AND updated_at < NOW() - INTERVAL %s SECOND
+               ORDER BY created_at""",
+            (INBOUND_STALE_SECONDS,)
+        )
+        stale = [row['message_sid'] for row in cursor.fetchall()]
+
+    for message in abandoned:
+        logger.error(f"Inbound message {message['message_sid']} failed: unfinished after {INBOUND_MAX_ATTEMPTS} attempts")
+        try:
+            _reply(message['message_sid'], None, phone_key(message['from_number']), render('reply_error'))
+        except Exception as reply_error:
+            logger.error(f"Could not send error reply for {message['message_sid']}: {reply_error}")
+
+    for message_sid in stale:
+        submit(message_sid)
+    return len(stale)
+
+queue_depth = Gauge('inbound_queue_depth', 'Inbound messages not yet answered by status', ['status'])
+
+def _collect_queue_depth():
+    rows = execute_query(
+        """SELECT status, COUNT(*) AS count FROM inbound_messages
+           WHERE status IN ('received', 'processing') GROUP BY status""",
+        fetch=True
+    )
+    if rows is not None:
+        depth = {('received',): 0, ('processing',): 0}
+        depth.update({(row['status'],): row['count'] for row in rows})
+        queue_depth.replace(depth)
+
+register_collector(_collect_queue_depth)
@@ -0,0 +1,70 @@
+from db import transaction
+import os
+import socket
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Lease configuration
+LEADER_LEASE_SECONDS = int(os.getenv('LEADER_LEASE_SECONDS', 60))
+
+class LeaderLease:
+    """A named lease in the scheduler_leases table held by at most one process
+
+    Every process calls ``renew()`` periodically. The holder extends its
+    lease; anyone else takes it over only once it has expired, so a crashed
+    leader is replaced within ``ttl`` seconds.
+    """
+
+    def __init__(self, name, ttl=LEADER_LEASE_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    def renew(self):
+        """Acquire or extend the lease; returns whether this process holds it"""
+        try:
+            with transaction() as cursor:
+                # The first process to create the lease holds it for a full ttl
+                cursor.execute(
+                    """INSERT IGNORE INTO scheduler_leases (name, holder, expires_at)
+                       VALUES (%s, %s, UTC_TIMESTAMP() + INTERVAL %s SECOND)""",
+                    (self.name, self.holder, self.ttl)
+                )
+                cursor.execute(
+                    """SELECT holder, expires_at < UTC_TIMESTAMP() AS expired
+                       FROM scheduler_leases WHERE name = %s FOR UPDATE""",
+                    (self.name,)
+                )
+                lease = cursor.fetchone()
+
+                leader = lease['holder'] == self.holder or bool(lease['expired'])
+                if leader:
+                    cursor.execute(
+                        """UPDATE scheduler_leases
+                           SET holder = %s, expires_at = UTC_TIMESTAMP() + INTERVAL %s SECOND
+                           WHERE name = %s""",
+                        (self.holder, self.ttl, self.name)
+                    )
+        except Exception as e:
+            # Without the database we can't prove we still lead
+            logger.error(f"Could not renew lease {self.name}: {e}")
+            leader = False
+
+        if leader != self.is_leader:
+            logger.info(f"{self.holder} {'acquired' if leader else 'lost'} lease {self.name}")
+        self.is_leader = leader
+        return leader
+
+    def release(self):
+        """Give up the lease so another process can take over immediately"""
+        if not self.is_leader:
+            return
+        with transaction() as cursor:
+            cursor.execute(
+                "UPDATE scheduler_leases SET expires_at = UTC_TIMESTAMP() WHERE name = %s AND holder = %s",
+                (self.name, self.holder)
+            )
+        self.is_leader = False
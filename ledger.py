@@ -0,0 +1,200 @@
+"""Append-only payment ledger with per-cycle balance snapshots
+
+Every change to what a member owes is a new ``ledger_entries`` row:
+a cycle's contribution ('due'), a 'payment', a 'penalty' or a 'reversal'
+cancelling an earlier entry. Rows are never updated or deleted. Amounts
+are signed by their effect on the balance, so a positive balance is
+arrears and a negative one is credit.
+
+At each cycle rollover every member's balance is snapshotted along with
+the last entry it covers. A balance is then the latest snapshot plus the
+entries after it, one index range on ``(member_id, id)``, however long
+the member's history grows.
+"""
+from db import execute_query, transaction
+from queries import LEDGER_PAYMENTS_QUERY, LEDGER_PAYMENT_QUERY
+from decimal import Decimal, InvalidOperation
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ledger configuration
+LEDGER_CHUNK_SIZE = int(os.getenv('LEDGER_CHUNK_SIZE', 1000))
+LEDGER_PAGE_SIZE = 50
+
+KINDS = ('due', 'payment', 'penalty', 'reversal')
+
+ENTRY_FIELDS = 'id, member_id, chama_id, cycle_id, kind, amount, payment_id, reverses_id, note, occurred_at'
+
+def parse_amount(value):
+    """Positive amount with at most two decimals; raises ValueError"""
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount
+
+def post_payment(cursor, payment_id):
+    """Record a payments row in the ledger inside the caller's transaction"""
+    cursor.execute(LEDGER_PAYMENT_QUERY, (payment_id,))
+
+def post_receipts(cursor, receipts):
+    """Record the payments with these M-Pesa receipts in one statement"""
+    placeholders = ', '.join(['%s'] * len(receipts))
+    cursor.execute(LEDGER_PAYMENTS_QUERY.format(condition=f'p.mpesa_receipt IN ({placeholders})'), list(receipts))
+
+def post_penalty(member_id, amount, note=None):
+    """Charge a member a penalty in their chama's current cycle; returns the entry id"""
+    amount = parse_amount(amount)
+    with transaction() as cursor:
+        cursor.execute(
+            """INSERT INTO ledger_entries (member_id, chama_id, cycle_id, kind, amount, note)
+               SELECT m.id, m.chama_id, c.current_cycle_id, 'penalty', %s, %s
+               FROM members m LEFT JOIN chamas c ON c.id = m.chama_id
+               WHERE m.id = %s""",
+            (amount, note, member_id)
+        )
+        if not cursor.rowcount:
+            raise LookupError(f"Member {member_id} not found")
+        return cursor.lastrowid
+
+def reverse(entry_id, note=None):
+    """Cancel an entry with an equal and opposite one; returns the reversal's id
+
+    An entry can be reversed once, and reversals themselves can't be.
+    """
+    with transaction() as cursor:
+        cursor.execute(
+            "SELECT id, member_id, chama_id, cycle_id, kind, amount FROM ledger_entries WHERE id = %s",
+            (entry_id,)
+        )
+        entry = cursor.fetchone()
+        if not entry:
+            raise LookupError(f"Ledger entry {entry_id} not found")
+        if entry['kind'] == 'reversal':
+            raise ValueError("A reversal can't be reversed; post a new entry instead")
+
+        # reverses_id is unique, so a second reversal inserts nothing
+        cursor.execute(
+            """INSERT IGNORE INTO ledger_entries (member_id, chama_id, cycle_id, kind, amount, reverses_id, note)
+               VALUES (%s, %s, %s, 'reversal', %s, %s, %s)""",
+            (entry['member_id'], entry['chama_id'], entry['cycle_id'], -entry['amount'], entry_id, note)
+        )
+        if not cursor.rowcount:
+            raise ValueError(f"Ledger entry {entry_id} is already reversed")
+        return cursor.lastrowid
+
+def post_dues(chama_id, cycle_id, amount):
+    """Charge every member of a chama the contribution for a new cycle
+
+    Runs in chunks of LEDGER_CHUNK_SIZE members, each its own transaction.
+    Entries are keyed by cycle and member, so a rerun charges no one
+    twice. Returns the number of entries posted.
+    """
+    last_id = 0
+    posted = 0
+
+    while True:
+        with transaction() as cursor:
+            cursor.execute(
+                "SELECT id FROM members WHERE chama_id = %s AND id > %s ORDER BY id LIMIT %s",
+                (chama_id, last_id, LEDGER_CHUNK_SIZE)
+            )
+            ids = [row['id'] for row in cursor.fetchall()]
+            if not ids:
+                return posted
+
+            cursor.execute(
+                """INSERT IGNORE INTO ledger_entries (member_id, chama_id, cycle_id, kind, amount, idempotency_key)
+                   SELECT id, chama_id, %s, 'due', %s, CONCAT('due:', %s, ':', id) FROM members
+                   WHERE chama_id = %s AND id > %s AND id <= %s""",
+                (cycle_id, amount, cycle_id, chama_id, last_id, ids[-1])
+            )
+            posted += cursor.rowcount
+
+        last_id = ids[-1]
+
+def _latest_snapshots(cursor, member_ids):
+    """``{member_id: (balance, last_entry_id)}`` from each member's newest snapshot"""
+    placeholders = ', '.join(['%s'] * len(member_ids))
+    cursor.execute(
+        f"""SELECT s.member_id, s.balance, s.last_entry_id
+            FROM ledger_snapshots s
+            JOIN (SELECT member_id, MAX(last_entry_id) AS last_entry_id FROM ledger_snapshots
+                  WHERE member_id IN ({placeholders}) GROUP BY member_id) latest
+              ON latest.member_id = s.member_id AND latest.last_entry_id = s.last_entry_id""",
+        list(member_ids)
+    )
+    return {row['member_id']: (row['balance'], row['last_entry_id']) for row in cursor.fetchall()}
+
+def _deltas(cursor, snapshots, member_ids, lock=False):
+    """``{member_id: (sum, last id)}`` of the entries after each member's snapshot"""
+    conditions = []
+    params = []
+    for member_id in member_ids:
+        conditions.append('(member_id = %s AND id > %s)')
+        params.extend([member_id, snapshots.get(member_id, (0, 0))[1]])
+    cursor.execute(
+        f"""SELECT member_id, SUM(amount) AS amount, MAX(id) AS last_entry_id
+            FROM ledger_entries WHERE {' OR '.join(conditions)}
+            GROUP BY member_id{' FOR UPDATE' if lock else ''}""",
+        params
+    )
+    return {row['member_id']: (row['amount'], row['last_entry_id']) for row in cursor.fetchall()}
+
+def snapshot(cursor, member_ids, cycle_id):
+    """Snapshot the balances of some members at the close of a cycle
+
+    Runs inside the caller's transaction. The entries are read with a
+    locking read, which waits for uncommitted inserts for these members,
+    so no entry can land below a snapshot's last_entry_id after the fact.
+    """
+    if not member_ids:
+        return
+    snapshots = _latest_snapshots(cursor, member_ids)
+    deltas = _deltas(cursor, snapshots, member_ids, lock=True)
+
+    rows = []
+    for member_id in member_ids:
+        balance, last_entry_id = snapshots.get(member_id, (Decimal(0), 0))
+        amount, last_delta_id = deltas.get(member_id, (Decimal(0), last_entry_id))
+        rows.append((member_id, cycle_id, balance + amount, last_delta_id, member_id))
+
+    cursor.executemany(
+        """INSERT IGNORE INTO ledger_snapshots (member_id, cycle_id, chama_id, balance, last_entry_id)
+           SELECT %s, %s, chama_id, %s, %s FROM members WHERE id = %s""",
+        rows
+    )
+
+def balances(member_ids):
+    """``{member_id: balance}``: latest snapshot plus the entries after it"""
+    if not member_ids:
+        return {}
+    with transaction() as cursor:
+        snapshots = _latest_snapshots(cursor, member_ids)
+        deltas = _deltas(cursor, snapshots, member_ids)
+    return {
+        member_id: snapshots.get(member_id, (Decimal(0), 0))[0] + deltas.get(member_id, (Decimal(0), 0))[0]
+        for member_id in member_ids
+    }
+
+def balance(member_id):
+    """A member's balance; positive means arrears"""
+    return balances([member_id])[member_id]
+
+def history(member_id, before_id=None, limit=LEDGER_PAGE_SIZE):
+    """A page of a member's entries, newest first; pass the last id as ``before_id`` for the next"""
+    if before_id:
+        return execute_query(
+            f"SELECT {ENTRY_FIELDS} FROM ledger_entries WHERE member_id = %s AND id < %s ORDER BY id DESC LIMIT %s",
+            (member_id, before_id, limit),
+            fetch=True
+        )
+    return execute_query(
+        f"SELECT {ENTRY_FIELDS} FROM ledger_entries WHERE member_id = %s ORDER BY id DESC LIMIT %s",
+        (member_id, limit),
+        fetch=True
+    )
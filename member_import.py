@@ -0,0 +1,158 @@
+from db import execute_query, transaction
+from cache import member_cache
+from summary import apply_delta, DEFAULT_CHAMA_ID
+from phones import normalize_phone
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Import configuration
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+IMPORT_MAX_ERRORS = 1000
+
+def _upsert_chunk(chunk, chama_id):
+    """Upsert one chunk of normalized rows; returns the number created"""
+    phones = [row['phone_number'] for row in chunk]
+    placeholders = ', '.join(['%s'] * len(phones))
+
+    with transaction() as cursor:
+        # Matched on the canonical number, so '0712...' stored before
+        # normalization is the same member as '+254712...'
+        cursor.execute(
+            f"SELECT phone_e164 FROM members WHERE phone_e164 IN ({placeholders})",
+            phones
+        )
+        existing = {row['phone_e164'] for row in cursor.fetchall()}
+
+        cursor.executemany(
+            """INSERT INTO members (name, phone_number, phone_e164, chama_id) VALUES (%s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE name = VALUES(name)""",
+            [(row['name'], row['phone_number'], row['phone_number'], chama_id) for row in chunk]
+        )
+
+        created = len(chunk) - len(existing)
+        # Also tells live dashboards to reload, so run it for updates too
+        apply_delta(cursor, members=created, chama_id=chama_id)
+
+    for phone in phones:
+        member_cache.invalidate(phone)
+    return created
+
+def import_members(rows, chama_id=DEFAULT_CHAMA_ID):
+    """Validate, normalize and upsert members of a chama from an iterable of dicts
+
+    Rows need ``name`` and ``phone_number`` (or ``phone``). Existing members
+    keep their chama; only their name is updated. Members stored before
+    phone normalization are backfilled first, so they are matched on
+    their canonical number rather than imported twice. Rows are
+    consumed lazily and written in chunks, so memory stays bounded by the
+    chunk size plus the set of phone numbers already seen. Returns a report
+    with per-row errors (row numbers start at 1).
+    """
+    report = {'processed': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    backfilled = backfill_phones()
+    if backfilled['updated']:
+        logger.info(f"Backfilled {backfilled['updated']} phone numbers before import")
+    seen = set()
+    chunk = []
+
+    def fail(row_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_MAX_ERRORS:
+            report['errors'].append({'row': row_number, 'error': error})
+        else:
+            report['errors_truncated'] = True
+
+    def flush():
+        try:
+            created = _upsert_chunk(chunk, chama_id)
+            report['created'] += created
+            report['updated'] += len(chunk) - created
+        except Exception as e:
+            for row in chunk:
+                fail(row['row'], f'Database error: {e}')
+        chunk.clear()
+
+    for row_number, row in enumerate(rows, start=1):
+        report['processed'] += 1
+
+        if not isinstance(row, dict):
+            fail(row_number, 'Row must be an object')
+            continue
+
+        name = str(row.get('name') or '').strip()
+        raw_phone = row.get('phone_number') or row.get('phone')
+        if not name:
+            fail(row_number, 'Name is required')
+            continue
+
+        try:
+            phone_number = normalize_phone(raw_phone)
+        except ValueError as e:
+            fail(row_number, str(e))
+            continue
+
+        if phone_number in seen:
+            fail(row_number, f'Duplicate phone number in import: {phone_number}')
+            continue
+        seen.add(phone_number)
+
+        chunk.append({'row': row_number, 'name': name[:100], 'phone_number': phone_number})
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush()
+
+    if chunk:
+        flush()
+
+    return report
+
+def backfill_phones(batch_size=IMPORT_CHUNK_SIZE):
+    """Fill in members.phone_e164 for numbers stored before it existed
+
+    Walks members without one in id order, a batch per statement. Numbers
+    that don't normalize, or that normalize to another member's, are left
+    NULL and counted; those members can't be found by the webhook until
+    an admin fixes or merges them. Returns the counts.
+    """
+    counts = {'updated': 0, 'invalid': 0, 'duplicate': 0}
+    last_id = 0
+
+    while True:
+        rows = execute_query(
+            "SELECT id, phone_number FROM members WHERE phone_e164 IS NULL AND id > %s ORDER BY id LIMIT %s",
+            (last_id, batch_size),
+            fetch=True
+        )
+        if not rows:
+            return counts
+        last_id = rows[-1]['id']
+
+        canonical = {}
+        for row in rows:
+            try:
+                canonical[row['id']] = normalize_phone(row['phone_number'])
+            except ValueError:
+                counts['invalid'] += 1
+        if not canonical:
+            continue
+
+        cases = ' '.join(['WHEN %s THEN %s'] * len(canonical))
+        placeholders = ', '.join(['%s'] * len(canonical))
+        params = [value for pair in canonical.items() for value in pair] + list(canonical)
+        with transaction() as cursor:
+            # IGNORE skips rows whose number another member already has
+            cursor.execute(
+                f"""UPDATE IGNORE members SET phone_e164 = CASE id {cases} END
+                    WHERE id IN ({placeholders}) AND phone_e164 IS NULL""",
+                params
+            )
+            updated = cursor.rowcount
+
+        counts['updated'] += updated
+        counts['duplicate'] += len(canonical) - updated
+        if updated < len(canonical):
+            logger.warning(
+                f"{len(canonical) - updated} members between ids {rows[0]['id']} and {last_id} "
+                f"share a phone number with another member"
+            )
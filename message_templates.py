@@ -0,0 +1,205 @@
+import os
+import string
+import threading
+import time
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Template configuration
+DEFAULT_LOCALE = os.getenv('DEFAULT_LOCALE', 'en')
+TEMPLATE_CACHE_TTL = float(os.getenv('TEMPLATE_CACHE_TTL', 60))
+
+# Built-in templates; a row in message_templates overrides the same name and locale
+DEFAULT_TEMPLATES = {
+    'en': {
+        'reminder': "Hi {name}! This is a friendly reminder that your Chama contribution is due. Please make your payment and reply 'PAID' to confirm. Thank you!",
+        'reminder_early': "Hi {name}! Your Chama contribution is due on {due_date}. Paying early keeps the group on track. Reply 'PAID' once you've paid.",
+        'reminder_upcoming': "Hi {name}! A friendly reminder that your Chama contribution is due on {due_date}. Reply 'PAID' once you've paid.",
+        'reminder_due': "Hi {name}! Your Chama contribution is due today. Please make your payment and reply 'PAID' to confirm. Thank you!",
+        'reminder_overdue': "Hi {name}! Your Chama contribution was due on {due_date} and is now overdue. Please pay as soon as you can and reply 'PAID'.",
+        'reminder_final': "Hi {name}! Your Chama contribution due on {due_date} is still outstanding. Please pay today or contact the admin.",
+        'reply_not_registered': "Sorry, your number is not registered in our Chama system. Please contact the admin.",
+        'reply_already_paid': "Hi {name}! Our records show you've already paid. Thank you!",
+        'reply_payment_recorded': "Thank you {name}! Your payment has been recorded. You're all set!",
+        'reply_status_paid': "Hi {name}! You're all paid up. Thank you!",
+        'reply_status_pending': "Hi {name}! You still have a pending payment. Reply 'PAID' when you've made your contribution.",
+        'reply_help': "Hi {name}! Reply 'PAID' if you've made your payment, or 'STATUS' to check your payment status.",
+        'reply_confirm_amount': "Hi {name}! You said you paid KES {amount}, but the contribution is KES {expected}. Reply YES to record KES {amount} or NO to cancel.",
+        'reply_cancelled': "OK {name}, nothing was recorded. Reply 'PAID' when you've made your payment.",
+        'reply_error': "Sorry, there was an error processing your message. Please try again later.",
+    },
+    'sw': {
+        'reminder': "Habari {name}! Huu ni ukumbusho kwamba mchango wako wa Chama unadaiwa. Tafadhali lipa kisha ujibu 'PAID' kuthibitisha. Asante!",
+        'reminder_early': "Habari {name}! Mchango wako wa Chama unadaiwa tarehe {due_date}. Kulipa mapema kunasaidia kikundi. Jibu 'PAID' ukishalipa.",
+        'reminder_upcoming': "Habari {name}! Ukumbusho kwamba mchango wako wa Chama unadaiwa tarehe {due_date}. Jibu 'PAID' ukishalipa.",
+        'reminder_due': "Habari {name}! Mchango wako wa Chama unadaiwa leo. Tafadhali lipa kisha ujibu 'PAID' kuthibitisha. Asante!",
+        'reminder_overdue': "Habari {name}! Mchango wako wa Chama ulipaswa kulipwa tarehe {due_date} na sasa umechelewa. Tafadhali lipa haraka iwezekanavyo na ujibu 'PAID'.",
+        'reminder_final': "Habari {name}! Mchango wako wa Chama wa tarehe {due_date} bado haujalipwa. Tafadhali lipa leo au wasiliana na msimamizi.",
+        'reply_not_registered': "Samahani, nambari yako haijasajiliwa kwenye mfumo wetu wa Chama. Tafadhali wasiliana na msimamizi.",
+        'reply_already_paid': "Habari {name}! Rekodi zetu zinaonyesha tayari umelipa. Asante!",
+        'reply_payment_recorded': "Asante {name}! Malipo yako yamerekodiwa. Uko sawa!",
+        'reply_status_paid': "Habari {name}! Umelipa kikamilifu. Asante!",
+        'reply_status_pending': "Habari {name}! Bado una malipo yanayosubiri. Jibu 'PAID' ukishatoa mchango wako.",
+        'reply_help': "Habari {name}! Jibu 'PAID' kama umelipa, au 'STATUS' kuangalia hali ya malipo yako.",
+        'reply_confirm_amount': "Habari {name}! Umesema umelipa KES {amount}, lakini mchango ni KES {expected}. Jibu NDIO kurekodi KES {amount} au HAPANA kusitisha.",
+        'reply_cancelled': "Sawa {name}, hakuna kilichorekodiwa. Jibu 'PAID' ukishalipa.",
+        'reply_error': "Samahani, kumetokea hitilafu katika kushughulikia ujumbe wako. Tafadhali jaribu tena baadaye.",
+    },
+}
+
+class CompiledTemplate:
+    """A message template parsed once into a %-format string
+
+    Sources use ``{field}`` placeholders. Parsing happens here, so
+    ``render`` is a single C-level ``%`` with a mapping, however many
+    messages are rendered. Raises ValueError for malformed sources or placeholders
+    with format specs, conversions or attribute access.
+    """
+
+    __slots__ = ('source', 'fields', '_format')
+
+    def __init__(self, source):
+        parts = []
+        fields = []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            parts.append(literal.replace('%', '%%'))
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f'Unsupported placeholder: {{{field}}}')
+            parts.append(f'%({field})s')
+            fields.append(field)
+
+        self.source = source
+        self.fields = tuple(fields)
+        self._format = ''.join(parts)
+
+    def render(self, context):
+        """Fill in the placeholders from a mapping; raises KeyError if one is missing"""
+        return self._format % context
+
+def _load_from_db(name, locale):
+    """Template source stored in the database, or None"""
+    from db import execute_query
+
+    result = execute_query(
+        "SELECT body FROM message_templates WHERE name = %s AND locale = %s",
+        (name, locale),
+        fetch=True
+    )
+    return result[0]['body'] if result else None
+
+class TemplateStore:
+    """Compiled templates cached per (name, locale)
+
+    Sources come from ``loader(name, locale)`` (the database by default)
+    and fall back to DEFAULT_TEMPLATES, then to DEFAULT_LOCALE. Edits made
+    through this process call ``invalidate``; the TTL bounds how long other
+    processes keep serving the old version.
+    """
+
+    def __init__(self, loader=_load_from_db, ttl=TEMPLATE_CACHE_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._compiled = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _source(self, name, locale):
+        """Find the source for a template, falling back to built-ins"""
+        source = None
+        if self.loader:
+            try:
+                source = self.loader(name, locale)
+            except Exception as e:
+                logger.warning(f"Could not load template {name}/{locale}: {e}")
+
+        if source is None:
+            source = DEFAULT_TEMPLATES.get(locale, {}).get(name)
+        if source is None and locale != DEFAULT_LOCALE:
+            return self._source(name, DEFAULT_LOCALE)
+        if source is None:
+            raise KeyError(f'Unknown message template: {name}')
+        return source
+
+    def get(self, name, locale=None):
+        """Compiled template for a name and locale"""
+        key = (name, locale or DEFAULT_LOCALE)
+        entry = self._compiled.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+
+        compiled = CompiledTemplate(self._source(*key))
+        with self._lock:
+            self.misses += 1
+            self._compiled[key] = (compiled, time.monotonic() + self.ttl)
+        return compiled
+
+    def render(self, template, locale=None, **context):
+        """Render a template by name"""
+        return self.get(template, locale).render(context)
+
+    def invalidate(self, name=None, locale=None):
+        """Drop one template (or all of them) so the next render reloads it"""
+        with self._lock:
+            if name is None:
+                self._compiled.clear()
+                return
+            for key in list(self._compiled):
+                if key[0] == name and (locale is None or key[1] == locale):
+                    del self._compiled[key]
+
+    def stats(self):
+        """Cache counters"""
+        with self._lock:
+            return {'size': len(self._compiled), 'hits': self.hits, 'misses': self.misses}
+
+message_templates = TemplateStore()
+
+def render(template, locale=None, **context):
+    """Render a message template with the shared store"""
+    return message_templates.render(template, locale, **context)
+
+def list_templates():
+    """Effective template sources per locale, database rows over built-ins"""
+    from db import execute_query
+
+    templates = {locale: dict(sources) for locale, sources in DEFAULT_TEMPLATES.items()}
+    for row in execute_query("SELECT name, locale, body FROM message_templates", fetch=True) or []:
+        templates.setdefault(row['locale'], {})[row['name']] = row['body']
+    return templates
+
+def save_template(name, locale, body):
+    """Store an edited template and drop its compiled copy
+
+    Raises ValueError if the template doesn't compile, is not a known
+    template name or uses a placeholder its built-in version doesn't
+    (which every render would fail on).
+    """
+    from db import transaction
+
+    if name not in DEFAULT_TEMPLATES[DEFAULT_LOCALE]:
+        raise ValueError(f'Unknown message template: {name}')
+    if not locale.isalpha() or len(locale) > 8:
+        raise ValueError(f'Invalid locale: {locale}')
+    allowed = CompiledTemplate(DEFAULT_TEMPLATES[DEFAULT_LOCALE][name]).fields
+    unknown = [field for field in CompiledTemplate(body).fields if field not in allowed]
+    if unknown:
+        raise ValueError(
+            f"Unknown placeholder {{{unknown[0]}}} in {name}; "
+            f"use {', '.join('{' + field + '}' for field in dict.fromkeys(allowed)) or 'none'}"
+        )
+
+    with transaction() as cursor:
+        cursor.execute(
+            """INSERT INTO message_templates (name, locale, body) VALUES (%s, %s, %s)
+               ON DUPLICATE KEY UPDATE body = VALUES(body), version = version + 1""",
+            (name, locale, body)
+        )
+    message_templates.invalidate(name, locale)
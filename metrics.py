@@ -0,0 +1,295 @@
+"""Process metrics in the Prometheus text format, and sampled profiling
+
+Counters, gauges and histograms are kept in memory per process and
+rendered by ``/metrics``; with several workers, scrape each one. Values
+that live elsewhere, like queue depth, come from collectors registered
+with ``register_collector`` and run at scrape time.
+
+Hot paths decorated with ``@profiled`` are run under cProfile for a
+PROFILE_SAMPLE_RATE fraction of calls; ``/metrics/profile`` shows the
+aggregated results. With the default rate of 0 the decorator costs one
+comparison per call.
+"""
+from bisect import bisect_left
+from functools import lru_cache, wraps
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Instrumentation configuration
+DB_SLOW_QUERY_SECONDS = float(os.getenv('DB_SLOW_QUERY_SECONDS', 0.5))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+
+# Seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+_collectors = []
+
+def _escape(value):
+    """Escape a label value"""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _format_labels(names, values, extra=()):
+    """Render '{name="value",...}', or nothing without labels"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    """A named metric with a fixed set of label names"""
+
+    type = 'untyped'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{_format_labels(self.labels, key)} {value}']
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down, usually set by a collector"""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def replace(self, values):
+        """Set every series at once from ``{label tuple: value}``, dropping the rest"""
+        with self._lock:
+            self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", le)])} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {total}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+# Requests
+http_request_seconds = Histogram('http_request_seconds', 'Request latency by route', ['route', 'method', 'status'])
+
+# Database
+db_query_seconds = Histogram('db_query_seconds', 'Query latency by statement and table', ['query'])
+db_slow_queries = Counter('db_slow_queries_total', 'Queries slower than DB_SLOW_QUERY_SECONDS', ['query'])
+db_errors = Counter('db_errors_total', 'Failed queries', ['query'])
+
+# Twilio
+twilio_request_seconds = Histogram('twilio_request_seconds', 'Twilio message create latency', ['outcome'])
+twilio_requests = Counter('twilio_requests_total', 'Twilio message create calls by outcome', ['outcome'])
+
+# Scheduler
+scheduler_job_seconds = Histogram(
+    'scheduler_job_seconds', 'Scheduled job run time', ['job'],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300)
+)
+
+def register_collector(collect):
+    """Call ``collect()`` before each scrape, e.g. to set gauges from the database"""
+    _collectors.append(collect)
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as e:
+            logger.warning(f"Metrics collector {collect.__name__} failed: {e}")
+
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+_STATEMENT = re.compile(r'^\s*(\w+)', re.S)
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+`?(\w+)', re.I)
+
+@lru_cache(maxsize=1024)
+def query_name(query):
+    """Low-cardinality label for a statement, like 'select members'"""
+    statement = _STATEMENT.match(query)
+    table = _TABLE.search(query)
+    return f"{statement.group(1).lower() if statement else 'query'} {table.group(1) if table else '-'}"
+
+def observe_query(query, seconds):
+    """Record a statement's duration and log it if slow"""
+    name = query_name(query)
+    db_query_seconds.observe(seconds, query=name)
+    if seconds >= DB_SLOW_QUERY_SECONDS:
+        db_slow_queries.inc(query=name)
+        logger.warning(f"Slow query ({seconds * 1000:.0f} ms): {' '.join(query.split())[:300]}")
+
+def observe_twilio(outcome, seconds):
+    """Record one Twilio call; outcome is sent, throttled, server_error, client_error or network_error"""
+    twilio_requests.inc(outcome=outcome)
+    twilio_request_seconds.observe(seconds, outcome=outcome)
+
+def twilio_outcome(status):
+    """Outcome label for a Twilio HTTP status (None for transport failures)"""
+    if status is None:
+        return 'network_error'
+    if status == 429:
+        return 'throttled'
+    if status >= 500:
+        return 'server_error'
+    if status >= 400:
+        return 'client_error'
+    return 'sent'
+
+def timed_job(name):
+    """Decorator recording a scheduled job's run time"""
+    def decorate(job):
+        @wraps(job)
+        def run():
+            started = time.perf_counter()
+            try:
+                return job()
+            finally:
+                scheduler_job_seconds.observe(time.perf_counter() - started, job=name)
+        return run
+    return decorate
+
+# Sampled profiling
+_profile_lock = threading.Lock()
+_profiles = {}
+_profile_samples = {}
+
+def profiled(name):
+    """Decorator profiling a sample of calls under ``name``
+
+    One call is profiled at a time per process; calls arriving while
+    another is being profiled run normally.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+                return fn(*args, **kwargs)
+            if not _profile_lock.acquire(blocking=False):
+                return fn(*args, **kwargs)
+            try:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler is active in this interpreter
+                    return fn(*args, **kwargs)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    if name in _profiles:
+                        _profiles[name].add(profiler)
+                    else:
+                        _profiles[name] = pstats.Stats(profiler)
+                    _profile_samples[name] = _profile_samples.get(name, 0) + 1
+            finally:
+                _profile_lock.release()
+        return wrapper
+    return decorate
+
+def profile_report(name=None, limit=30):
+    """Text report of the sampled profiles, by cumulative time"""
+    out = io.StringIO()
+    with _profile_lock:
+        names = [name] if name else sorted(_profiles)
+        for profile_name in names:
+            stats = _profiles.get(profile_name)
+            if stats is None:
+                continue
+            out.write(f"== {profile_name}: {_profile_samples[profile_name]} sampled calls ==\n")
+            stats.stream = out
+            stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue() or f"No samples yet (PROFILE_SAMPLE_RATE={PROFILE_SAMPLE_RATE})\n"
+
+def init_app(app):
+    """Time every request of a Flask app and serve /metrics and /metrics/profile"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_seconds.observe(
+                time.perf_counter() - started, route=route, method=request.method, status=response.status_code
+            )
+        return response
+
+    def metrics_view():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    def profile_view():
+        return Response(
+            profile_report(request.args.get('name'), request.args.get('limit', 30, type=int)),
+            content_type='text/plain; charset=utf-8'
+        )
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    app.add_url_rule('/metrics/profile', 'metrics_profile', profile_view)
@@ -0,0 +1,184 @@
+"""Versioned schema migrations
+
+Migrations are the numbered files in migrations/ (``0014_payment_ledger.sql``),
+applied in order and recorded in ``schema_migrations``. 0001 is the schema
+the original schema.sql built, so those databases upgrade like new ones.
+When the database is current, startup costs one query; pending migrations
+are applied under a MySQL named lock, so workers booting together apply
+each one once.
+
+Statements are separated by ';'. MySQL commits DDL implicitly, so a
+migration that fails part-way stays unrecorded and is rerun from the
+start: write them to be rerunnable. Tables use IF NOT EXISTS and data
+INSERT IGNORE; add one column or index per ALTER TABLE / CREATE INDEX
+statement, since one that fails because its column or index already
+exists counts as done.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending ones
+"""
+import mysql.connector
+from mysql.connector import errorcode
+import os
+import re
+import sys
+import logging
+from db import _connect_args
+
+logger = logging.getLogger(__name__)
+
+# Migration configuration
+MIGRATION_LOCK_TIMEOUT = int(os.getenv('MIGRATION_LOCK_TIMEOUT', 60))
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Errors meaning an ADD COLUMN / CREATE INDEX step was already applied
+_ALREADY_APPLIED = {errorcode.ER_DUP_FIELDNAME, errorcode.ER_DUP_KEYNAME}
+
+class MigrationError(Exception):
+    """Raised when migrations cannot be applied"""
+
+def available():
+    """Migration files as ``[(version, name, path), ...]`` in version order"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    return migrations
+
+def split_statements(sql):
+    """Statements of a migration file, split on ';' outside quotes and comments"""
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            if char == '\\':
+                current.append(sql[i:i + 2])
+                i += 2
+                continue
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+        elif sql.startswith('--', i):
+            # Comments may contain ';', so drop them before splitting
+            end = sql.find('\n', i)
+            i = len(sql) if end == -1 else end
+            continue
+        elif char == ';':
+            statements.append(''.join(current).strip())
+            current = []
+            i += 1
+            continue
+        current.append(char)
+        i += 1
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+def _connect():
+    """Connect to the app database, creating it on first install"""
+    args = _connect_args()
+    try:
+        return mysql.connector.connect(**args)
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_BAD_DB_ERROR:
+            raise
+    server = {key: value for key, value in args.items() if key != 'database'}
+    connection = mysql.connector.connect(**server)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args['database']}`")
+    cursor.close()
+    connection.close()
+    return mysql.connector.connect(**args)
+
+def applied_versions(cursor):
+    """Versions recorded in schema_migrations (empty before the first run)"""
+    try:
+        cursor.execute("SELECT version FROM schema_migrations")
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_NO_SUCH_TABLE:
+            return set()
+        raise
+    return {row[0] for row in cursor.fetchall()}
+
+def _apply(cursor, version, name, path):
+    with open(path, 'r') as file:
+        statements = split_statements(file.read())
+    for statement in statements:
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as err:
+            if err.errno not in _ALREADY_APPLIED:
+                raise
+            logger.info(f"Migration {version:04d}_{name}: skipped, already applied ({err.msg})")
+    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+    logger.info(f"Applied migration {version:04d}_{name}")
+
+def migrate():
+    """Apply pending migrations; returns the versions applied"""
+    migrations = available()
+    connection = _connect()
+    cursor = connection.cursor()
+    try:
+        # Fast path: nothing to do
+        if {version for version, _, _ in migrations} <= applied_versions(cursor):
+            return []
+
+        lock = f"{_connect_args()['database']}.schema_migrations"
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (lock, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise MigrationError(f"Timed out after {MIGRATION_LOCK_TIMEOUT}s waiting for the migration lock")
+
+        try:
+            cursor.execute(
+                """CREATE TABLE IF NOT EXISTS schema_migrations (
+                       version     INT          PRIMARY KEY,
+                       name        VARCHAR(191) NOT NULL,
+                       applied_at  TIMESTAMP    DEFAULT CURRENT_TIMESTAMP
+                   )"""
+            )
+            # Another worker may have applied some while we waited
+            done = applied_versions(cursor)
+            applied = []
+            for version, name, path in migrations:
+                if version in done:
+                    continue
+                try:
+                    _apply(cursor, version, name, path)
+                except mysql.connector.Error as err:
+                    raise MigrationError(f"Migration {version:04d}_{name} failed: {err}") from err
+                applied.append(version)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (lock,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        connection.close()
+
+def status():
+    """``[(version, name, applied), ...]`` for every migration file"""
+    connection = _connect()
+    cursor = connection.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+        connection.close()
+    return [(version, name, version in done) for version, name, _ in available()]
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if '--status' in sys.argv[1:]:
+        for version, name, applied in status():
+            print(f"{version:04d}_{name}  {'applied' if applied else 'pending'}")
+    else:
+        applied = migrate()
+        print(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
@@ -1,6 +1,6 @@
--- Auto-run database schema for Chama Reminder System
-CREATE DATABASE IF NOT EXISTS chama_db;
-USE chama_db;
+-- Chama Reminder System schema as built by the original schema.sql.
+-- Databases created from schema.sql already have these tables; later
+-- migrations bring them, and new installs, up to date.
 
 -- Members table
 CREATE TABLE IF NOT EXISTS members (
@@ -37,21 +37,3 @@ CREATE TABLE IF NOT EXISTS settings (
     id           INT PRIMARY KEY,
     due_date     DATE NOT NULL
 );
-
--- Insert default settings (due date 7 days from now)
-INSERT INTO settings (id, due_date) VALUES (1, CURDATE() + INTERVAL 7 DAY)
-ON DUPLICATE KEY UPDATE due_date = CURDATE() + INTERVAL 7 DAY;
-
--- Insert demo data for testing (optional)
-INSERT INTO members (name, phone_number, has_paid, last_payment) VALUES
-('Alice Wanjiku', '+254712345678', 1, NOW() - INTERVAL 1 DAY),
-('John Kimani', '+254723456789', 0, NULL),
-('Mary Achieng', '+254734567890', 1, NOW() - INTERVAL 2 DAY),
-('Peter Mwangi', '+254745678901', 0, NULL),
-('Grace Njeri', '+254756789012', 1, NOW() - INTERVAL 1 DAY)
-ON DUPLICATE KEY UPDATE name = VALUES(name);
-
--- Insert a default chama
-INSERT INTO chamas (name, due_date, amount_expected) VALUES
-('Weekly Savings Chama', CURDATE() + INTERVAL 7 DAY, 1000.0)
-ON DUPLICATE KEY UPDATE name = VALUES(name);
\ No newline at end of file
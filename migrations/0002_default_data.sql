@@ -0,0 +1,17 @@
+-- Default settings and demo data, inserted once; reruns leave existing rows alone
+
+-- Default due date 7 days from install
+INSERT IGNORE INTO settings (id, due_date) VALUES (1, CURDATE() + INTERVAL 7 DAY);
+
+-- Default chama (members default to chama_id 1)
+INSERT INTO chamas (name, due_date, amount_expected)
+SELECT 'Weekly Savings Chama', CURDATE() + INTERVAL 7 DAY, 1000.0
+FROM DUAL WHERE NOT EXISTS (SELECT 1 FROM chamas);
+
+-- Demo members for testing (optional)
+INSERT IGNORE INTO members (name, phone_number, has_paid, last_payment) VALUES
+('Alice Wanjiku', '+254712345678', 1, NOW() - INTERVAL 1 DAY),
+('John Kimani', '+254723456789', 0, NULL),
+('Mary Achieng', '+254734567890', 1, NOW() - INTERVAL 2 DAY),
+('Peter Mwangi', '+254745678901', 0, NULL),
+('Grace Njeri', '+254756789012', 1, NOW() - INTERVAL 1 DAY);
@@ -0,0 +1,17 @@
+-- Outbound message queue; idempotency_key stops a rerun from messaging a member twice
+CREATE TABLE IF NOT EXISTS outbox (
+    id               BIGINT AUTO_INCREMENT PRIMARY KEY,
+    idempotency_key  VARCHAR(191) NOT NULL UNIQUE,
+    member_id        INT NULL,
+    to_number        VARCHAR(20)  NOT NULL,
+    body             TEXT         NOT NULL,
+    status           VARCHAR(10)  NOT NULL DEFAULT 'pending',
+    attempts         INT          NOT NULL DEFAULT 0,
+    twilio_sid       VARCHAR(64)  NULL,
+    last_error       VARCHAR(500) NULL,
+    locked_until     DATETIME     NULL,
+    created_at       TIMESTAMP    DEFAULT CURRENT_TIMESTAMP,
+    sent_at          DATETIME     NULL,
+    INDEX idx_outbox_status (status, id),
+    FOREIGN KEY (member_id) REFERENCES members(id)
+);
@@ -0,0 +1,11 @@
+-- Precomputed per-chama counters, kept current by every member/payment write
+CREATE TABLE IF NOT EXISTS chama_summary (
+    chama_id         INT PRIMARY KEY,
+    total_members    INT    NOT NULL DEFAULT 0,
+    paid_members     INT    NOT NULL DEFAULT 0,
+    total_collected  DOUBLE NOT NULL DEFAULT 0,
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Recent payments for the balance report
+CREATE INDEX idx_payments_date ON payments (date);
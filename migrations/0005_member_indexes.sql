@@ -0,0 +1,6 @@
+-- Keyset pagination newest-first, optionally filtered by payment status
+CREATE INDEX idx_members_created ON members (created_at, id);
+CREATE INDEX idx_members_paid_created ON members (has_paid, created_at, id);
+
+-- Name prefix search
+CREATE INDEX idx_members_name ON members (name);
@@ -0,0 +1,2 @@
+-- Bumped on every member/payment change; report cache and HTTP data version
+ALTER TABLE chama_summary ADD COLUMN member_version BIGINT NOT NULL DEFAULT 0 AFTER total_collected;
@@ -0,0 +1,44 @@
+-- Every member belongs to one chama
+ALTER TABLE members ADD COLUMN chama_id INT NOT NULL DEFAULT 1 AFTER phone_number;
+
+-- Per-chama reminders/stats and chunked cycle resets
+CREATE INDEX idx_members_chama_paid ON members (chama_id, has_paid, id);
+CREATE INDEX idx_members_chama_created ON members (chama_id, created_at, id);
+
+-- Cycle length and the open cycle of each chama
+ALTER TABLE chamas ADD COLUMN cycle_days INT NOT NULL DEFAULT 30 AFTER amount_expected;
+ALTER TABLE chamas ADD COLUMN current_cycle_id INT NULL AFTER cycle_days;
+CREATE INDEX idx_chamas_due_date ON chamas (due_date);
+
+-- Contribution cycles; one open cycle per chama at a time
+CREATE TABLE IF NOT EXISTS chama_cycles (
+    id             INT AUTO_INCREMENT PRIMARY KEY,
+    chama_id       INT  NOT NULL,
+    due_date       DATE NOT NULL,
+    opened_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    closed_at      DATETIME NULL,
+    total_members  INT NULL,
+    paid_members   INT NULL,
+    UNIQUE KEY uq_chama_cycles_due (chama_id, due_date),
+    FOREIGN KEY (chama_id) REFERENCES chamas(id)
+);
+
+-- Payment status of each member in closed cycles
+CREATE TABLE IF NOT EXISTS member_cycle_status (
+    cycle_id      INT NOT NULL,
+    member_id     INT NOT NULL,
+    has_paid      TINYINT(1) NOT NULL,
+    last_payment  DATETIME NULL,
+    PRIMARY KEY (cycle_id, member_id),
+    INDEX idx_member_cycle_status_member (member_id, cycle_id)
+);
+
+-- Open the current cycle of existing chamas, assumed to have started one
+-- cycle length before the due date
+INSERT IGNORE INTO chama_cycles (chama_id, due_date, opened_at)
+SELECT id, due_date, due_date - INTERVAL cycle_days DAY FROM chamas;
+
+UPDATE chamas c
+JOIN chama_cycles cy ON cy.chama_id = c.id AND cy.due_date = c.due_date
+SET c.current_cycle_id = cy.id
+WHERE c.current_cycle_id IS NULL;
@@ -0,0 +1,12 @@
+-- Inbound WhatsApp messages, keyed by Twilio MessageSid so retried webhooks are ignored
+CREATE TABLE IF NOT EXISTS inbound_messages (
+    message_sid  VARCHAR(64)  PRIMARY KEY,
+    from_number  VARCHAR(40)  NOT NULL,
+    body         TEXT         NOT NULL,
+    status       VARCHAR(10)  NOT NULL DEFAULT 'received',
+    attempts     INT          NOT NULL DEFAULT 0,
+    last_error   VARCHAR(500) NULL,
+    created_at   DATETIME     DEFAULT CURRENT_TIMESTAMP,
+    updated_at   DATETIME     DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_inbound_status (status, updated_at)
+);
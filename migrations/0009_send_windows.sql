@@ -0,0 +1,16 @@
+-- Member time zone, overriding the chama's
+ALTER TABLE members ADD COLUMN timezone VARCHAR(64) NULL AFTER last_payment;
+
+-- Each chama's time zone and the local hour its reminder window opens
+ALTER TABLE chamas ADD COLUMN timezone VARCHAR(64) NOT NULL DEFAULT 'Africa/Nairobi' AFTER current_cycle_id;
+ALTER TABLE chamas ADD COLUMN reminder_hour TINYINT NOT NULL DEFAULT 9 AFTER timezone;
+
+-- UTC; a queued message is not sent before this
+ALTER TABLE outbox ADD COLUMN send_after DATETIME NULL AFTER locked_until;
+
+-- Named leases; the scheduler runs its jobs only in the process holding 'scheduler'
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    name        VARCHAR(64) PRIMARY KEY,
+    holder      VARCHAR(128) NOT NULL,
+    expires_at  DATETIME     NOT NULL   -- UTC
+);
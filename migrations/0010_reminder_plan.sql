@@ -0,0 +1,6 @@
+-- Next escalation step (planner.REMINDER_POLICY) and when it is due
+ALTER TABLE members ADD COLUMN reminder_stage TINYINT NOT NULL DEFAULT 0 AFTER timezone;
+ALTER TABLE members ADD COLUMN next_reminder_at DATETIME NULL AFTER reminder_stage;   -- UTC; NULL = not planned
+
+-- Reminder planner: due members in send order
+CREATE INDEX idx_members_reminder ON members (has_paid, next_reminder_at);
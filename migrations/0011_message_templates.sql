@@ -0,0 +1,12 @@
+-- Message language (en, sw); NULL = DEFAULT_LOCALE
+ALTER TABLE members ADD COLUMN locale VARCHAR(8) NULL AFTER timezone;
+
+-- Edited message templates; built-in defaults live in message_templates.py
+CREATE TABLE IF NOT EXISTS message_templates (
+    name        VARCHAR(64) NOT NULL,
+    locale      VARCHAR(8)  NOT NULL,
+    body        TEXT        NOT NULL,
+    version     INT         NOT NULL DEFAULT 1,
+    updated_at  TIMESTAMP   DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, locale)
+);
@@ -0,0 +1,8 @@
+-- Members part-way through a WhatsApp exchange, e.g. asked to confirm an amount
+CREATE TABLE IF NOT EXISTS conversation_state (
+    member_id   INT          PRIMARY KEY,
+    state       TINYINT      NOT NULL,
+    amount      FLOAT        NULL,
+    expires_at  DATETIME     NOT NULL,   -- UTC
+    FOREIGN KEY (member_id) REFERENCES members(id)
+);
@@ -0,0 +1,16 @@
+-- Set when a payment is reconciled from an M-Pesa statement; unique so a
+-- statement imported twice records each transaction once
+ALTER TABLE payments ADD COLUMN mpesa_receipt VARCHAR(20) NULL AFTER chama_id;
+CREATE UNIQUE INDEX mpesa_receipt ON payments (mpesa_receipt);
+
+-- M-Pesa statement transactions no member could be matched to
+CREATE TABLE IF NOT EXISTS mpesa_unmatched (
+    mpesa_receipt VARCHAR(20)  PRIMARY KEY,
+    chama_id      INT          NOT NULL,
+    amount        FLOAT        NOT NULL,
+    paid_at       DATETIME     NULL,
+    party         VARCHAR(100) NULL,   -- 'Other Party Info' column, often a masked number
+    reference     VARCHAR(50)  NULL,   -- account reference the payer entered
+    created_at    DATETIME     DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_unmatched_chama (chama_id, created_at)
+);
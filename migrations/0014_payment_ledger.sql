@@ -0,0 +1,54 @@
+-- Append-only ledger of what each member owes and pays. Entries are never
+-- updated or deleted; corrections are 'reversal' entries. amount is signed
+-- by its effect on the member's balance: dues and penalties are positive,
+-- payments negative, so a positive balance is arrears.
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    id               BIGINT AUTO_INCREMENT PRIMARY KEY,
+    member_id        INT           NOT NULL,
+    chama_id         INT           NOT NULL,
+    cycle_id         INT           NULL,       -- chama cycle the entry belongs to
+    kind             VARCHAR(10)   NOT NULL,   -- due, payment, penalty, reversal
+    amount           DECIMAL(12,2) NOT NULL,
+    payment_id       INT           NULL,       -- payments row a 'payment' entry records
+    reverses_id      BIGINT        NULL UNIQUE, -- entry a 'reversal' cancels (once)
+    idempotency_key  VARCHAR(191)  NULL UNIQUE, -- e.g. due:<cycle>:<member>, payment:<id>
+    note             VARCHAR(255)  NULL,
+    occurred_at      DATETIME      NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at       TIMESTAMP     DEFAULT CURRENT_TIMESTAMP,
+    -- Balance reads: a member's entries after their latest snapshot
+    INDEX idx_ledger_member (member_id, id),
+    INDEX idx_ledger_cycle (cycle_id, member_id),
+    FOREIGN KEY (member_id) REFERENCES members(id)
+);
+
+-- Each member's balance at the close of a cycle, through last_entry_id;
+-- a balance is the latest snapshot plus the entries after it
+CREATE TABLE IF NOT EXISTS ledger_snapshots (
+    member_id      INT           NOT NULL,
+    cycle_id       INT           NOT NULL,
+    chama_id       INT           NOT NULL,
+    balance        DECIMAL(12,2) NOT NULL,
+    last_entry_id  BIGINT        NOT NULL,
+    created_at     TIMESTAMP     DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (member_id, cycle_id),
+    INDEX idx_ledger_snapshots_latest (member_id, last_entry_id)
+);
+
+-- The ledger starts with the current cycle: earlier cycles count as settled.
+-- Dues for the open cycle...
+INSERT IGNORE INTO ledger_entries (member_id, chama_id, cycle_id, kind, amount, idempotency_key, occurred_at)
+SELECT m.id, m.chama_id, c.current_cycle_id, 'due', c.amount_expected,
+       CONCAT('due:', c.current_cycle_id, ':', m.id), cy.opened_at
+FROM members m
+JOIN chamas c ON c.id = m.chama_id
+JOIN chama_cycles cy ON cy.id = c.current_cycle_id;
+
+-- ...and the payments made since it opened
+INSERT IGNORE INTO ledger_entries (member_id, chama_id, cycle_id, kind, amount, payment_id, idempotency_key, occurred_at)
+SELECT p.member_id, m.chama_id, c.current_cycle_id, 'payment', -p.amount, p.id,
+       CONCAT('payment:', p.id), p.date
+FROM payments p
+JOIN members m ON m.id = p.member_id
+JOIN chamas c ON c.id = m.chama_id
+JOIN chama_cycles cy ON cy.id = c.current_cycle_id
+WHERE p.date >= cy.opened_at;
@@ -0,0 +1,10 @@
+-- Member and payment changes for the dashboard's live feed (/api/changes).
+-- member_id is NULL for bulk changes (imports, reconciliation, rollover),
+-- which tell dashboards to reload. Rows are pruned after CHANGE_RETENTION_SECONDS.
+CREATE TABLE IF NOT EXISTS change_events (
+    id          BIGINT AUTO_INCREMENT PRIMARY KEY,
+    chama_id    INT       NOT NULL,
+    member_id   INT       NULL,
+    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_change_events_created (created_at)
+);
@@ -0,0 +1,12 @@
+-- Canonical E.164 form of each member's number (phones.normalize_phone).
+-- Webhook lookups and duplicate checks go through this column, one probe of
+-- its unique index; phone_number keeps the number as it was entered. NULL
+-- for numbers that don't normalize or that normalize to another member's,
+-- which an admin has to fix or merge.
+ALTER TABLE members ADD COLUMN phone_e164 VARCHAR(16) NULL AFTER phone_number;
+CREATE UNIQUE INDEX idx_members_phone_e164 ON members (phone_e164);
+
+-- Numbers already stored in E.164 need no parsing; the rest are filled in
+-- batches by member_import.backfill_phones (scheduled, or flask backfill-phones)
+UPDATE members SET phone_e164 = phone_number
+WHERE phone_e164 IS NULL AND phone_number REGEXP '^[+][1-9][0-9]{7,14}$';
@@ -0,0 +1,3 @@
+-- When a failed message may be tried again (outbox.record_results backs off
+-- exponentially); NULL for messages that haven't failed yet
+ALTER TABLE outbox ADD COLUMN next_attempt_at DATETIME NULL AFTER send_after;
@@ -0,0 +1,222 @@
+from db import execute_query, transaction
+from dispatcher import dispatch
+from summary import DEFAULT_CHAMA_ID
+from message_templates import render
+from datetime import date
+import os
+import threading
+import logging
+from metrics import Gauge, profiled, register_collector
+
+logger = logging.getLogger(__name__)
+
+# Outbox configuration
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 200))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+OUTBOX_LOCK_SECONDS = int(os.getenv('OUTBOX_LOCK_SECONDS', 300))
+OUTBOX_RETRY_SECONDS = int(os.getenv('OUTBOX_RETRY_SECONDS', 30))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv('OUTBOX_RETRY_MAX_SECONDS', 3600))
+
+REMINDER_TEMPLATE = 'reminder'
+
+def reminder_body(member):
+    """Reminder text for a member, in their language"""
+    return render(REMINDER_TEMPLATE, member.get('locale'), name=member['name'])
+
+def current_cycle(chama_id=DEFAULT_CHAMA_ID):
+    """Identify a chama's current contribution cycle by its due date"""
+    result = execute_query("SELECT due_date FROM chamas WHERE id = %s", (chama_id,), fetch=True)
+    due_date = result[0]['due_date'] if result else date.today()
+    return due_date.isoformat()
+
+def idempotency_key(member_id, cycle, template):
+    """Key that makes one message per member, cycle and template"""
+    return f"{member_id}:{cycle}:{template}"
+
+def enqueue(rows):
+    """Insert messages into the outbox, skipping keys already queued
+
+    ``rows`` are dicts with ``key``, ``member_id``, ``to`` and ``body``, and
+    optionally ``send_after`` (naive UTC) to hold a message back until then.
+    Returns the number of newly queued messages.
+    """
+    queued = 0
+    with transaction() as cursor:
+        for start in range(0, len(rows), OUTBOX_BATCH_SIZE):
+            chunk = rows[start:start + OUTBOX_BATCH_SIZE]
+            cursor.executemany(
+                """INSERT IGNORE INTO outbox (idempotency_key, member_id, to_number, body, send_after)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                [(row['key'], row['member_id'], row['to'], row['body'], row.get('send_after')) for row in chunk]
+            )
+            queued += cursor.rowcount
+    return queued
+
+def enqueue_reminders(chama_id=DEFAULT_CHAMA_ID):
+    """Queue this cycle's reminder for every unpaid member of a chama now
+
+    Used for manual sends; scheduled reminders come from the planner.
+    Returns ``(queued, total_unpaid)``; members already reminded this cycle
+    are not queued again.
+    """
+    unpaid_members = execute_query(
+        """SELECT id, name, COALESCE(phone_e164, phone_number) AS phone_number, locale
+           FROM members WHERE chama_id = %s AND has_paid = 0""",
+        (chama_id,),
+        fetch=True
+    ) or []
+
+    cycle = current_cycle(chama_id)
+    rows = [
+        {
+            'key': idempotency_key(member['id'], cycle, REMINDER_TEMPLATE),
+            'member_id': member['id'],
+            'to': member['phone_number'],
+            'body': reminder_body(member)
+        }
+        for member in unpaid_members
+    ]
+
+    queued = enqueue(rows) if rows else 0
+    logger.info(f"Queued {queued} reminders for chama {chama_id} cycle {cycle} ({len(unpaid_members)} unpaid)")
+    return queued, len(unpaid_members)
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Lease a batch of pending messages to this worker
+
+    Messages left in 'sending' by a crashed worker become claimable again
+    once their lease expires. Messages held back by ``send_after``, or
+    backing off after a failure until ``next_attempt_at``, are skipped
+    until it passes.
+    """
+    with transaction() as cursor:
+        cursor.execute(
+            """SELECT id, to_number, body FROM outbox
+               WHERE (status = 'pending' OR (status = 'sending' AND locked_until < NOW()))
+                 AND (send_after IS NULL OR send_after <= UTC_TIMESTAMP())
+                 AND (next_attempt_at IS NULL OR next_attempt_at <= UTC_TIMESTAMP())
+               ORDER BY id
+               LIMIT %s
+               FOR UPDATE SKIP LOCKED""",
+            (batch_size,)
+        )
+        batch = cursor.fetchall()
+        if batch:
+            ids = [row['id'] for row in batch]
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f"""UPDATE outbox
+                    SET status = 'sending', attempts = attempts + 1,
+                        locked_until = NOW() + INTERVAL %s SECOND
+                    WHERE id IN ({placeholders})""",
+                [OUTBOX_LOCK_SECONDS] + ids
+            )
+    return batch
+
+def record_results(sent, failed):
+    """Write the outcome of a batch back to the outbox
+
+    A failed message is retried after OUTBOX_RETRY_SECONDS, doubling with
+    each attempt up to OUTBOX_RETRY_MAX_SECONDS, and marked 'failed' after
+    OUTBOX_MAX_ATTEMPTS.
+    """
+    with transaction() as cursor:
+        if sent:
+            cursor.executemany(
+                """UPDATE outbox SET status = 'sent', twilio_sid = %s, sent_at = NOW(), locked_until = NULL,
+                       next_attempt_at = NULL
+                   WHERE id = %s""",
+                sent
+            )
+        if failed:
+            cursor.executemany(
+                """UPDATE outbox
+                   SET status = IF(attempts >= %s, 'failed', 'pending'), last_error = %s, locked_until = NULL,
+                       next_attempt_at = UTC_TIMESTAMP() + INTERVAL LEAST(%s * POW(2, attempts - 1), %s) SECOND
+                   WHERE id = %s""",
+                [
+                    (OUTBOX_MAX_ATTEMPTS, error, OUTBOX_RETRY_SECONDS, OUTBOX_RETRY_MAX_SECONDS, message_id)
+                    for message_id, error in failed
+                ]
+            )
+
+@profiled('outbox_drain')
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    """Send queued messages batch by batch until the outbox is empty
+
+    Returns the number of messages sent.
+    """
+    total_sent = 0
+
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return total_sent
+
+        sent, failed = [], []
+        lock = threading.Lock()
+
+        def on_result(message, sid, error):
+            with lock:
+                if error is None:
+                    sent.append((sid, message['id']))
+                else:
+                    failed.append((message['id'], str(error)[:500]))
+
+        dispatch(
+            [{'id': row['id'], 'to': row['to_number'], 'body': row['body']} for row in batch],
+            on_result=on_result
+        )
+        record_results(sent, failed)
+        total_sent += len(sent)
+
+_drain_lock = threading.Lock()
+
+def kick():
+    """Drain the outbox in a background thread unless one is already running"""
+    if not _drain_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            drain()
+        except Exception as e:
+            logger.error(f"Outbox drain failed: {e}")
+        finally:
+            _drain_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
+
+def outbox_stats():
+    """Count outbox messages by status
+
+    Pending messages held back by ``send_after`` are counted as 'scheduled'.
+    """
+    rows = execute_query(
+        """SELECT IF(status = 'pending' AND send_after > UTC_TIMESTAMP(), 'scheduled', status) AS status,
+                  COUNT(*) AS count
+           FROM outbox GROUP BY 1""",
+        fetch=True
+    ) or []
+    stats = {'scheduled': 0, 'pending': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+    for row in rows:
+        stats[row['status']] = row['count']
+    return stats
+
+queue_depth = Gauge('outbox_queue_depth', 'Undelivered outbox messages by status', ['status'])
+
+def _collect_queue_depth():
+    # Only undelivered rows, so the scrape stays on idx_outbox_status
+    rows = execute_query(
+        """SELECT IF(status = 'pending' AND send_after > UTC_TIMESTAMP(), 'scheduled', status) AS status,
+                  COUNT(*) AS count
+           FROM outbox WHERE status IN ('pending', 'sending') GROUP BY 1""",
+        fetch=True
+    )
+    if rows is not None:
+        depth = {('scheduled',): 0, ('pending',): 0, ('sending',): 0}
+        depth.update({(row['status'],): row['count'] for row in rows})
+        queue_depth.replace(depth)
+
+register_collector(_collect_queue_depth)
@@ -0,0 +1,76 @@
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Country code assumed for numbers written in local form (e.g. 0712...)
+DEFAULT_COUNTRY_CODE = os.getenv('DEFAULT_COUNTRY_CODE', '254')
+# What a national number of that country looks like, without the trunk 0
+# (Kenya: 7xx xxx xxx and 1xx xxx xxx)
+NATIONAL_NUMBER_PATTERN = os.getenv('NATIONAL_NUMBER_PATTERN', r'[17]\d{8}')
+
+_NON_DIGITS = re.compile(r'[^\d]')
+_PHONE_CHARACTERS = re.compile(r'^\+?[\d\s().-]+$')
+_NATIONAL_NUMBER = re.compile(NATIONAL_NUMBER_PATTERN)
+
+def normalize_phone(raw, country_code=DEFAULT_COUNTRY_CODE):
+    """Normalize a phone number to E.164 (+<country><number>)
+
+    Accepts '+254 712 345 678', '254712345678', '0712345678', '712-345-678'
+    and 'whatsapp:+254712345678'. Numbers without a country code must be
+    national numbers of ``country_code``, and so must numbers with it;
+    other countries are accepted only with their own code ('+44...' or
+    '0044...'). Raises ValueError for anything else rather than guessing,
+    since the result is a member's unique key.
+    """
+    if raw is None:
+        raise ValueError('Phone number is required')
+
+    value = str(raw).strip()
+    if value.lower().startswith('whatsapp:'):
+        value = value[len('whatsapp:'):].strip()
+    if not _PHONE_CHARACTERS.match(value):
+        raise ValueError(f'Invalid phone number: {raw}')
+
+    digits = _NON_DIGITS.sub('', value)
+    if value.startswith('+'):
+        international = digits
+    elif digits.startswith('00'):
+        international = digits[2:]
+    else:
+        international = None
+
+    if international is not None and not international.startswith(country_code):
+        # Another country's number, written with its code
+        if not 8 <= len(international) <= 15 or international.startswith('0'):
+            raise ValueError(f'Invalid phone number: {raw}')
+        return f'+{international}'
+
+    if international is not None:
+        # '+254 (0)712...' keeps its trunk 0
+        national = international[len(country_code):]
+        if national.startswith('0'):
+            national = national[1:]
+    elif digits.startswith('0'):
+        national = digits[1:]
+    elif digits.startswith(country_code) and _NATIONAL_NUMBER.fullmatch(digits[len(country_code):]):
+        national = digits[len(country_code):]
+    else:
+        national = digits
+
+    if not _NATIONAL_NUMBER.fullmatch(national):
+        raise ValueError(f'Invalid phone number: {raw}')
+    return f'+{country_code}{national}'
+
+def phone_key(raw):
+    """Lookup key for a sender's number: its E.164 form
+
+    Input that doesn't normalize comes back as sent, less any 'whatsapp:'
+    prefix; no member's canonical number can equal it, so the lookup
+    simply misses.
+    """
+    try:
+        return normalize_phone(raw)
+    except ValueError:
+        return str(raw or '').replace('whatsapp:', '').strip()
@@ -0,0 +1,241 @@
+from db import execute_query, transaction
+from outbox import enqueue, idempotency_key, kick
+from message_templates import render
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import os
+import logging
+from metrics import profiled
+
+logger = logging.getLogger(__name__)
+
+# Planner configuration
+PLANNER_BATCH_SIZE = int(os.getenv('PLANNER_BATCH_SIZE', 500))
+PLANNER_LOOKAHEAD_SECONDS = int(os.getenv('PLANNER_LOOKAHEAD_SECONDS', 60))
+REMINDER_WINDOW_MINUTES = int(os.getenv('REMINDER_WINDOW_MINUTES', 120))
+REMINDER_HISTORY_CYCLES = int(os.getenv('REMINDER_HISTORY_CYCLES', 3))
+DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', 'Africa/Nairobi')
+
+# Escalation policy: (days from the due date, step, late payers only). Each
+# step is sent with the 'reminder_<step>' message template.
+# members.reminder_stage is the index of the next entry that may be sent.
+REMINDER_POLICY = [
+    (-7, 'early', True),
+    (-3, 'upcoming', False),
+    (0, 'due', False),
+    (2, 'overdue', False),
+    (7, 'final', False),
+]
+
+def _zone(name):
+    """ZoneInfo for a time zone name, falling back to the default zone"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown time zone {name!r}, using {DEFAULT_TIMEZONE}")
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+def slot(member_id, tz_name, reminder_hour, day):
+    """UTC time of a member's reminder slot on a local calendar day
+
+    The send window opens at ``reminder_hour`` local time. Each member gets
+    a fixed offset inside it (derived from their id) so a chama's reminders
+    are spread out rather than all due at once.
+    """
+    window_seconds = max(REMINDER_WINDOW_MINUTES * 60, 1)
+    # Multiplicative hash so neighbouring ids land far apart in the window
+    offset = (member_id * 2654435761) % window_seconds
+
+    start = datetime(day.year, day.month, day.day, reminder_hour, tzinfo=_zone(tz_name))
+    send_at = start + timedelta(seconds=offset)
+    return send_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+def next_reminder(member, chama, late_payer, now, catch_up=True):
+    """Pick a member's next reminder as ``(stage, send_at)``, or ``(len(policy), None)`` when done
+
+    Stages before ``member['reminder_stage']`` were already sent. If
+    stages have passed (e.g. a member added close to the due date) the
+    latest of them is sent straight away when ``catch_up`` is set, and
+    skipped otherwise; later stages wait for their slot. Reliable payers
+    skip the late-payer stages.
+    """
+    tz_name = member['timezone'] or chama['timezone']
+    passed = None
+
+    for stage in range(member['reminder_stage'], len(REMINDER_POLICY)):
+        days, _, late_only = REMINDER_POLICY[stage]
+        if late_only and not late_payer:
+            continue
+        send_at = slot(member['id'], tz_name, chama['reminder_hour'], chama['due_date'] + timedelta(days=days))
+        if send_at > now:
+            return (passed, now) if catch_up and passed is not None else (stage, send_at)
+        passed = stage
+
+    if catch_up and passed is not None:
+        return passed, now
+    return len(REMINDER_POLICY), None
+
+def _chamas(chama_ids):
+    """Cycle and send-window settings of the given chamas, by id"""
+    placeholders = ', '.join(['%s'] * len(chama_ids))
+    rows = execute_query(
+        f"SELECT id, due_date, timezone, reminder_hour FROM chamas WHERE id IN ({placeholders})",
+        list(chama_ids),
+        fetch=True
+    ) or []
+    return {row['id']: row for row in rows}
+
+def _late_payers(member_ids):
+    """Members who are new or missed one of their recent archived cycles"""
+    placeholders = ', '.join(['%s'] * len(member_ids))
+    rows = execute_query(
+        f"""SELECT member_id, SUM(has_paid = 0) AS missed FROM (
+                SELECT s.member_id, s.has_paid,
+                       ROW_NUMBER() OVER (PARTITION BY s.member_id ORDER BY c.due_date DESC) AS recent
+                FROM member_cycle_status s JOIN chama_cycles c ON c.id = s.cycle_id
+                WHERE s.member_id IN ({placeholders})
+            ) h
+            WHERE recent <= %s
+            GROUP BY member_id""",
+        list(member_ids) + [REMINDER_HISTORY_CYCLES],
+        fetch=True
+    ) or []
+    reliable = {row['member_id'] for row in rows if not row['missed']}
+    return set(member_ids) - reliable
+
+def _plan(members, now, catch_up=True):
+    """Work out the next reminder for each member; returns update rows"""
+    chamas = _chamas({member['chama_id'] for member in members})
+    late_payers = _late_payers([member['id'] for member in members])
+
+    updates = []
+    for member in members:
+        chama = chamas.get(member['chama_id'])
+        if not chama:
+            continue
+        stage, send_at = next_reminder(member, chama, member['id'] in late_payers, now, catch_up)
+        updates.append((stage, send_at, member['id']))
+    return updates
+
+def _save(updates):
+    """Store planned stages and times"""
+    if not updates:
+        return
+    with transaction() as cursor:
+        cursor.executemany(
+            "UPDATE members SET reminder_stage = %s, next_reminder_at = %s WHERE id = %s",
+            updates
+        )
+
+def plan_unplanned():
+    """Plan reminders for unpaid members that have none scheduled
+
+    Covers new members and members reset by a cycle rollover. Members
+    whose escalation is finished are left alone until the next cycle.
+    Returns the number planned.
+    """
+    now = datetime.utcnow()
+    last_id = 0
+    planned = 0
+
+    while True:
+        members = execute_query(
+            """SELECT id, chama_id, timezone, reminder_stage FROM members
+               WHERE has_paid = 0 AND next_reminder_at IS NULL AND reminder_stage < %s AND id > %s
+               ORDER BY id LIMIT %s""",
+            (len(REMINDER_POLICY), last_id, PLANNER_BATCH_SIZE),
+            fetch=True
+        ) or []
+        if not members:
+            return planned
+
+        _save(_plan(members, now))
+        planned += len(members)
+        last_id = members[-1]['id']
+
+@profiled('send_due')
+def send_due(batch_size=PLANNER_BATCH_SIZE):
+    """Queue every reminder whose slot has come, then plan each member's next one
+
+    Reads members through the (has_paid, next_reminder_at) index, so each
+    tick costs O(due) rather than O(unpaid). Reminders due within the
+    lookahead are queued with their slot as ``send_after`` so they go out
+    on time between ticks. Returns the number queued.
+    """
+    now = datetime.utcnow()
+    horizon = now + timedelta(seconds=PLANNER_LOOKAHEAD_SECONDS)
+    queued = 0
+
+    while True:
+        due = execute_query(
+            """SELECT m.id, m.name, COALESCE(m.phone_e164, m.phone_number) AS phone_number,
+                      m.chama_id, m.timezone, m.locale, m.reminder_stage,
+                      m.next_reminder_at, c.due_date
+               FROM members m JOIN chamas c ON c.id = m.chama_id
+               WHERE m.has_paid = 0 AND m.next_reminder_at <= %s
+               ORDER BY m.next_reminder_at
+               LIMIT %s""",
+            (horizon, batch_size),
+            fetch=True
+        ) or []
+        if not due:
+            break
+
+        rows = []
+        for member in due:
+            _, step, _ = REMINDER_POLICY[member['reminder_stage']]
+            try:
+                body = render(
+                    f'reminder_{step}',
+                    member['locale'],
+                    name=member['name'],
+                    due_date=member['due_date'].strftime('%d %b %Y')
+                )
+            except Exception as e:
+                # A broken template costs this member this stage, not the whole tick
+                logger.error(f"Could not render reminder_{step} for member {member['id']}: {e!r}")
+                continue
+            rows.append({
+                'key': idempotency_key(member['id'], member['due_date'].isoformat(), step),
+                'member_id': member['id'],
+                'to': member['phone_number'],
+                'body': body,
+                'send_after': member['next_reminder_at']
+            })
+        if rows:
+            queued += enqueue(rows)
+
+        # Move everyone past the stage just queued (or that failed to render,
+        # so it isn't retried every tick); the outbox key makes a crash
+        # between these two steps harmless. Stages that passed while
+        # we were behind are skipped rather than sent back to back.
+        for member in due:
+            member['reminder_stage'] += 1
+        _save(_plan(due, horizon, catch_up=False))
+
+        if len(due) < batch_size:
+            break
+
+    if queued:
+        kick()
+    return queued
+
+def planner_stats():
+    """Count unpaid members by reminder state"""
+    rows = execute_query(
+        """SELECT CASE
+                      WHEN next_reminder_at IS NOT NULL AND next_reminder_at <= UTC_TIMESTAMP() THEN 'due'
+                      WHEN next_reminder_at IS NOT NULL THEN 'scheduled'
+                      WHEN reminder_stage >= %s THEN 'finished'
+                      ELSE 'unplanned'
+                  END AS state,
+                  COUNT(*) AS count
+           FROM members WHERE has_paid = 0
+           GROUP BY state""",
+        (len(REMINDER_POLICY),),
+        fetch=True
+    ) or []
+    stats = {'due': 0, 'scheduled': 0, 'finished': 0, 'unplanned': 0}
+    for row in rows:
+        stats[row['state']] = row['count']
+    return stats
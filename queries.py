@@ -0,0 +1,166 @@
+"""SQL and response shaping shared by the Flask API and the async server
+
+Both servers build their statements and JSON bodies from here, so the only
+difference between them is the driver that runs the query.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from werkzeug.http import http_date
+import base64
+
+# Columns clients may request through ?fields=
+MEMBER_FIELDS = ['id', 'name', 'phone_number', 'has_paid', 'last_payment', 'created_at']
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Member lookup for inbound WhatsApp messages, by the sender's E.164 number
+# (phones.phone_key): one probe of the unique index on phone_e164
+MEMBER_BY_PHONE_QUERY = """SELECT m.id, m.name, m.phone_number, m.chama_id, m.locale, m.has_paid, c.amount_expected
+                           FROM members m LEFT JOIN chamas c ON c.id = m.chama_id
+                           WHERE m.phone_e164 = %s"""
+
+# The has_paid guard makes the check and update atomic. Every path that
+# marks a member paid also inserts a payments row and its ledger entry,
+# for the chama's amount_expected when no amount was given.
+MARK_PAID_QUERY = "UPDATE members SET has_paid = 1, last_payment = NOW() WHERE id = %s AND has_paid = 0"
+INSERT_PAYMENT_QUERY = "INSERT INTO payments (member_id, amount, chama_id) VALUES (%s, %s, %s)"
+MEMBER_CONTRIBUTION_QUERY = """SELECT m.chama_id, c.amount_expected
+                               FROM members m LEFT JOIN chamas c ON c.id = m.chama_id
+                               WHERE m.id = %s"""
+
+# Ledger entries for payments rows, once each; format with a condition on p.
+# Each goes to the cycle its date falls in: the current one for a payment
+# made now, an earlier one for a receipt from an older statement.
+LEDGER_PAYMENTS_QUERY = """INSERT IGNORE INTO ledger_entries
+                               (member_id, chama_id, cycle_id, kind, amount, payment_id, idempotency_key, occurred_at)
+                           SELECT p.member_id, m.chama_id,
+                                  (SELECT cy.id FROM chama_cycles cy
+                                   WHERE cy.chama_id = m.chama_id AND cy.opened_at <= p.date
+                                   ORDER BY cy.opened_at DESC LIMIT 1),
+                                  'payment', -p.amount, p.id, CONCAT('payment:', p.id), p.date
+                           FROM payments p
+                           JOIN members m ON m.id = p.member_id
+                           WHERE {condition}"""
+LEDGER_PAYMENT_QUERY = LEDGER_PAYMENTS_QUERY.format(condition='p.id = %s')
+
+# Params: chama_id, members, paid, collected
+DELTA_QUERY = """INSERT INTO chama_summary (chama_id, total_members, paid_members, total_collected)
+                 VALUES (%s, %s, %s, %s)
+                 ON DUPLICATE KEY UPDATE
+                     total_members = total_members + VALUES(total_members),
+                     paid_members = paid_members + VALUES(paid_members),
+                     total_collected = total_collected + VALUES(total_collected),
+                     member_version = member_version + 1"""
+
+# Dashboard change feed (changes.py); member_id NULL means reload
+RECORD_CHANGE_QUERY = "INSERT INTO change_events (chama_id, member_id) VALUES (%s, %s)"
+
+# Data versions for conditional responses (http_cache.py): both move on
+# every apply_delta, the first for all chamas, the second for one
+CHANGE_VERSION_QUERY = "SELECT COALESCE(MAX(id), 0) AS version FROM change_events"
+CHAMA_VERSION_QUERY = "SELECT member_version AS version FROM chama_summary WHERE chama_id = %s"
+
+SUMMARY_QUERY = """SELECT s.total_members, s.paid_members, s.total_collected,
+                          (SELECT due_date FROM chamas WHERE id = s.chama_id) AS due_date
+                   FROM chama_summary s
+                   WHERE s.chama_id = %s"""
+
+# Conversation state (commands.AWAITING_CONFIRMATION etc.) per member
+CONVERSATION_QUERY = "SELECT state, amount FROM conversation_state WHERE member_id = %s AND expires_at > UTC_TIMESTAMP()"
+SAVE_CONVERSATION_QUERY = """REPLACE INTO conversation_state (member_id, state, amount, expires_at)
+                             VALUES (%s, %s, %s, UTC_TIMESTAMP() + INTERVAL %s SECOND)"""
+CLEAR_CONVERSATION_QUERY = "DELETE FROM conversation_state WHERE member_id = %s"
+
+RECORD_INBOUND_QUERY = "INSERT IGNORE INTO inbound_messages (message_sid, from_number, body) VALUES (%s, %s, %s)"
+
+def _int(value, default):
+    """Query-string integer, or the default if missing or malformed"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def encode_cursor(member):
+    """Opaque keyset cursor for the row after which the next page starts"""
+    raw = f"{member['created_at'].isoformat()}|{member['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        raw = base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode()
+        created_at, member_id = raw.split('|')
+        created_at, member_id = datetime.fromisoformat(created_at), int(member_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    # Only cursors encode_cursor could have produced are accepted
+    if member_id < 1 or raw != f"{created_at.isoformat()}|{member_id}":
+        raise ValueError('Invalid cursor')
+    return created_at, member_id
+
+def member_page_query(args):
+    """Build the members page query from query-string arguments
+
+    ``args`` is any mapping with ``get``. Returns ``(query, params, fields,
+    limit)``; raises ValueError for a malformed cursor.
+    """
+    limit = min(max(_int(args.get('limit'), DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+
+    fields = args.get('fields')
+    fields = [f for f in fields.split(',') if f in MEMBER_FIELDS] if fields else MEMBER_FIELDS
+    # id and created_at drive the cursor, so they are always read
+    columns = list(dict.fromkeys(['id', 'created_at'] + fields))
+
+    conditions, params = [], []
+
+    chama_id = _int(args.get('chama_id'), None)
+    if chama_id is not None:
+        conditions.append("chama_id = %s")
+        params.append(chama_id)
+
+    has_paid = args.get('has_paid')
+    if has_paid is not None:
+        conditions.append("has_paid = %s")
+        params.append(1 if has_paid.lower() in ('1', 'true', 'yes') else 0)
+
+    search = (args.get('q') or '').strip()
+    if search:
+        # Prefix match so the name index can be used
+        conditions.append("name LIKE %s")
+        params.append(search.replace('%', r'\%').replace('_', r'\_') + '%')
+
+    cursor = args.get('cursor')
+    if cursor:
+        created_at, member_id = decode_cursor(cursor)
+        conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params.extend([created_at, created_at, member_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT {', '.join(columns)} FROM members {where} ORDER BY created_at DESC, id DESC LIMIT %s"
+    return query, params + [limit + 1], fields, limit
+
+def member_page(members, fields, limit):
+    """Response body for a page of members read with member_page_query"""
+    # The extra row tells us whether another page exists
+    next_cursor = encode_cursor(members[limit - 1]) if len(members) > limit else None
+    members = [{f: member[f] for f in fields} for member in members[:limit]]
+    return {'members': members, 'next_cursor': next_cursor}
+
+def stats_response(summary):
+    """Dashboard statistics from a chama summary row"""
+    total_members = summary['total_members']
+    paid_members = summary['paid_members']
+    return {
+        'total_members': total_members,
+        'paid_members': paid_members,
+        'unpaid_members': total_members - paid_members,
+        'due_date': summary['due_date'].strftime('%Y-%m-%d') if summary['due_date'] else None
+    }
+
+def json_default(value):
+    """Serialize values the way Flask's jsonify does"""
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,278 @@
+from db import execute_query, transaction
+from cache import member_cache
+from summary import apply_delta, DEFAULT_CHAMA_ID
+from phones import normalize_phone
+from ledger import post_receipts
+from datetime import datetime
+import os
+import re
+
+# Reconciliation configuration
+RECONCILE_CHUNK_SIZE = int(os.getenv('RECONCILE_CHUNK_SIZE', 500))
+RECONCILE_MAX_FLAGS = 1000
+
+# Column names used by M-Pesa statement and paybill exports, lower-cased
+COLUMNS = {
+    'receipt': ['receipt no.', 'receipt no', 'receipt', 'transaction id', 'trans id'],
+    'time': ['completion time', 'trans time', 'transaction time', 'date'],
+    'amount': ['paid in', 'trans amount', 'amount'],
+    'status': ['transaction status', 'status'],
+    'party': ['other party info', 'msisdn', 'phone number', 'phone'],
+    'reference': ['a/c no.', 'a/c no', 'account no.', 'account no', 'account', 'bill ref number', 'reference'],
+}
+
+TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y%m%d%H%M%S']
+
+_PHONE = re.compile(r'\+?\d[\d ]{7,}\d')
+_MEMBER_REF = re.compile(r'^M?(\d+)$')
+
+def field(row, name):
+    """First non-empty value among a field's known column names"""
+    for column in COLUMNS[name]:
+        value = row.get(column)
+        if value not in (None, ''):
+            return str(value).strip()
+    return None
+
+def parse_time(value):
+    """Completion time of a transaction, or None if unrecognised"""
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def party_phone(value):
+    """E.164 phone number from 'Other Party Info' such as '254712345678 - JANE DOE'
+
+    Masked numbers (2547****5678) can't be matched and give None.
+    """
+    match = _PHONE.search(value or '')
+    if not match or '*' in value[:match.end() + 1]:
+        return None
+    try:
+        return normalize_phone(match.group())
+    except ValueError:
+        return None
+
+def build_index(chama_id):
+    """Hash indexes over a chama's members by phone and by account reference
+
+    Members can pay with their phone number or quote their member number
+    ('17' or 'M17') as the account reference. One query, O(members).
+    """
+    members = execute_query(
+        """SELECT m.id, m.phone_e164, c.amount_expected
+           FROM members m LEFT JOIN chamas c ON c.id = m.chama_id
+           WHERE m.chama_id = %s""",
+        (chama_id,),
+        fetch=True
+    ) or []
+
+    by_phone = {}
+    by_reference = {}
+    for member in members:
+        if member['phone_e164']:
+            by_phone[member['phone_e164']] = member
+        by_reference[str(member['id'])] = member
+    return by_phone, by_reference
+
+def match_member(row, by_phone, by_reference):
+    """Member a statement row belongs to, or None"""
+    reference = field(row, 'reference')
+    if reference:
+        ref_match = _MEMBER_REF.match(reference.upper().replace(' ', ''))
+        if ref_match and ref_match.group(1).lstrip('0') in by_reference:
+            return by_reference[ref_match.group(1).lstrip('0')]
+        try:
+            member = by_phone.get(normalize_phone(reference))
+            if member:
+                return member
+        except ValueError:
+            pass
+
+    phone = party_phone(field(row, 'party'))
+    return by_phone.get(phone) if phone else None
+
+def cycle_start(chama_id):
+    """When a chama's open cycle started, or None if it has none"""
+    result = execute_query(
+        """SELECT cy.opened_at FROM chamas c JOIN chama_cycles cy ON cy.id = c.current_cycle_id
+           WHERE c.id = %s""",
+        (chama_id,),
+        fetch=True
+    )
+    return result[0]['opened_at'] if result else None
+
+def _write_chunk(chunk, chama_id, opened_at):
+    """Insert one chunk of matched payments and mark members who have paid in full
+
+    Receipts already in the database (from an earlier or overlapping
+    statement) are looked up in one query and skipped. Only payments made
+    since the open cycle started (``opened_at``) count towards has_paid,
+    added up per member with what they already paid in the cycle; older
+    receipts are only posted to the cycle they fall in. Returns the set
+    of receipts that were duplicates and the set of members paid in full.
+    """
+    receipts = [payment['receipt'] for payment in chunk]
+    placeholders = ', '.join(['%s'] * len(receipts))
+    settled = set()
+
+    with transaction() as cursor:
+        cursor.execute(
+            f"SELECT mpesa_receipt FROM payments WHERE mpesa_receipt IN ({placeholders})",
+            receipts
+        )
+        existing = {row['mpesa_receipt'] for row in cursor.fetchall()}
+        new = [payment for payment in chunk if payment['receipt'] not in existing]
+
+        if new:
+            cursor.executemany(
+                """INSERT IGNORE INTO payments (member_id, amount, date, chama_id, mpesa_receipt)
+                   VALUES (%s, %s, COALESCE(%s, NOW()), %s, %s)""",
+                [(p['member_id'], p['amount'], p['date'], chama_id, p['receipt']) for p in new]
+            )
+            post_receipts(cursor, [p['receipt'] for p in new])
+
+            expected = {p['member_id']: p['expected'] for p in new if p['current']}
+            newly_paid = 0
+            if expected:
+                id_placeholders = ', '.join(['%s'] * len(expected))
+                since = ' AND date >= %s' if opened_at else ''
+                cursor.execute(
+                    f"""SELECT member_id, SUM(amount) AS total FROM payments
+                        WHERE member_id IN ({id_placeholders}){since}
+                        GROUP BY member_id""",
+                    list(expected) + ([opened_at] if opened_at else [])
+                )
+                settled = {
+                    row['member_id'] for row in cursor.fetchall()
+                    if row['total'] >= expected[row['member_id']]
+                }
+
+            if settled:
+                id_placeholders = ', '.join(['%s'] * len(settled))
+                cursor.execute(
+                    f"UPDATE members SET has_paid = 1, last_payment = NOW() WHERE id IN ({id_placeholders}) AND has_paid = 0",
+                    list(settled)
+                )
+                newly_paid = cursor.rowcount
+
+            apply_delta(cursor, paid=newly_paid, collected=sum(p['amount'] for p in new), chama_id=chama_id)
+
+    for member_id in settled:
+        member_cache.invalidate(member_id=member_id)
+    return existing, settled
+
+def _flag_unmatched(rows, chama_id):
+    """Keep unmatched transactions for an admin to resolve"""
+    with transaction() as cursor:
+        cursor.executemany(
+            """INSERT IGNORE INTO mpesa_unmatched (mpesa_receipt, chama_id, amount, paid_at, party, reference)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            [(r['receipt'], chama_id, r['amount'], r['date'], r['party'], r['reference']) for r in rows]
+        )
+
+def reconcile_statement(rows, chama_id=DEFAULT_CHAMA_ID):
+    """Match M-Pesa statement rows to a chama's members and record the payments
+
+    Rows are dicts keyed by lower-cased column name, consumed lazily and
+    written in chunks of RECONCILE_CHUNK_SIZE. Matching is a lookup in
+    in-memory indexes built once per run, so the whole statement costs
+    one member query plus a few statements per chunk. Only completed
+    'Paid In' transactions count. A member is marked paid once their
+    payments since the open cycle started add up to the expected amount;
+    receipts from before it are recorded against the earlier cycle and
+    counted as 'earlier_cycle'. Returns a report with flagged rows (row
+    numbers start at 1).
+    """
+    report = {
+        'processed': 0, 'matched': 0, 'partial': 0, 'earlier_cycle': 0, 'unmatched': 0,
+        'duplicates': 0, 'skipped': 0, 'invalid': 0,
+        'flags': [], 'flags_truncated': False
+    }
+    by_phone, by_reference = build_index(chama_id)
+    opened_at = cycle_start(chama_id)
+    seen = set()
+    chunk = []
+    unmatched = []
+
+    def flag(row_number, receipt, reason):
+        if len(report['flags']) < RECONCILE_MAX_FLAGS:
+            report['flags'].append({'row': row_number, 'receipt': receipt, 'reason': reason})
+        else:
+            report['flags_truncated'] = True
+
+    def flush():
+        duplicates, settled = _write_chunk(chunk, chama_id, opened_at)
+        for payment in chunk:
+            if payment['receipt'] in duplicates:
+                report['duplicates'] += 1
+                flag(payment['row'], payment['receipt'], 'Already recorded')
+            else:
+                report['matched'] += 1
+                if not payment['current']:
+                    report['earlier_cycle'] += 1
+                elif payment['member_id'] not in settled:
+                    report['partial'] += 1
+        chunk.clear()
+
+    def flush_unmatched():
+        _flag_unmatched(unmatched, chama_id)
+        unmatched.clear()
+
+    for row_number, row in enumerate(rows, start=1):
+        report['processed'] += 1
+
+        receipt = field(row, 'receipt')
+        status = (field(row, 'status') or 'completed').lower()
+        try:
+            amount = float((field(row, 'amount') or '0').replace(',', ''))
+        except ValueError:
+            amount = None
+
+        if not receipt or amount is None:
+            report['invalid'] += 1
+            flag(row_number, receipt, 'Missing receipt number or amount')
+            continue
+        if status != 'completed' or amount <= 0:
+            # Withdrawals, charges and failed transactions
+            report['skipped'] += 1
+            continue
+
+        receipt = receipt.upper()
+        if receipt in seen:
+            report['duplicates'] += 1
+            flag(row_number, receipt, 'Duplicate receipt in statement')
+            continue
+        seen.add(receipt)
+
+        date = parse_time(field(row, 'time'))
+        member = match_member(row, by_phone, by_reference)
+        if not member:
+            report['unmatched'] += 1
+            flag(row_number, receipt, 'No member matches the phone number or account reference')
+            unmatched.append({
+                'receipt': receipt, 'amount': amount, 'date': date,
+                'party': (field(row, 'party') or '')[:100], 'reference': (field(row, 'reference') or '')[:50]
+            })
+            if len(unmatched) >= RECONCILE_CHUNK_SIZE:
+                flush_unmatched()
+            continue
+
+        chunk.append({
+            'row': row_number, 'receipt': receipt, 'member_id': member['id'],
+            'amount': amount, 'date': date, 'expected': member['amount_expected'] or 0,
+            # Undated rows are stored as paid now
+            'current': date is None or opened_at is None or date >= opened_at
+        })
+        if len(chunk) >= RECONCILE_CHUNK_SIZE:
+            flush()
+
+    if chunk:
+        flush()
+    if unmatched:
+        flush_unmatched()
+
+    return report
@@ -1,21 +1,49 @@
-from flask import Blueprint, request, jsonify
-from db import execute_query
-from twilio.rest import Client
+from flask import Blueprint, Response, request, jsonify
+from db import execute_query, transaction, pool_stats
+from outbox import enqueue_reminders, kick, outbox_stats
+from planner import planner_stats, PLANNER_LOOKAHEAD_SECONDS
+from cache import member_cache
+from changes import stream, SSE_HEADERS
+from summary import apply_delta, get_summary, data_version, DEFAULT_CHAMA_ID
+from http_cache import json_response, response_cache
+from cycles import rollover_chama
+from member_import import import_members
+from phones import normalize_phone
+from reconcile import reconcile_statement
+import ledger
+from message_templates import list_templates, save_template, message_templates
+from queries import (
+    MARK_PAID_QUERY, INSERT_PAYMENT_QUERY, MEMBER_CONTRIBUTION_QUERY, member_page_query, member_page, stats_response
+)
 import os
-from datetime import datetime
+import csv
+import io
+import json
+import time
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-# Twilio configuration
-twilio_client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
-TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER', '+14155238886')
-
 @api_bp.route('/members', methods=['GET'])
 def get_members():
-    """Get all members"""
+    """Get a page of members, newest first
+
+    Query parameters: ``limit``, ``cursor`` (from ``next_cursor``),
+    ``chama_id``, ``has_paid`` (0/1), ``q`` (name prefix) and ``fields``
+    (comma-separated). Answers 304 to an If-None-Match for unchanged data.
+    """
     try:
-        members = execute_query("SELECT * FROM members ORDER BY created_at DESC", fetch=True)
-        return jsonify({'members': members or []})
+        try:
+            query, params, fields, limit = member_page_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def build():
+            members = execute_query(query, params, fetch=True)
+            if members is None:
+                raise RuntimeError('Failed to load members')
+            return member_page(members, fields, limit)
+        
+        return json_response(data_version(request.args.get('chama_id', type=int)), build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -23,91 +51,262 @@ def get_members():
 def add_member():
     """Add new member"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         name = data.get('name', '').strip()
         phone_number = data.get('phone_number', '').strip()
+        locale = data.get('locale') or None
         
         if not name or not phone_number:
             return jsonify({'error': 'Name and phone number are required'}), 400
         
-        # Check if member already exists
-        existing = execute_query(
-            "SELECT id FROM members WHERE phone_number = %s", 
-            (phone_number,), 
-            fetch=True
-        )
+        try:
+            chama_id = int(data.get('chama_id') or DEFAULT_CHAMA_ID)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'chama_id must be a number'}), 400
         
-        if existing:
-            return jsonify({'error': 'Member with this phone number already exists'}), 400
+        # Stored in E.164, so '0712...' and '+254 712 ...' are one member
+        try:
+            phone_number = normalize_phone(phone_number)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Insert new member
-        execute_query(
-            "INSERT INTO members (name, phone_number) VALUES (%s, %s)",
-            (name, phone_number)
-        )
+        # Check the chama and for an existing member, and insert on one connection
+        with transaction() as cursor:
+            cursor.execute("SELECT id FROM chamas WHERE id = %s", (chama_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': f'Chama {chama_id} not found'}), 400
+            
+            cursor.execute(
+                "SELECT id FROM members WHERE phone_e164 = %s FOR UPDATE", 
+                (phone_number,)
+            )
+            
+            if cursor.fetchone():
+                return jsonify({'error': 'Member with this phone number already exists'}), 400
+            
+            # Insert new member
+            cursor.execute(
+                "INSERT INTO members (name, phone_number, phone_e164, chama_id, locale) VALUES (%s, %s, %s, %s, %s)",
+                (name, phone_number, phone_number, chama_id, locale)
+            )
+            apply_delta(cursor, members=1, chama_id=chama_id, member_id=cursor.lastrowid)
+        member_cache.invalidate(phone_number)
         
         return jsonify({'message': 'Member added successfully'}), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def csv_rows(stream):
+    """Stream CSV rows as dicts with lower-cased headers"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    for row in reader:
+        yield {key.strip().lower(): value for key, value in row.items() if key}
+
+def ndjson_rows(stream):
+    """Stream newline-delimited JSON rows; unparseable lines yield None"""
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+@api_bp.route('/members/import', methods=['POST'])
+def bulk_import_members():
+    """Bulk import members from CSV, NDJSON or a JSON array
+
+    Existing phone numbers are updated in place. Returns counts and a
+    per-row error report.
+    """
+    try:
+        if 'file' in request.files:
+            rows = csv_rows(request.files['file'].stream)
+        elif request.mimetype == 'text/csv':
+            rows = csv_rows(request.stream)
+        elif request.mimetype == 'application/x-ndjson':
+            rows = ndjson_rows(request.stream)
+        elif request.is_json:
+            data = request.get_json()
+            rows = data.get('members', []) if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                return jsonify({'error': 'Expected a list of members'}), 400
+        else:
+            return jsonify({'error': 'Send a CSV file, text/csv, application/x-ndjson or a JSON list'}), 415
+        
+        report = import_members(rows, request.args.get('chama_id', DEFAULT_CHAMA_ID, type=int))
+        
+        return jsonify(report), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/payments/reconcile', methods=['POST'])
+def reconcile_payments():
+    """Record payments from an M-Pesa statement CSV export
+
+    Transactions are matched to the chama's members by account reference
+    or phone number. Returns counts and the rows that were flagged as
+    unmatched, duplicate or invalid.
+    """
+    try:
+        if 'file' in request.files:
+            rows = csv_rows(request.files['file'].stream)
+        elif request.mimetype == 'text/csv':
+            rows = csv_rows(request.stream)
+        else:
+            return jsonify({'error': 'Send the statement as a CSV file or text/csv'}), 415
+        
+        report = reconcile_statement(rows, request.args.get('chama_id', DEFAULT_CHAMA_ID, type=int))
+        
+        return jsonify(report), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/payments/unmatched', methods=['GET'])
+def get_unmatched_payments():
+    """M-Pesa transactions that couldn't be matched to a member"""
+    try:
+        chama_id = request.args.get('chama_id', DEFAULT_CHAMA_ID, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 500)
+        
+        rows = execute_query(
+            """SELECT mpesa_receipt, amount, paid_at, party, reference
+               FROM mpesa_unmatched WHERE chama_id = %s
+               ORDER BY created_at DESC LIMIT %s""",
+            (chama_id, limit),
+            fetch=True
+        )
+        
+        return jsonify(rows or []), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/members/<int:member_id>/pay', methods=['PATCH'])
 def mark_member_paid(member_id):
-    """Mark member as paid"""
+    """Mark member as paid, recording their chama's contribution as the payment"""
     try:
-        # Update member payment status
-        execute_query(
-            "UPDATE members SET has_paid = 1, last_payment = NOW() WHERE id = %s",
-            (member_id,)
-        )
+        # Update member payment status, payments, ledger and counters together
+        with transaction() as cursor:
+            cursor.execute(MEMBER_CONTRIBUTION_QUERY, (member_id,))
+            member = cursor.fetchone()
+            if not member:
+                return jsonify({'error': 'Member not found'}), 404
+            if member['amount_expected'] is None:
+                return jsonify({'error': 'Member has no chama contribution to record'}), 400
+            
+            cursor.execute(MARK_PAID_QUERY, (member_id,))
+            if cursor.rowcount:
+                amount = member['amount_expected']
+                cursor.execute(INSERT_PAYMENT_QUERY, (member_id, amount, member['chama_id']))
+                ledger.post_payment(cursor, cursor.lastrowid)
+                apply_delta(cursor, paid=1, collected=amount, chama_id=member['chama_id'], member_id=member_id)
+        member_cache.invalidate(member_id=member_id)
         
         return jsonify({'message': 'Member marked as paid'}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@api_bp.route('/send-reminders', methods=['POST'])
-def send_reminders():
-    """Send WhatsApp reminders to unpaid members"""
+@api_bp.route('/members/<int:member_id>/ledger', methods=['GET'])
+def get_member_ledger(member_id):
+    """Get a member's balance and a page of ledger entries, newest first
+
+    Query parameters: ``limit`` and ``before`` (from ``next_before``).
+    """
     try:
-        # Get unpaid members
-        unpaid_members = execute_query(
-            "SELECT * FROM members WHERE has_paid = 0", 
-            fetch=True
-        )
+        limit = max(min(request.args.get('limit', ledger.LEDGER_PAGE_SIZE, type=int), 200), 1)
+        entries = ledger.history(member_id, request.args.get('before', type=int), limit)
+        if entries is None:
+            return jsonify({'error': 'Failed to load ledger'}), 500
         
-        if not unpaid_members:
-            return jsonify({'message': 'No unpaid members found', 'sent': 0}), 200
+        return jsonify({
+            'member_id': member_id,
+            'balance': float(ledger.balance(member_id)),
+            'entries': [{**entry, 'amount': float(entry['amount'])} for entry in entries],
+            'next_before': entries[-1]['id'] if len(entries) == limit else None
+        }), 200
         
-        sent_count = 0
-        errors = []
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/members/<int:member_id>/penalties', methods=['POST'])
+def add_penalty(member_id):
+    """Charge a member a penalty (``{"amount": 100, "note": "Late"}``)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        entry_id = ledger.post_penalty(member_id, data.get('amount'), data.get('note'))
         
-        for member in unpaid_members:
-            try:
-                message = f"Hi {member['name']}! This is a friendly reminder that your Chama contribution is due. Please make your payment and reply 'PAID' to confirm. Thank you!"
-                
-                twilio_client.messages.create(
-                    from_=f'whatsapp:{TWILIO_WHATSAPP_NUMBER}',
-                    body=message,
-                    to=f"whatsapp:{member['phone_number']}"
-                )
-                
-                sent_count += 1
-                
-            except Exception as e:
-                errors.append(f"Failed to send to {member['name']}: {str(e)}")
+        return jsonify({'id': entry_id, 'balance': float(ledger.balance(member_id))}), 201
         
-        response_data = {
-            'message': f'Reminders sent to {sent_count} members',
-            'sent': sent_count,
-            'total_unpaid': len(unpaid_members)
-        }
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/ledger/<int:entry_id>/reverse', methods=['POST'])
+def reverse_ledger_entry(entry_id):
+    """Cancel a ledger entry with an opposite one (``{"note": "..."}``)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        reversal_id = ledger.reverse(entry_id, data.get('note'))
+        
+        return jsonify({'id': reversal_id, 'reverses_id': entry_id}), 201
+        
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/send-reminders', methods=['POST'])
+def send_reminders():
+    """Send WhatsApp reminders to a chama's unpaid members"""
+    try:
+        chama_id = request.args.get('chama_id', DEFAULT_CHAMA_ID, type=int)
         
-        if errors:
-            response_data['errors'] = errors
+        # Queue one reminder per unpaid member for this cycle; reruns skip
+        # members that were already queued
+        queued, total_unpaid = enqueue_reminders(chama_id)
         
-        return jsonify(response_data), 200
+        if not total_unpaid:
+            return jsonify({'message': 'No unpaid members found', 'queued': 0}), 200
         
+        # Deliver in the background so large chamas don't time out the request
+        kick()
+        
+        return jsonify({
+            'message': f'Queued reminders for {queued} members',
+            'queued': queued,
+            'total_unpaid': total_unpaid
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/outbox', methods=['GET'])
+def get_outbox_stats():
+    """Get outbound message counts by delivery status"""
+    try:
+        return jsonify(outbox_stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/reminders', methods=['GET'])
+def get_reminder_stats():
+    """Get unpaid member counts by reminder planner state"""
+    try:
+        # Counts also move with the clock and the planner, so the version
+        # rolls over every planner run as well
+        version = data_version()
+        if version is not None:
+            version = f"{version}:{int(time.time() // PLANNER_LOOKAHEAD_SECONDS)}"
+        return json_response(version, planner_stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -115,21 +314,75 @@ def send_reminders():
 def get_stats():
     """Get dashboard statistics"""
     try:
-        # Get member counts
-        total_members = execute_query("SELECT COUNT(*) as count FROM members", fetch=True)[0]['count']
-        paid_members = execute_query("SELECT COUNT(*) as count FROM members WHERE has_paid = 1", fetch=True)[0]['count']
-        unpaid_members = total_members - paid_members
+        # Served from the chama's precomputed summary row
+        chama_id = request.args.get('chama_id', DEFAULT_CHAMA_ID, type=int)
+        return json_response(data_version(chama_id), lambda: stats_response(get_summary(chama_id)))
         
-        # Get due date
-        due_date_result = execute_query("SELECT due_date FROM settings WHERE id = 1", fetch=True)
-        due_date = due_date_result[0]['due_date'].strftime('%Y-%m-%d') if due_date_result else None
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/chamas/<int:chama_id>/rollover', methods=['POST'])
+def rollover_cycle(chama_id):
+    """Close a chama's current cycle and start the next one"""
+    try:
+        next_due = rollover_chama(chama_id)
+        return jsonify({'message': 'Cycle rolled over', 'due_date': next_due.strftime('%Y-%m-%d')}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/templates', methods=['GET'])
+def get_templates():
+    """Get the message templates in use, per locale"""
+    try:
+        return jsonify(list_templates()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/templates/<name>/<locale>', methods=['PUT'])
+def update_template(name, locale):
+    """Edit a message template for one locale"""
+    try:
+        body = (request.get_json() or {}).get('body', '')
+        if not body.strip():
+            return jsonify({'error': 'Template body is required'}), 400
         
-        return jsonify({
-            'total_members': total_members,
-            'paid_members': paid_members,
-            'unpaid_members': unpaid_members,
-            'due_date': due_date
-        }), 200
+        save_template(name, locale, body)
+        return jsonify({'message': 'Template updated', 'name': name, 'locale': locale}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/changes', methods=['GET'])
+def change_feed():
+    """Stream a chama's member, payment and counter changes as Server-Sent Events
+
+    Events: ``member`` (a changed member row), ``stats`` (the dashboard
+    counters) and ``reload`` (a bulk change; fetch the data again). Each
+    open stream holds a worker thread, so serve it from a threaded worker
+    or the async server.
+    """
+    chama_id = request.args.get('chama_id', DEFAULT_CHAMA_ID, type=int)
+    return Response(stream(chama_id), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@api_bp.route('/pool-stats', methods=['GET'])
+def get_pool_stats():
+    """Get database connection pool statistics"""
+    try:
+        return jsonify(pool_stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get member lookup, message template and response cache statistics"""
+    try:
+        stats = member_cache.stats()
+        stats['templates'] = message_templates.stats()
+        stats['responses'] = response_cache.stats()
+        return jsonify(stats), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,36 +1,220 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-import requests
+from apscheduler.triggers.interval import IntervalTrigger
+from outbox import drain
+from planner import plan_unplanned, send_due, PLANNER_LOOKAHEAD_SECONDS
+from cycles import rollover_due_cycles
+from inbound import WEBHOOK_ASYNC, resubmit_stale
+from changes import prune_changes
+from member_import import backfill_phones
+from leader import LeaderLease, LEADER_LEASE_SECONDS
+from metrics import timed_job
+from datetime import datetime, timezone
+from functools import wraps
+import atexit
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def daily_reminder_job():
-    """Daily job to send reminders at 9:00 AM EAT"""
+# Every process runs a scheduler, but only the lease holder runs the jobs
+lease = LeaderLease('scheduler')
+_scheduler = None
+
+def leader_only(job):
+    """Skip the job unless this process holds the scheduler lease"""
+    timed = timed_job(job.__name__)(job)
+
+    @wraps(job)
+    def run():
+        if lease.is_leader:
+            timed()
+    return run
+
+def lease_job():
+    """Keep (or take over) the scheduler lease
+
+    A process that has just taken the lease over runs the phone backfill
+    straight away instead of at its next interval.
+    """
+    was_leader = lease.is_leader
+    if lease.renew() and not was_leader and _scheduler is not None:
+        _scheduler.modify_job('backfill_phones', next_run_time=datetime.now(timezone.utc))
+
+@leader_only
+def plan_job():
+    """Plan reminders for new members and members of freshly rolled-over chamas"""
+    try:
+        planned = plan_unplanned()
+        if planned:
+            logger.info(f"Planned reminders for {planned} members")
+    except Exception as e:
+        logger.error(f"Error in reminder planning job: {e}")
+
+@leader_only
+def reminder_job():
+    """Queue the reminders whose slot has come"""
+    try:
+        # Only enqueue; the outbox delivers
+        queued = send_due()
+        if queued:
+            logger.info(f"Queued {queued} due reminders")
+    except Exception as e:
+        logger.error(f"Error in reminder job: {e}")
+
+@leader_only
+def cycle_rollover_job():
+    """Start a new contribution cycle for chamas whose due date has passed"""
+    try:
+        rolled = rollover_due_cycles()
+        if rolled:
+            logger.info(f"Rolled over {rolled} chama cycles")
+    except Exception as e:
+        logger.error(f"Error in cycle rollover job: {e}")
+
+@leader_only
+def outbox_job():
+    """Deliver any queued outbound messages"""
+    try:
+        sent = drain()
+        if sent:
+            logger.info(f"Outbox delivered {sent} messages")
+    except Exception as e:
+        logger.error(f"Error draining outbox: {e}")
+
+@leader_only
+def inbound_job():
+    """Pick up inbound messages a worker never finished"""
+    try:
+        resubmitted = resubmit_stale()
+        if resubmitted:
+            logger.info(f"Resubmitted {resubmitted} stale inbound messages")
+    except Exception as e:
+        logger.error(f"Error resubmitting inbound messages: {e}")
+
+@leader_only
+def prune_changes_job():
+    """Delete dashboard change events nobody will read any more"""
+    try:
+        pruned = prune_changes()
+        if pruned:
+            logger.info(f"Pruned {pruned} change events")
+    except Exception as e:
+        logger.error(f"Error pruning change events: {e}")
+
+@leader_only
+def backfill_phones_job():
+    """Give members stored before phone normalization their E.164 number"""
     try:
-        # Call the send-reminders endpoint
-        response = requests.post('http://localhost:5000/api/send-reminders')
-        if response.status_code == 200:
-            logger.info("Daily reminders sent successfully")
-        else:
-            logger.error(f"Failed to send reminders: {response.status_code}")
+        counts = backfill_phones()
+        if counts['updated']:
+            logger.info(f"Normalized {counts['updated']} member phone numbers")
+        if counts['invalid'] or counts['duplicate']:
+            logger.warning(
+                f"{counts['invalid']} members have invalid phone numbers and {counts['duplicate']} "
+                f"share one with another member; fix them to make them reachable"
+            )
     except Exception as e:
-        logger.error(f"Error in daily reminder job: {e}")
+        logger.error(f"Error normalizing phone numbers: {e}")
 
 def start_scheduler():
-    """Start the background scheduler"""
-    scheduler = BackgroundScheduler()
+    """Start the background scheduler once per process
+    
+    Safe to call from every worker: jobs only run in the process holding
+    the scheduler lease, and another process takes over within
+    LEADER_LEASE_SECONDS if the leader dies.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    
+    scheduler = BackgroundScheduler(timezone='UTC')
+    
+    lease.renew()
+    scheduler.add_job(
+        lease_job,
+        IntervalTrigger(seconds=max(LEADER_LEASE_SECONDS // 3, 1)),
+        id='leader_lease',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Roll over expired cycles hourly; idempotent, so it suits every time zone
+    scheduler.add_job(
+        cycle_rollover_job,
+        CronTrigger(minute=5),
+        id='cycle_rollover',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Plan reminders for members without one, e.g. after a rollover
+    scheduler.add_job(
+        plan_job,
+        IntervalTrigger(minutes=5),
+        id='reminder_planning',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Queue whatever is due; the lookahead covers the gap between ticks
+    scheduler.add_job(
+        reminder_job,
+        IntervalTrigger(seconds=PLANNER_LOOKAHEAD_SECONDS),
+        id='reminders',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
     
-    # Schedule daily reminders at 9:00 AM EAT (UTC+3)
+    # Drain the outbox regularly so interrupted sends resume
     scheduler.add_job(
-        daily_reminder_job,
-        CronTrigger(hour=6, minute=0),  # 6 AM UTC = 9 AM EAT
-        id='daily_reminders',
-        replace_existing=True
+        outbox_job,
+        IntervalTrigger(seconds=30),
+        id='outbox',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
     )
     
+    # Keep the change feed table small
+    scheduler.add_job(
+        prune_changes_job,
+        IntervalTrigger(minutes=10),
+        id='prune_changes',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Normalize numbers stored before phone_e164, starting now (and whenever
+    # the lease changes hands, see lease_job); cheap once done
+    scheduler.add_job(
+        backfill_phones_job,
+        IntervalTrigger(minutes=10),
+        id='backfill_phones',
+        next_run_time=datetime.now(timezone.utc),
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    if WEBHOOK_ASYNC:
+        scheduler.add_job(
+            inbound_job,
+            IntervalTrigger(seconds=30),
+            id='inbound',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+    
     scheduler.start()
-    logger.info("Scheduler started - daily reminders at 9:00 AM EAT")
+    atexit.register(lease.release)
+    logger.info(f"Scheduler started ({lease.holder}, leader: {lease.is_leader})")
+    _scheduler = scheduler
     return scheduler
\ No newline at end of file
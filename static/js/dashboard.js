@@ -3,9 +3,10 @@
 // API base URL
 const API_BASE = '/api';
 
-// Load dashboard data on page load
+// Load dashboard data on page load, then follow changes live
 document.addEventListener('DOMContentLoaded', function() {
     loadDashboardData();
+    connectChangeFeed();
 });
 
 // Load all dashboard data
@@ -23,30 +24,146 @@ async function loadStats() {
         const data = await response.json();
         
         if (response.ok) {
-            document.getElementById('total-members').textContent = data.total_members;
-            document.getElementById('paid-members').textContent = data.paid_members;
-            document.getElementById('unpaid-members').textContent = data.unpaid_members;
-            document.getElementById('due-date').textContent = data.due_date || 'Not set';
+            renderStats(data);
         }
     } catch (error) {
         console.error('Error loading stats:', error);
     }
 }
 
-// Load members table
+// Fill the statistics cards
+function renderStats(data) {
+    document.getElementById('total-members').textContent = data.total_members;
+    document.getElementById('paid-members').textContent = data.paid_members;
+    document.getElementById('unpaid-members').textContent = data.unpaid_members;
+    document.getElementById('due-date').textContent = data.due_date || 'Not set';
+}
+
+// Live updates: the server pushes changed rows and counters, so the page
+// only reloads everything after bulk changes or a dropped connection
+let liveUpdates = false;
+let feedConnectedBefore = false;
+let reloadTimer = null;
+
+function connectChangeFeed() {
+    if (!window.EventSource) return;
+    
+    const source = new EventSource(`${API_BASE}/changes`);
+    
+    source.addEventListener('ready', function() {
+        liveUpdates = true;
+        // Changes made while we were disconnected were missed
+        if (feedConnectedBefore) scheduleReload();
+        feedConnectedBefore = true;
+    });
+    source.addEventListener('member', function(e) {
+        applyMemberChange(JSON.parse(e.data));
+    });
+    source.addEventListener('stats', function(e) {
+        renderStats(JSON.parse(e.data));
+    });
+    source.addEventListener('reload', scheduleReload);
+    source.onerror = function() {
+        // EventSource reconnects by itself; fall back to reloads meanwhile
+        liveUpdates = false;
+    };
+}
+
+// Coalesce bursts of reload events into one fetch
+function scheduleReload() {
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(loadDashboardData, 500);
+}
+
+// Whether a member belongs in the table under the current filters
+function matchesFilters(member) {
+    const search = document.getElementById('member-search').value.trim().toLowerCase();
+    const filter = document.getElementById('member-filter').value;
+    
+    if (search && !member.name.toLowerCase().startsWith(search)) return false;
+    if (filter && Number(Boolean(member.has_paid)) !== Number(filter)) return false;
+    return true;
+}
+
+// Patch one member's row in place
+function applyMemberChange(member) {
+    const tbody = document.getElementById('member-table-body');
+    const row = tbody.querySelector(`tr[data-member-id="${member.id}"]`);
+    
+    if (row) {
+        if (matchesFilters(member)) {
+            row.outerHTML = memberRow(member);
+        } else {
+            row.remove();
+        }
+        return;
+    }
+    
+    // Not shown yet: add it only if it is new, i.e. belongs above the first row
+    const first = tbody.querySelector('tr[data-member-id]');
+    if (!matchesFilters(member)) return;
+    if (first && new Date(member.created_at) < new Date(first.dataset.created)) return;
+    
+    if (!first) tbody.innerHTML = '';
+    tbody.insertAdjacentHTML('afterbegin', memberRow(member));
+}
+
+// Members paging state
+const MEMBER_PAGE_SIZE = 50;
+const MEMBER_FIELDS = 'id,name,phone_number,has_paid,last_payment,created_at';
+let nextMemberCursor = null;
+
+// Build the members query from the current filters
+function membersUrl(cursor) {
+    const params = new URLSearchParams({ limit: MEMBER_PAGE_SIZE, fields: MEMBER_FIELDS });
+    const search = document.getElementById('member-search').value.trim();
+    const filter = document.getElementById('member-filter').value;
+    
+    if (search) params.set('q', search);
+    if (filter) params.set('has_paid', filter);
+    if (cursor) params.set('cursor', cursor);
+    
+    return `${API_BASE}/members?${params}`;
+}
+
+// Load the first page of the members table
 async function loadMembers() {
     try {
-        const response = await fetch(`${API_BASE}/members`);
+        const response = await fetch(membersUrl());
         const data = await response.json();
         
         if (response.ok) {
             renderMembersTable(data.members);
+            setNextCursor(data.next_cursor);
         }
     } catch (error) {
         console.error('Error loading members:', error);
     }
 }
 
+// Append the next page of members
+async function loadMoreMembers() {
+    if (!nextMemberCursor) return;
+    
+    try {
+        const response = await fetch(membersUrl(nextMemberCursor));
+        const data = await response.json();
+        
+        if (response.ok) {
+            document.getElementById('member-table-body')
+                .insertAdjacentHTML('beforeend', data.members.map(memberRow).join(''));
+            setNextCursor(data.next_cursor);
+        }
+    } catch (error) {
+        console.error('Error loading more members:', error);
+    }
+}
+
+function setNextCursor(cursor) {
+    nextMemberCursor = cursor;
+    document.getElementById('load-more-container').classList.toggle('hidden', !cursor);
+}
+
 // Render members table
 function renderMembersTable(members) {
     const tbody = document.getElementById('member-table-body');
@@ -63,8 +180,13 @@ function renderMembersTable(members) {
         return;
     }
     
-    tbody.innerHTML = members.map(member => `
-        <tr class="hover:bg-gray-50 transition-colors">
+    tbody.innerHTML = members.map(memberRow).join('');
+}
+
+// Markup for one member row
+function memberRow(member) {
+    return `
+        <tr class="hover:bg-gray-50 transition-colors" data-member-id="${member.id}" data-created="${member.created_at}">
             <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
                 ${member.id}
             </td>
@@ -104,9 +226,17 @@ function renderMembersTable(members) {
                 `}
             </td>
         </tr>
-    `).join('');
+    `;
 }
 
+// Reload the first page when filters change
+let memberSearchTimer = null;
+document.getElementById('member-search').addEventListener('input', function() {
+    clearTimeout(memberSearchTimer);
+    memberSearchTimer = setTimeout(loadMembers, 300);
+});
+document.getElementById('member-filter').addEventListener('change', loadMembers);
+
 // Mark member as paid
 async function markAsPaid(memberId) {
     try {
@@ -121,7 +251,7 @@ async function markAsPaid(memberId) {
         
         if (response.ok) {
             showToast('Member marked as paid successfully!', 'success');
-            loadDashboardData(); // Refresh data
+            if (!liveUpdates) loadDashboardData(); // Otherwise the change feed updates the row
         } else {
             showToast(data.error || 'Error marking member as paid', 'error');
         }
@@ -149,7 +279,10 @@ async function sendReminders() {
         const data = await response.json();
         
         if (response.ok) {
-            showToast(`Reminders sent to ${data.sent} members!`, 'success');
+            showToast(data.message, 'success');
+            if (data.queued) {
+                await waitForOutbox();
+            }
         } else {
             showToast(data.error || 'Error sending reminders', 'error');
         }
@@ -167,6 +300,27 @@ async function sendReminders() {
     }
 }
 
+// Poll the outbox until queued reminders are delivered
+async function waitForOutbox() {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        
+        const response = await fetch(`${API_BASE}/outbox`);
+        const outbox = await response.json();
+        
+        if (!response.ok) {
+            showToast(outbox.error || 'Error checking reminder progress', 'error');
+            return;
+        }
+        
+        if (outbox.pending === 0 && outbox.sending === 0) {
+            const type = outbox.failed ? 'error' : 'success';
+            showToast(`Reminders delivered${outbox.failed ? `, ${outbox.failed} failed` : ''}!`, type);
+            return;
+        }
+    }
+}
+
 // Refresh dashboard
 function refreshDashboard() {
     loadDashboardData();
@@ -212,7 +366,7 @@ document.getElementById('add-member-form').addEventListener('submit', async func
         if (response.ok) {
             showToast('Member added successfully!', 'success');
             closeAddMemberModal();
-            loadDashboardData(); // Refresh data
+            if (!liveUpdates) loadDashboardData(); // Otherwise the change feed adds the row
         } else {
             showToast(data.error || 'Error adding member', 'error');
         }
@@ -0,0 +1,66 @@
+from db import execute_query, transaction
+from queries import DELTA_QUERY, SUMMARY_QUERY, RECORD_CHANGE_QUERY, CHANGE_VERSION_QUERY, CHAMA_VERSION_QUERY
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chama used when a request or member doesn't name one
+DEFAULT_CHAMA_ID = int(os.getenv('DEFAULT_CHAMA_ID', 1))
+
+def apply_delta(cursor, members=0, paid=0, collected=0, chama_id=DEFAULT_CHAMA_ID, member_id=None):
+    """Adjust a chama's counters inside the caller's transaction
+
+    Also publishes the change to live dashboards: the member's row when
+    ``member_id`` is given, otherwise a reload.
+    """
+    cursor.execute(DELTA_QUERY, (chama_id, members, paid, collected))
+    cursor.execute(RECORD_CHANGE_QUERY, (chama_id, member_id))
+
+def rebuild_summary(chama_id=DEFAULT_CHAMA_ID):
+    """Recompute a chama's counters from members and payments"""
+    with transaction() as cursor:
+        cursor.execute(
+            """INSERT INTO chama_summary (chama_id, total_members, paid_members, total_collected)
+               SELECT %s,
+                      (SELECT COUNT(*) FROM members WHERE chama_id = %s),
+                      (SELECT COUNT(*) FROM members WHERE chama_id = %s AND has_paid = 1),
+                      (SELECT COALESCE(SUM(p.amount), 0) FROM payments p
+                       JOIN members m ON m.id = p.member_id WHERE m.chama_id = %s)
+               ON DUPLICATE KEY UPDATE
+                   total_members = VALUES(total_members),
+                   paid_members = VALUES(paid_members),
+                   total_collected = VALUES(total_collected),
+                   member_version = member_version + 1""",
+            (chama_id, chama_id, chama_id, chama_id)
+        )
+    logger.info(f"Rebuilt summary for chama {chama_id}")
+
+def rebuild_all_summaries():
+    """Recompute the counters of every chama; returns how many were rebuilt"""
+    chamas = execute_query("SELECT id FROM chamas", fetch=True) or []
+    for chama in chamas:
+        rebuild_summary(chama['id'])
+    return len(chamas)
+
+def get_summary(chama_id=DEFAULT_CHAMA_ID):
+    """Get a chama's counters and the due date in one primary-key lookup"""
+    result = execute_query(SUMMARY_QUERY, (chama_id,), fetch=True)
+    if not result:
+        # First use after install or a manual reset
+        rebuild_summary(chama_id)
+        result = execute_query(SUMMARY_QUERY, (chama_id,), fetch=True)
+
+    return result[0]
+
+def data_version(chama_id=None):
+    """Watermark that moves with every member or payment write
+
+    One chama's when ``chama_id`` is given, otherwise every chama's. None
+    when there is nothing to go on yet (no summary row).
+    """
+    if chama_id is None:
+        result = execute_query(CHANGE_VERSION_QUERY, fetch=True)
+        return f"all:{result[0]['version']}" if result else None
+    result = execute_query(CHAMA_VERSION_QUERY, (chama_id,), fetch=True)
+    return f"{chama_id}:{result[0]['version']}" if result else None
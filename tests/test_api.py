@@ -0,0 +1,23 @@
+"""Request validation in the API blueprint (no database needed)"""
+import pytest
+from flask import Flask
+
+from routes.api import api_bp
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api_bp)
+    return app.test_client()
+
+@pytest.mark.parametrize('chama_id', ['abc', '1.5', [1], {'id': 1}])
+def test_add_member_rejects_a_non_numeric_chama(client, chama_id):
+    response = client.post('/api/members', json={'name': 'Jane', 'phone_number': '0712345678', 'chama_id': chama_id})
+
+    assert response.status_code == 400
+    assert 'chama_id' in response.get_json()['error']
+
+def test_add_member_requires_a_body(client):
+    response = client.post('/api/members', data='not json', content_type='text/plain')
+
+    assert response.status_code == 400
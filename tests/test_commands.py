@@ -0,0 +1,60 @@
+"""WhatsApp command parsing"""
+import pytest
+
+from commands import Command, ConversationStore, lookup, parse, respond
+
+@pytest.mark.parametrize('text, amount', [
+    ('PAID', None),
+    ('paid.', None),
+    ('Done!', None),
+    ('nimelipa', None),
+    ('paid 500', 500.0),
+    ('Paid ksh 1,500', 1500.0),
+    ('paid KSH1500', 1500.0),
+    ('nimelipa 2.5k', 2500.0),
+    ('paidd', None),
+    ('nimelpa', None),
+])
+def test_payment_claims(text, amount):
+    assert parse(text) == Command('pay', amount)
+
+@pytest.mark.parametrize('text', [
+    'I have not paid yet',
+    "I haven't paid",
+    'paid? no',
+    'bado',
+    'sijalipa',
+    'I said I will pay tomorrow',
+    'I have paid',
+    'pain',
+    'maid',
+    'gone',
+])
+def test_not_payment_claims(text):
+    assert parse(text).intent != 'pay'
+
+def test_substitution_typos_still_match_other_intents():
+    assert lookup('staus') == 'status'
+    assert lookup('pain') is None
+
+@pytest.mark.parametrize('text, amount', [
+    ('QWE123', None),
+    ('paid on the 12th', None),
+    ('ref QWE123 ksh 700', 700.0),
+    ('ksh 500', 500.0),
+])
+def test_amounts_come_from_standalone_numbers(text, amount):
+    assert parse(text).amount == amount
+
+def test_other_intents_anywhere_in_the_message():
+    assert parse('what is my balance?').intent == 'status'
+    assert parse('not sure, help').intent == 'help'
+
+def test_negated_message_records_nothing():
+    recorded = []
+    member = {'id': 1, 'name': 'Jane', 'has_paid': False}
+
+    template, _ = respond(member, 'I have not paid yet', recorded.append, 1000.0, ConversationStore())
+
+    assert template == 'reply_help'
+    assert recorded == []
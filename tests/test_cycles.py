@@ -0,0 +1,20 @@
+"""Cycle dates"""
+from datetime import date
+
+from cycles import next_due_date, rollover_cutoff, ROLLOVER_GRACE_DAYS
+
+def test_rollover_after_the_grace_period():
+    assert next_due_date(date(2026, 3, 20), 30, date(2026, 3, 28)) == date(2026, 4, 19)
+
+def test_early_rollover_still_opens_the_next_cycle():
+    assert next_due_date(date(2026, 3, 20), 30, date(2026, 3, 1)) == date(2026, 4, 19)
+    assert next_due_date(date(2026, 3, 20), 30, date(2026, 3, 20)) == date(2026, 4, 19)
+
+def test_missed_cycles_are_skipped():
+    assert next_due_date(date(2026, 1, 1), 7, date(2026, 1, 30)) == date(2026, 2, 5)
+
+def test_missing_cycle_length_defaults_to_thirty_days():
+    assert next_due_date(date(2026, 3, 1), None, date(2026, 3, 1)) == date(2026, 3, 31)
+
+def test_cutoff_is_the_grace_period_before_today():
+    assert (date(2026, 3, 28) - rollover_cutoff(date(2026, 3, 28))).days == ROLLOVER_GRACE_DAYS
@@ -0,0 +1,134 @@
+"""Conditional, compressed JSON responses"""
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+import http_cache
+from http_cache import ResponseCache, accepts_gzip, etag_matches, make_etag
+
+ETAG = make_etag('/api/stats?', 'all:42')
+
+def test_etags_are_weak_and_follow_url_and_version():
+    assert ETAG.startswith('W/"') and ETAG.endswith('"')
+    assert make_etag('/api/stats?', 'all:42') == ETAG
+    assert make_etag('/api/stats?', 'all:43') != ETAG
+    assert make_etag('/api/members?', 'all:42') != ETAG
+
+@pytest.mark.parametrize('header', [
+    ETAG,
+    ETAG[2:],                           # strong form of the same tag
+    '*',
+    ' * ',
+    f'W/"other", {ETAG}',
+    f'"other",{ETAG[2:]} , W/"more"',
+])
+def test_if_none_match_covers_the_tag(header):
+    assert etag_matches(header, ETAG)
+
+@pytest.mark.parametrize('header', [
+    None,
+    '',
+    'W/"other"',
+    '"other", W/"more"',
+    ETAG[:-2] + '"',                    # tag of another version
+    f'{ETAG}x',
+])
+def test_if_none_match_misses(header):
+    assert not etag_matches(header, ETAG)
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', True),
+    ('GZIP', True),
+    ('gzip, deflate, br', True),
+    ('deflate, gzip;q=0.5', True),
+    ('*', True),
+    ('gzip;q=1.0', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0', False),
+    ('gzip;q=bad', False),
+    ('deflate, br', False),
+    ('identity', False),
+    ('', False),
+    (None, False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_size=2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    cache.get('a')
+    cache.set('c', b'3')
+
+    assert cache.get('b') is None
+    assert cache.get('a').body == b'1'
+    assert cache.stats()['size'] == 2
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(http_cache, 'response_cache', ResponseCache())
+    monkeypatch.setattr(http_cache, 'COMPRESS_MIN_BYTES', 100)
+    app = Flask(__name__)
+    state = {'version': 1, 'builds': 0}
+
+    @app.route('/stats')
+    def stats():
+        def build():
+            state['builds'] += 1
+            return {'version': state['version'], 'padding': 'x' * 200}
+        return http_cache.json_response(state['version'], build)
+
+    app.state = state
+    return app
+
+def test_unchanged_data_gets_a_304_without_a_build(app):
+    client = app.test_client()
+    first = client.get('/stats')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/stats', headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert app.state['builds'] == 1
+
+def test_changed_data_is_sent_again(app):
+    client = app.test_client()
+    etag = client.get('/stats').headers['ETag']
+    app.state['version'] = 2
+
+    response = client.get('/stats', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['version'] == 2
+
+def test_body_is_built_once_per_version(app):
+    client = app.test_client()
+    client.get('/stats')
+    client.get('/stats')
+
+    assert app.state['builds'] == 1
+
+def test_large_bodies_are_gzipped_for_clients_that_accept_it(app):
+    client = app.test_client()
+
+    zipped = client.get('/stats', headers={'Accept-Encoding': 'gzip'})
+    refused = client.get('/stats', headers={'Accept-Encoding': 'gzip;q=0'})
+
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(zipped.data))['version'] == 1
+    assert 'Content-Encoding' not in refused.headers
+    assert refused.get_json()['version'] == 1
+
+def test_no_version_means_no_caching(app):
+    with app.test_request_context('/stats'):
+        response = http_cache.json_response(None, lambda: {'ok': True})
+
+    assert 'ETag' not in response.headers
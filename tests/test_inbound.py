@@ -0,0 +1,70 @@
+"""Requeueing inbound messages a worker never finished (no database needed)"""
+from contextlib import contextmanager
+
+import pytest
+
+import inbound
+
+class FakeCursor:
+    """Answers the SELECTs in resubmit_stale and records every statement"""
+
+    def __init__(self, abandoned, stale):
+        self.results = {'from_number': abandoned, "status = 'received'": stale}
+        self.executed = []
+        self.rows = []
+
+    def execute(self, statement, params=None):
+        self.executed.append((' '.join(statement.split()), params))
+        self.rows = next((rows for key, rows in self.results.items() if statement.lstrip().startswith('SELECT') and key in statement), [])
+
+    def fetchall(self):
+        return self.rows
+
+@pytest.fixture
+def resubmit(monkeypatch):
+    calls = {'submitted': [], 'replies': []}
+    monkeypatch.setattr(inbound, 'INBOUND_MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(inbound, 'submit', calls['submitted'].append)
+    monkeypatch.setattr(inbound, '_reply', lambda sid, member, to, body: calls['replies'].append((sid, to)))
+    monkeypatch.setattr(inbound, 'render', lambda name, *a, **k: name)
+
+    def run(abandoned=(), stale=()):
+        cursor = FakeCursor(list(abandoned), [{'message_sid': sid} for sid in stale])
+
+        @contextmanager
+        def transaction():
+            yield cursor
+
+        monkeypatch.setattr(inbound, 'transaction', transaction)
+        calls['count'] = inbound.resubmit_stale()
+        calls['executed'] = cursor.executed
+        return calls
+    return run
+
+def test_stale_messages_are_resubmitted(resubmit):
+    calls = resubmit(stale=['SM1', 'SM2'])
+
+    assert calls['count'] == 2
+    assert calls['submitted'] == ['SM1', 'SM2']
+    assert calls['replies'] == []
+    sql, params = next(s for s in calls['executed'] if s[0].startswith("UPDATE inbound_messages SET status = 'received'"))
+    assert sql.endswith('attempts < %s') and params[-1] == 3
+    assert not any("'failed'" in sql for sql, _ in calls['executed'])
+
+def test_messages_out_of_attempts_fail_with_an_error_reply(resubmit):
+    calls = resubmit(abandoned=[{'message_sid': 'SM9', 'from_number': 'whatsapp:+254712345678'}], stale=['SM1'])
+
+    failed = next(params for sql, params in calls['executed'] if "SET status = 'failed'" in sql)
+    assert failed == ['Unfinished after 3 attempts', 'SM9']
+    assert calls['replies'] == [('SM9', inbound.phone_key('whatsapp:+254712345678'))]
+    assert calls['submitted'] == ['SM1']
+    assert calls['count'] == 1
+
+def test_a_failed_error_reply_does_not_stop_the_sweep(resubmit, monkeypatch):
+    def broken_reply(*args):
+        raise RuntimeError('outbox down')
+    monkeypatch.setattr(inbound, '_reply', broken_reply)
+
+    calls = resubmit(abandoned=[{'message_sid': 'SM9', 'from_number': '+254712345678'}], stale=['SM1'])
+
+    assert calls['submitted'] == ['SM1']
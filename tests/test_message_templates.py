@@ -0,0 +1,52 @@
+"""Message templates: compiling, rendering and validating edits"""
+from datetime import date, datetime
+
+import pytest
+
+import planner
+from message_templates import CompiledTemplate, TemplateStore, save_template
+
+def test_compiled_template_renders_fields():
+    template = CompiledTemplate('Hi {name}, 100% due on {due_date}')
+
+    assert template.fields == ('name', 'due_date')
+    assert template.render({'name': 'Jane', 'due_date': '1 Mar'}) == 'Hi Jane, 100% due on 1 Mar'
+
+@pytest.mark.parametrize('body', ['Hi {name', 'Hi {name!r}', 'Hi {name:>10}', 'Hi {member.name}'])
+def test_malformed_bodies_are_rejected(body):
+    with pytest.raises(ValueError):
+        save_template('reminder', 'en', body)
+
+def test_unknown_placeholders_are_rejected():
+    with pytest.raises(ValueError, match='nme'):
+        save_template('reminder', 'en', 'Hi {nme}!')
+    with pytest.raises(ValueError, match='due_date'):
+        # The plain reminder has no due date to fill in
+        save_template('reminder', 'sw', 'Habari {name}, tarehe {due_date}')
+
+def test_unknown_template_names_are_rejected():
+    with pytest.raises(ValueError):
+        save_template('reminder_never', 'en', 'Hi {name}')
+
+def test_reminder_tick_skips_members_whose_template_fails(monkeypatch):
+    now = datetime.utcnow()
+    due = [
+        {'id': member_id, 'name': 'Member', 'phone_number': '+254712345678', 'chama_id': 1,
+         'timezone': None, 'locale': locale, 'reminder_stage': 2, 'next_reminder_at': now,
+         'due_date': date.today()}
+        for member_id, locale in ((1, 'en'), (2, 'broken'), (3, 'en'))
+    ]
+    store = TemplateStore(loader=lambda name, locale: 'Hi {nme}' if locale == 'broken' else None)
+    queued = []
+    saved = []
+
+    monkeypatch.setattr(planner, 'execute_query', lambda *args, **kwargs: due)
+    monkeypatch.setattr(planner, 'render', store.render)
+    monkeypatch.setattr(planner, 'enqueue', lambda rows: queued.extend(rows) or len(rows))
+    monkeypatch.setattr(planner, '_plan', lambda members, *args, **kwargs: [m['id'] for m in members])
+    monkeypatch.setattr(planner, '_save', saved.extend)
+    monkeypatch.setattr(planner, 'kick', lambda: None)
+
+    assert planner.send_due(batch_size=10) == 2
+    assert [row['member_id'] for row in queued] == [1, 3]
+    assert saved == [1, 2, 3]
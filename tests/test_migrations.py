@@ -0,0 +1,132 @@
+"""Migrations: rerunnable steps and the upgrade from a schema.sql database
+
+The upgrade tests need a MySQL server. Set MIGRATION_TEST_DB to the name
+of a scratch database (it is dropped and recreated) and DB_HOST, DB_USER
+and DB_PASSWORD as for the app; without it they are skipped.
+"""
+import os
+import re
+
+import mysql.connector
+import pytest
+from mysql.connector import errorcode
+
+import migrate
+
+TEST_DB = os.getenv('MIGRATION_TEST_DB')
+
+requires_mysql = pytest.mark.skipif(not TEST_DB, reason='MIGRATION_TEST_DB is not set')
+
+# Columns added after the original schema.sql, which an upgrade must create
+ADDED_COLUMNS = [
+    ('members', 'chama_id'), ('members', 'timezone'), ('members', 'locale'),
+    ('members', 'reminder_stage'), ('members', 'next_reminder_at'), ('members', 'phone_e164'),
+    ('chamas', 'cycle_days'), ('chamas', 'current_cycle_id'), ('chamas', 'timezone'),
+    ('chamas', 'reminder_hour'), ('payments', 'mpesa_receipt'), ('outbox', 'send_after'),
+    ('chama_summary', 'member_version'),
+]
+
+class FakeCursor:
+    """Records statements and fails the ones in ``errors`` with their errno"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append(statement)
+        for fragment, errno in self.errors.items():
+            if fragment in statement:
+                raise mysql.connector.Error(msg='fake', errno=errno)
+
+def write_migration(tmp_path, sql):
+    path = tmp_path / '0099_test.sql'
+    path.write_text(sql)
+    return str(path)
+
+def test_existing_column_or_index_counts_as_applied(tmp_path):
+    path = write_migration(tmp_path, """
+        ALTER TABLE members ADD COLUMN locale VARCHAR(8) NULL;
+        CREATE INDEX idx_members_name ON members (name);
+        CREATE TABLE IF NOT EXISTS t (id INT);
+    """)
+    cursor = FakeCursor({'ADD COLUMN locale': errorcode.ER_DUP_FIELDNAME, 'idx_members_name': errorcode.ER_DUP_KEYNAME})
+
+    migrate._apply(cursor, 99, 'test', path)
+
+    assert cursor.executed[2].startswith('CREATE TABLE')
+    assert 'schema_migrations' in cursor.executed[-1]
+
+def test_other_errors_stop_the_migration(tmp_path):
+    path = write_migration(tmp_path, "ALTER TABLE members ADD COLUMN locale VARCHAR(8) NULL; SELECT 1")
+    cursor = FakeCursor({'ADD COLUMN': errorcode.ER_NO_SUCH_TABLE})
+
+    with pytest.raises(mysql.connector.Error):
+        migrate._apply(cursor, 99, 'test', path)
+    assert len(cursor.executed) == 1
+
+def test_each_alter_table_makes_one_change():
+    # A multi-clause ALTER that failed half-applied could never be rerun
+    for version, name, path in migrate.available():
+        with open(path) as file:
+            for statement in migrate.split_statements(file.read()):
+                if statement.upper().startswith('ALTER TABLE'):
+                    clauses = len(re.findall(r'\b(?:ADD|DROP|MODIFY|CHANGE|RENAME)\b', statement, re.IGNORECASE))
+                    assert clauses == 1, f"{version:04d}_{name}: {statement}"
+
+def test_migrations_are_numbered_without_gaps():
+    versions = [version for version, _, _ in migrate.available()]
+    assert versions == list(range(1, len(versions) + 1))
+
+@pytest.fixture
+def baseline_db(monkeypatch):
+    """A database built the way the original schema.sql built it"""
+    monkeypatch.setenv('DB_NAME', TEST_DB)
+    args = migrate._connect_args()
+    server = mysql.connector.connect(**{key: value for key, value in args.items() if key != 'database'})
+    cursor = server.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{TEST_DB}`")
+    cursor.execute(f"CREATE DATABASE `{TEST_DB}`")
+    cursor.execute(f"USE `{TEST_DB}`")
+    # No schema_migrations: schema.sql didn't record anything
+    for _, _, path in migrate.available()[:2]:
+        with open(path) as file:
+            for statement in migrate.split_statements(file.read()):
+                cursor.execute(statement)
+    yield cursor
+    cursor.execute(f"DROP DATABASE IF EXISTS `{TEST_DB}`")
+    cursor.close()
+    server.close()
+
+def columns(cursor):
+    cursor.execute(
+        "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s",
+        (TEST_DB,)
+    )
+    return set(cursor.fetchall())
+
+@requires_mysql
+def test_upgrade_from_schema_sql_database(baseline_db):
+    applied = migrate.migrate()
+
+    assert applied == [version for version, _, _ in migrate.available()]
+    assert set(ADDED_COLUMNS) <= columns(baseline_db)
+
+    # Existing chamas got an open cycle, and members their dues for it
+    baseline_db.execute("SELECT COUNT(*) FROM chamas WHERE current_cycle_id IS NULL")
+    assert baseline_db.fetchone()[0] == 0
+    baseline_db.execute("SELECT COUNT(*) FROM ledger_entries WHERE kind = 'due'")
+    assert baseline_db.fetchone()[0] == 5
+
+    assert migrate.migrate() == []
+
+@requires_mysql
+def test_every_migration_can_be_rerun(baseline_db):
+    migrate.migrate()
+    # As if every migration after the baseline had failed just before being recorded
+    baseline_db.execute("DELETE FROM schema_migrations WHERE version > 2")
+
+    assert migrate.migrate() == [version for version, _, _ in migrate.available()][2:]
+
+    baseline_db.execute("SELECT COUNT(*) FROM ledger_entries WHERE kind = 'due'")
+    assert baseline_db.fetchone()[0] == 5
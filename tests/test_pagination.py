@@ -0,0 +1,104 @@
+"""Keyset pagination of the members list"""
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import routes.api
+from queries import decode_cursor, encode_cursor, member_page, member_page_query
+from routes.api import api_bp
+
+START = datetime(2024, 3, 1, 9, 30, 15, 250000)
+# Newest first, as member_page_query orders them
+MEMBERS = [
+    {'id': 10 - i, 'created_at': START - timedelta(minutes=i), 'name': f'Member {10 - i}', 'phone_number': f'07000000{10 - i:02d}'}
+    for i in range(10)
+]
+
+def b64(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+@pytest.mark.parametrize('member', [
+    {'id': 7, 'created_at': START},
+    {'id': 123456, 'created_at': datetime(2024, 1, 1)},
+])
+def test_cursor_round_trip(member):
+    assert decode_cursor(encode_cursor(member)) == (member['created_at'], member['id'])
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    '!!!!',
+    'abc',                                  # bad padding
+    b64('2024-03-01T09:30:15'),             # no id
+    b64('2024-03-01T09:30:15|7|8'),
+    b64('yesterday|7'),
+    b64('2024-03-01T09:30:15|seven'),
+    b64('2024-03-01T09:30:15|0'),
+    b64('2024-03-01T09:30:15|-7'),
+    b64('2024-03-01T09:30:15| 7'),
+    b64('2024-03-01T09:30:15|7_0'),
+    b64('2024-03-01 09:30:15|7'),           # not how encode_cursor writes it
+    encode_cursor(MEMBERS[0]) + '*',        # stray characters
+    encode_cursor(MEMBERS[0])[:-4],         # truncated
+    'bWVtYmVyc3w3é',
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor)
+
+def test_cursor_continues_after_the_last_row_of_the_page():
+    query, params, _, limit = member_page_query({'limit': '3', 'cursor': encode_cursor(MEMBERS[2])})
+
+    assert 'created_at < %s OR (created_at = %s AND id < %s)' in query
+    assert params == [MEMBERS[2]['created_at'], MEMBERS[2]['created_at'], MEMBERS[2]['id'], 4]
+    assert limit == 3
+
+def page(rows, cursor=None, limit=3):
+    """Run member_page_query against an in-memory table"""
+    query, params, fields, limit = member_page_query({'limit': str(limit), 'fields': 'name', 'cursor': cursor})
+    if cursor:
+        created_at, member_id = params[0], params[2]
+        rows = [r for r in rows if (r['created_at'], r['id']) < (created_at, member_id)]
+    return member_page(rows[:params[-1]], fields, limit)
+
+def test_paging_visits_every_member_once_and_stops():
+    seen, cursor = [], None
+    for _ in range(len(MEMBERS)):
+        body = page(MEMBERS, cursor)
+        seen += [m['name'] for m in body['members']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == [m['name'] for m in MEMBERS]
+    assert body['members'] == [{'name': 'Member 1'}]
+
+def test_a_page_that_fits_exactly_is_the_last():
+    body = page(MEMBERS[:3])
+
+    assert len(body['members']) == 3
+    assert body['next_cursor'] is None
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(routes.api, 'data_version', lambda chama_id=None: None)
+    app = Flask(__name__)
+    app.register_blueprint(api_bp)
+    return app.test_client()
+
+def test_invalid_cursor_is_a_bad_request(client, monkeypatch):
+    monkeypatch.setattr(routes.api, 'execute_query', lambda *a, **k: pytest.fail('queried with a bad cursor'))
+
+    response = client.get('/api/members', query_string={'cursor': b64('2024-03-01T09:30:15|seven')})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+def test_members_endpoint_returns_the_next_cursor(client, monkeypatch):
+    monkeypatch.setattr(routes.api, 'execute_query', lambda query, params, fetch: MEMBERS[:params[-1]])
+
+    body = client.get('/api/members', query_string={'limit': 3, 'fields': 'name'}).get_json()
+
+    assert [m['name'] for m in body['members']] == ['Member 10', 'Member 9', 'Member 8']
+    assert decode_cursor(body['next_cursor']) == (MEMBERS[2]['created_at'], MEMBERS[2]['id'])
@@ -0,0 +1,70 @@
+"""Phone number normalization: the key of members.phone_e164"""
+import pytest
+
+from phones import normalize_phone, phone_key
+
+@pytest.mark.parametrize('raw', [
+    '0712345678',
+    '712345678',
+    '254712345678',
+    '+254712345678',
+    '00254712345678',
+    '+254 712 345 678',
+    '0712-345-678',
+    '(0712) 345.678',
+    '+254 (0)712 345 678',
+    ' whatsapp:+254712345678 ',
+    'WhatsApp:0712345678',
+    712345678,
+])
+def test_kenyan_mobile_numbers(raw):
+    assert normalize_phone(raw) == '+254712345678'
+
+@pytest.mark.parametrize('raw, expected', [
+    ('0110123456', '+254110123456'),
+    ('254110123456', '+254110123456'),
+    ('+254 110 123 456', '+254110123456'),
+])
+def test_new_01_prefix(raw, expected):
+    assert normalize_phone(raw) == expected
+
+@pytest.mark.parametrize('raw, expected', [
+    ('+44 7700 900123', '+447700900123'),
+    ('0044 7700 900123', '+447700900123'),
+    ('+1 (415) 523-8886', '+14155238886'),
+    ('+255 712 345 678', '+255712345678'),
+])
+def test_foreign_numbers_with_their_code(raw, expected):
+    assert normalize_phone(raw) == expected
+
+@pytest.mark.parametrize('raw', [
+    # Foreign or landline numbers without a country code are not guessed at
+    '4155238886',
+    '07700900123',
+    '0201234567',
+    '255712345678',
+    # Wrong length for a Kenyan number
+    '071234567',
+    '07123456789',
+    '+2547123456',
+    '+25471234567890',
+    # Not a phone number
+    None,
+    '',
+    'abc',
+    '0712abc345',
+    '+',
+    '+0712345678',
+    '0712345678 ext 5',
+])
+def test_invalid_numbers_are_rejected(raw):
+    with pytest.raises(ValueError):
+        normalize_phone(raw)
+
+def test_other_country_code_as_default():
+    assert normalize_phone('0712345678', country_code='256') == '+256712345678'
+
+def test_phone_key_falls_back_to_the_raw_sender():
+    assert phone_key('whatsapp:+254712345678') == '+254712345678'
+    assert phone_key('whatsapp:garbage') == 'garbage'
+    assert phone_key(None) == ''
@@ -0,0 +1,57 @@
+"""Reminder escalation across a cycle rollover, on a simulated clock"""
+from datetime import date, datetime, timedelta
+
+from cycles import next_due_date, rollover_cutoff
+from planner import REMINDER_POLICY, next_reminder
+
+STEPS = [step for _, step, _ in REMINDER_POLICY]
+
+def run(start, due_date, days, late_payer=True, cycle_days=30):
+    """Drive one unpaid member the way the scheduler does, hour by hour
+
+    Returns the ``(due_date, step)`` of every reminder sent.
+    """
+    member = {'id': 1, 'timezone': None, 'reminder_stage': 0}
+    chama = {'due_date': due_date, 'timezone': 'Africa/Nairobi', 'reminder_hour': 9}
+    next_at = None
+    sent = []
+
+    now = start
+    while now < start + timedelta(days=days):
+        # cycle_rollover_job (hourly)
+        if chama['due_date'] < rollover_cutoff(now.date()):
+            chama['due_date'] = next_due_date(chama['due_date'], cycle_days, now.date())
+            member['reminder_stage'], next_at = 0, None
+
+        # plan_unplanned
+        if next_at is None and member['reminder_stage'] < len(REMINDER_POLICY):
+            member['reminder_stage'], next_at = next_reminder(member, chama, late_payer, now)
+
+        # send_due
+        if next_at is not None and next_at <= now:
+            sent.append((chama['due_date'], STEPS[member['reminder_stage']]))
+            member['reminder_stage'] += 1
+            member['reminder_stage'], next_at = next_reminder(member, chama, late_payer, now, catch_up=False)
+
+        now += timedelta(hours=1)
+    return sent
+
+def test_every_stage_is_sent_before_the_rollover():
+    due = date(2026, 3, 20)
+    sent = run(datetime(2026, 3, 1), due, days=60)
+
+    following = next_due_date(due, 30, due + timedelta(days=8))
+    assert sent == [(due, step) for step in STEPS] + [(following, step) for step in STEPS]
+
+def test_reliable_payers_skip_the_early_stage():
+    due = date(2026, 3, 20)
+    sent = run(datetime(2026, 3, 1), due, days=30, late_payer=False)
+
+    assert sent == [(due, step) for step in STEPS[1:]]
+
+def test_cycle_stays_open_through_the_final_stage():
+    last_offset = max(days for days, _, _ in REMINDER_POLICY)
+    due = date(2026, 3, 20)
+
+    assert not due < rollover_cutoff(due + timedelta(days=last_offset))
+    assert due < rollover_cutoff(due + timedelta(days=last_offset + 1))
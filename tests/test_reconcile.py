@@ -0,0 +1,131 @@
+"""Parsing and matching of M-Pesa statement rows (no database needed)"""
+import io
+from datetime import datetime
+
+import pytest
+
+import reconcile
+from reconcile import field, match_member, parse_time, party_phone, reconcile_statement
+from routes.api import csv_rows
+
+JANE = {'id': 17, 'phone_e164': '+254712345678', 'amount_expected': 1000}
+JOHN = {'id': 4, 'phone_e164': '+254110000004', 'amount_expected': 500}
+BY_PHONE = {m['phone_e164']: m for m in (JANE, JOHN)}
+BY_REFERENCE = {str(m['id']): m for m in (JANE, JOHN)}
+
+@pytest.mark.parametrize('value, expected', [
+    ('254712345678 - JANE DOE', '+254712345678'),
+    ('+254 712 345 678 - JANE DOE', '+254712345678'),
+    ('0712345678 JANE DOE', '+254712345678'),
+    ('254110000004', '+254110000004'),
+    ('2547****5678 - JANE DOE', None),
+    ('254712***678 - JANE DOE', None),
+    ('JANE DOE', None),
+    ('Till 123456', None),
+    ('', None),
+    (None, None),
+])
+def test_party_phone(value, expected):
+    assert party_phone(value) == expected
+
+def test_field_reads_the_first_known_column_with_a_value():
+    row = {'receipt no.': '', 'transaction id': ' QAB12CD34E ', 'paid in': 1500}
+
+    assert field(row, 'receipt') == 'QAB12CD34E'
+    assert field(row, 'amount') == '1500'
+    assert field(row, 'reference') is None
+    assert field({}, 'party') is None
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-03-05 14:02:11', datetime(2024, 3, 5, 14, 2, 11)),
+    ('05-03-2024 14:02:11', datetime(2024, 3, 5, 14, 2, 11)),
+    ('05/03/2024 14:02:11', datetime(2024, 3, 5, 14, 2, 11)),
+    ('05/03/2024 14:02', datetime(2024, 3, 5, 14, 2)),
+    ('20240305140211', datetime(2024, 3, 5, 14, 2, 11)),
+    ('yesterday', None),
+    (None, None),
+])
+def test_parse_time(value, expected):
+    assert parse_time(value) == expected
+
+@pytest.mark.parametrize('row, expected', [
+    ({'a/c no.': '17'}, JANE),
+    ({'account no.': 'M17'}, JANE),
+    ({'bill ref number': 'm 017'}, JANE),
+    ({'reference': '0712345678'}, JANE),
+    ({'other party info': '254110000004 - JOHN'}, JOHN),
+    # An unknown reference falls back to the paying number
+    ({'a/c no.': 'CONTRIBUTION', 'msisdn': '254712345678'}, JANE),
+    ({'a/c no.': 'M99', 'other party info': '254110000004 - JOHN'}, JOHN),
+    # The reference wins over the payer
+    ({'a/c no.': 'M4', 'other party info': '254712345678 - JANE DOE'}, JOHN),
+    ({'other party info': '2547****5678 - JANE DOE'}, None),
+    ({'a/c no.': 'M99', 'other party info': '254799999999 - STRANGER'}, None),
+    ({}, None),
+])
+def test_match_member(row, expected):
+    assert match_member(row, BY_PHONE, BY_REFERENCE) == expected
+
+@pytest.fixture
+def written(monkeypatch):
+    """Capture what reconcile_statement would write"""
+    written = {'payments': [], 'unmatched': []}
+
+    def write_chunk(chunk, chama_id, opened_at):
+        written['payments'].extend(chunk)
+        return {'QDUP'}, {p['member_id'] for p in chunk if p['current'] and p['amount'] >= p['expected']}
+
+    monkeypatch.setattr(reconcile, 'build_index', lambda chama_id: (BY_PHONE, BY_REFERENCE))
+    monkeypatch.setattr(reconcile, 'cycle_start', lambda chama_id: datetime(2024, 3, 1))
+    monkeypatch.setattr(reconcile, '_write_chunk', write_chunk)
+    monkeypatch.setattr(reconcile, '_flag_unmatched', lambda rows, chama_id: written['unmatched'].extend(rows))
+    return written
+
+STATEMENT = b"""\xef\xbb\xbfReceipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Balance,Other Party Info,A/c No.
+QAA1,2024-03-05 14:02:11,Pay Bill,Completed,"1,000.00",,,254712345678 - JANE DOE,M17
+qaa1,2024-03-05 14:02:11,Pay Bill,Completed,"1,000.00",,,254712345678 - JANE DOE,M17
+QAA2,05/03/2024 15:00,Pay Bill,Completed,200,,,254110000004 - JOHN,
+QAA3,2024-02-20 09:00:00,Pay Bill,Completed,500,,,254110000004 - JOHN,
+QAA4,2024-03-06 10:00:00,Pay Bill,Completed,300,,,2547****5678 - JANE DOE,
+QAA5,2024-03-06 11:00:00,Withdrawal,Completed,,250.00,,,
+QAA6,2024-03-06 12:00:00,Pay Bill,Failed,400,,,254712345678 - JANE DOE,
+QAA7,2024-03-06 13:00:00,Pay Bill,Completed,KES 400,,,254712345678 - JANE DOE,
+,2024-03-06 14:00:00,Pay Bill,Completed,400,,,254712345678 - JANE DOE,
+QDUP,,Pay Bill,Completed,1000,,,254712345678 - JANE DOE,
+"""
+
+def test_statement_is_matched_and_flagged(written):
+    report = reconcile_statement(csv_rows(io.BytesIO(STATEMENT)), chama_id=1)
+
+    assert {k: v for k, v in report.items() if k not in ('flags', 'flags_truncated')} == {
+        'processed': 10, 'matched': 3, 'partial': 1, 'earlier_cycle': 1, 'unmatched': 1,
+        'duplicates': 2, 'skipped': 2, 'invalid': 2,
+    }
+    assert [(f['row'], f['reason']) for f in report['flags']] == [
+        (2, 'Duplicate receipt in statement'),
+        (5, 'No member matches the phone number or account reference'),
+        (8, 'Missing receipt number or amount'),
+        (9, 'Missing receipt number or amount'),
+        (10, 'Already recorded'),
+    ]
+
+    payments = {p['receipt']: p for p in written['payments']}
+    assert payments['QAA1']['amount'] == 1000.0 and payments['QAA1']['member_id'] == 17
+    assert payments['QAA2']['date'] == datetime(2024, 3, 5, 15, 0)
+    assert not payments['QAA3']['current']
+    assert payments['QDUP']['date'] is None and payments['QDUP']['current']
+    assert written['unmatched'] == [{
+        'receipt': 'QAA4', 'amount': 300.0, 'date': datetime(2024, 3, 6, 10, 0),
+        'party': '2547****5678 - JANE DOE', 'reference': '',
+    }]
+
+def test_statement_is_written_in_chunks(written, monkeypatch):
+    monkeypatch.setattr(reconcile, 'RECONCILE_CHUNK_SIZE', 2)
+    chunks = []
+    monkeypatch.setattr(reconcile, '_write_chunk', lambda chunk, *a: (chunks.append(len(chunk)), (set(), set()))[1])
+    rows = ({'receipt no.': f'Q{i}', 'paid in': '100', 'a/c no.': '17'} for i in range(5))
+
+    report = reconcile_statement(rows, chama_id=1)
+
+    assert chunks == [2, 2, 1]
+    assert report['matched'] == 5 and report['partial'] == 5